@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -99,12 +100,25 @@ TEMPLATES = [
 ASGI_APPLICATION = "ETT_backend.asgi.application"
 # WSGI_APPLICATION = "ETT_backend.wsgi.application"
 
+# 跨进程 channel layer：uvicorn --workers N 与求解进程经本机 Unix socket 互通，无需 redis
 CHANNEL_LAYERS = {
     "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer",
+        "BACKEND": "MARL.src.layers.UnixSocketChannelLayer",
+        "CONFIG": {
+            "path": os.environ.get("ETT_CHANNELS_SOCKET", "/tmp/ett_channels.sock"),
+        },
     }
 }
 
+# 求解任务：同时运行的求解进程数、等待队列上限、进度推送最小间隔（秒）
+SOLVER_MAX_JOBS = 2
+SOLVER_MAX_QUEUED = 16
+SOLVER_MAX_TIME_BUDGET = 600 # web 提交的任务的最长限时（秒）
+SOLVER_STREAM_INTERVAL = 0.2
+SOLVER_PROGRESS_INTERVAL = 1.0 # 进度写入任务表的最小间隔（秒）
+# 每个 WebSocket 连接对同一任务的最小推送间隔（秒）
+SOLVER_WS_THROTTLE = 0.5
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
@@ -112,6 +126,8 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # 事务开始即取得写锁：多个 web 进程认领求解任务（MARL.src.jobs）时依次进行
+        "OPTIONS": {"transaction_mode": "IMMEDIATE"},
     }
 }
 
@@ -4,9 +4,9 @@ from drf_yasg.views import get_schema_view
 from rest_framework import permissions # 导入权限模块
 from drf_yasg import openapi
 try:
-    from MARL.views import start_training
+    from MARL.views import StartTrainingView, JobListView, JobStatusView, JobBestView, JobCancelView
 except ImportError:
-    from ..MARL.views import start_training
+    from ..MARL.views import StartTrainingView, JobListView, JobStatusView, JobBestView, JobCancelView
 
 schema_view = get_schema_view(
     openapi.Info(
@@ -23,7 +23,11 @@ schema_view = get_schema_view(
 
 urlpatterns = [
     path("admin/", admin.site.urls),
-    path("start/", start_training),
+    path("start/", StartTrainingView.as_view()),
+    path("jobs/", JobListView.as_view()),
+    path("jobs/<str:job_id>/", JobStatusView.as_view()),
+    path("jobs/<str:job_id>/best/", JobBestView.as_view()),
+    path("jobs/<str:job_id>/cancel/", JobCancelView.as_view()),
     path("api/school/", include("School.urls")),
     path("api/user/", include("User.urls")),
     path('swagger<format>/', schema_view.without_ui(cache_timeout=0), name='schema-json'),
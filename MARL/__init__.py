@@ -0,0 +1,5 @@
+import os
+
+# 求解器（MARL/src）内部按 MARL.PMAPPO / MARL.utils ... 导入，独立运行时 src 本身就是 MARL 包；
+# 作为 Django 应用时 MARL 是本目录，把 src 加入包路径，web 进程和求解子进程才能解析这些子包
+__path__.append(os.path.join(os.path.dirname(__file__), "src"))
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:44
+
+import MARL.models
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('status', models.CharField(db_index=True, max_length=16)),
+                ('method', models.CharField(max_length=32)),
+                ('instance', models.CharField(max_length=255)),
+                ('config', models.JSONField(encoder=MARL.models._NumberEncoder)),
+                ('time_budget', models.FloatField(null=True)),
+                ('created', models.FloatField()),
+                ('started', models.FloatField(null=True)),
+                ('finished', models.FloatField(null=True)),
+                ('progress', models.JSONField(encoder=MARL.models._NumberEncoder, null=True)),
+                ('best', models.JSONField(encoder=MARL.models._NumberEncoder, null=True)),
+                ('solution', models.JSONField(encoder=MARL.models._NumberEncoder, null=True)),
+                ('error', models.TextField(null=True)),
+                ('worker', models.CharField(default='', max_length=64)),
+                ('cancel_requested', models.BooleanField(default=False)),
+                ('owner', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='solver_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['created'],
+            },
+        ),
+    ]
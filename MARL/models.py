@@ -1,3 +1,54 @@
 from django.db import models
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
 
-# Create your models here.
+
+class _NumberEncoder(DjangoJSONEncoder):
+    # 求解进程回传的进度里有 numpy 数值
+    def default(self, o):
+        try:
+            return float(o)
+        except (TypeError, ValueError):
+            return super().default(o)
+
+
+class Job(models.Model):
+    """
+    求解任务。状态放在数据库里，所有 web 进程看到同一份：任一进程都能查询、取消任务，
+    排队的任务由任一进程的 JobManager 认领运行，运行中的任务只由启动它的进程（worker）管理。
+    """
+    id = models.CharField(primary_key=True, max_length=32)
+    owner = models.ForeignKey(User, null=True, on_delete=models.CASCADE, related_name='solver_jobs')
+    status = models.CharField(max_length=16, db_index=True)
+    method = models.CharField(max_length=32)
+    instance = models.CharField(max_length=255)
+    config = models.JSONField(encoder=_NumberEncoder)
+    time_budget = models.FloatField(null=True)
+    created = models.FloatField()
+    started = models.FloatField(null=True)
+    finished = models.FloatField(null=True)
+    progress = models.JSONField(null=True, encoder=_NumberEncoder)
+    best = models.JSONField(null=True, encoder=_NumberEncoder) # 最优可行解的惩罚摘要
+    solution = models.JSONField(null=True, encoder=_NumberEncoder) # 最优可行解 cid -> [weeks, days, start, length, room]
+    error = models.TextField(null=True)
+    worker = models.CharField(max_length=64, default="") # 运行该任务的进程 host:pid
+    cancel_requested = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ['created']
+
+    def as_dict(self):
+        return {
+            "id": self.id,
+            "owner": self.owner_id,
+            "status": self.status,
+            "method": self.method,
+            "instance": self.instance,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "progress": self.progress,
+            "best": self.best,
+            "time_budget": self.time_budget,
+            "error": self.error,
+        }
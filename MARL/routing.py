@@ -3,4 +3,5 @@ from .src.consumers import TrainingConsumer
 
 websocket_urlpatterns = [
     re_path(r"ws/train/$", TrainingConsumer.as_asgi()),
-]
\ No newline at end of file
+    re_path(r"ws/train/(?P<job_id>\w+)/$", TrainingConsumer.as_asgi()),
+]
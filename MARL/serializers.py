@@ -0,0 +1,22 @@
+from django.conf import settings
+from rest_framework import serializers
+from .src.interface import WEB_METHODS
+
+
+class TrainingRequestSerializer(serializers.Serializer):
+    """提交求解任务：只接受这三个字段，其余配置由服务器的 config.yaml 决定"""
+    method = serializers.ChoiceField(choices=WEB_METHODS, required=False)
+    file = serializers.CharField(required=False, max_length=255, help_text="数据目录中的实例文件名")
+    time_budget = serializers.FloatField(required=False, min_value=1, help_text="限时（秒），不超过 SOLVER_MAX_TIME_BUDGET")
+
+    def validate_time_budget(self, value):
+        limit = getattr(settings, "SOLVER_MAX_TIME_BUDGET", 600)
+        if value > limit:
+            raise serializers.ValidationError(f"不能超过 {limit} 秒")
+        return value
+
+    def validate(self, attrs):
+        unknown = set(self.initial_data) - set(self.fields)
+        if unknown:
+            raise serializers.ValidationError({key: "不支持的字段" for key in sorted(unknown)})
+        return attrs
@@ -1,7 +1,6 @@
 import pathlib
 import yaml
 import copy
-import torch
 import json
 import numpy as np
 from MARL.utils.constraints import HardConstraints, SoftConstraints
@@ -90,7 +89,8 @@ class trainer:
         self.not_assignment = []
 
         # self.timeTable_matrix = self.reader.timeTable_matrix
-        self.rooms = copy.deepcopy(self.reader.rooms) # {'id': {'id', 'capacity', 'unavailables_bits', 'unavailables', 'occupid'# (cid, time_bits, value)}}
+        self.rooms = copy.deepcopy(self.reader.rooms) # {'id': {'id', 'capacity', 'unavailables_bits', 'unavailables', 'occupid'# (cid, time_bits, action)}}
+        self.journal = None # LocalSearch / LNS 运行期间由 Journal 设置
 
     def reset(self):
         self.not_assignment = []
@@ -148,7 +148,7 @@ class trainer:
         i = self.cid2ind[cid]
         self.agents[i].value *= self.discount
 
-    def apply_action(self, cid, best_action, best_penalty):
+    def apply_action(self, cid, best_action):
         room_option_ind, time_option_ind, penalty = best_action
         i = self.cid2ind[cid]
         self.agents[i].candidate = None
@@ -158,7 +158,8 @@ class trainer:
         # self.timeTable_matrix = np.add(self.timeTable_matrix, time_option['optional_time'])
         if room_option_ind != -1:
             room_option = self.agents[i].room_options[room_option_ind]
-            self.rooms[room_option['id']]['ocupied'].append((cid, time_option['optional_time_bits'], best_penalty)) # {'id': {'id', 'capacity', 'unavailables_bits', 'unavailables', 'occupid'# (cid, time_bits, value)}}
+            # 与环境的 assign 相同记录动作，Journal 按它撤销和恢复教室占用
+            self.rooms[room_option['id']]['ocupied'].append((cid, time_option['optional_time_bits'], best_action))
         
 
     def total_penalty(self):
@@ -190,7 +191,8 @@ class trainer:
             "Distribution penalty": Distribution_penalty
         }
 
-    def step(self, epoch_num=0):
+    def step(self, epoch_num=0, searches=()):
+        """贪心构造一次；全部排上时再依次运行 searches（LocalSearch / LNS，以本 trainer 为环境构造）"""
         agents_order = self.order_agents() # (cid, value)
         for cid, value in tqdm(agents_order, desc=f"step {self.iter}", total=len(agents_order)):
             i = self.cid2ind[cid]
@@ -212,8 +214,10 @@ class trainer:
                 self.handle_infeasible_case(cid)
                 continue
                 # break
-            self.apply_action(cid, best_action, best_penalty)
+            self.apply_action(cid, best_action)
         # self.check("Precedence")
+        for search in (searches if not self.not_assignment else []):
+            search.run()
         self.iter += 1
         return self.total_penalty()
 
@@ -273,6 +277,7 @@ class trainer:
 
 
 if __name__ == "__main__":
+    import torch
     # Load configuration
     config = load_cfg(f"{folder}/config.yaml")
     # Set device
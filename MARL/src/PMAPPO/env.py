@@ -25,8 +25,8 @@ class CustomEnvironment:
         for i, (key, each) in enumerate(self.reader.classes.items()):
             agent = agent_class(each, len(self.reader.classes), self.optimization)
             self.agents.append(agent)
-            if self.roomRelatedClass.get(key, 0) == 0: self.roomRelatedClass[key] = set()
-            self.roomRelatedClass[key].update(agent.rooms)
+            for rid in agent.rooms: # room id -> 可以使用该教室的课程
+                self.roomRelatedClass.setdefault(rid, set()).add(key)
             self.cid2ind[key] = i
         
         self.travel = self.reader.travel
@@ -44,6 +44,7 @@ class CustomEnvironment:
         self.agents_value = np.array([agent.value for agent in self.agents])
         self.max_value = np.max(self.agents_value)
         self.getAgentConstraintSets()
+        self.journal = None # 打开 Journal 时，assign / handle_infeasible_case 的改动记入撤销日志
 
     def getAgentConstraintSets(self):
         for hard_constraint in self.hard_constrains:
@@ -201,7 +202,10 @@ class CustomEnvironment:
         return p
     
     def handle_infeasible_case(self, cid):
-        self._assignment.append(cid)
+        if self.journal is not None:
+            self.journal.fail(cid)
+        else:
+            self._assignment.append(cid)
         self.getRoomConflicts(cid)
 
     def apply_mappo_action(self, probs):
@@ -215,16 +219,56 @@ class CustomEnvironment:
         probs = np.array(probs, dtype=np.float64)
         probs = probs/np.sum(probs)
         action_ind = self.agents[i]._action_space.sample(probability=probs)
-        action = self.agents[i].action_space[action_ind]
+        self.assign(cid, self.agents[i].action_space[action_ind])
+        return action_ind, agent.masked_actions
+
+    def assign(self, cid, action):
+        if self.journal is not None:
+            self.journal.assign(cid, action)
+            return
+        agent = self.agents[self.cid2ind[cid]]
         room_option_ind, time_option_ind, penalty = action
-        self.agents[i].candidate = None
-        self.agents[i].action = action
-        self.agents[i].penalty = penalty
-        time_option = self.agents[i].time_options[time_option_ind]
+        agent.candidate = None
+        agent.action = action
+        agent.penalty = penalty
+        time_option = agent.time_options[time_option_ind]
         if room_option_ind != -1:
-            room_option = self.agents[i].room_options[room_option_ind]
+            room_option = agent.room_options[room_option_ind]
             self.rooms[room_option['id']]['ocupied'].append((cid, time_option['optional_time_bits'], action)) # {'id': {'id', 'capacity', 'unavailables_bits', 'unavailables', 'occupid'# (cid, time_bits, value)}}
-        return action_ind, agent.masked_actions
+
+    def fix(self, actions):
+        """清空结果后按 actions (cid -> action) 放置课程，其余课程未排；不计算观测，供增量重排反复调用"""
+        self._assignment = []
+        self.rooms = copy.deepcopy(self.reader.rooms)
+        for agent in self.agents:
+            agent.candidate = None
+            agent.action = None
+            agent.penalty = inf
+            agent.masked_actions = np.array([1 for _ in range(len(agent.action_space))], dtype=np.int8)
+            agent.observe_space = np.array([0 for _ in range(len(self.agents))], dtype=np.float64)
+            agent.room_constraints_cids = set()
+        for cid, action in actions.items():
+            self.assign(cid, action)
+
+    def neighbours(self, cids, rooms=True):
+        """
+        cids 的约束邻居：硬约束相关的课程；rooms 为 True 时再加上已排在其可选教室、
+        与其某个可选时间冲突的课程（记入 room_constraints_cids）。返回不含 cids 本身的集合。
+        """
+        self.Hard_validator.setClasses(self.agents)
+        found = set()
+        for cid in cids:
+            agent = self.agents[self.cid2ind[cid]]
+            for action in (agent.action_space if rooms else []):
+                if action[0] == -1:
+                    continue
+                agent.candidate = action
+                for occupant in self.rooms[agent.room_options[action[0]]['id']]['ocupied']:
+                    if occupant[0] != cid and self.Hard_validator.RoomConflicts(cid, [occupant]):
+                        agent.room_constraints_cids.add(occupant[0])
+            agent.candidate = None
+            found |= agent.hard_constraints_cids | agent.room_constraints_cids
+        return found - set(cids)
 
     def total_penalty(self, actions=None, masked_actions=None):
         penalty = 0
@@ -290,32 +334,39 @@ class CustomEnvironment:
             "masked_actions": masked_actions
         }
 
+    def evaluate_actions(self, cid):
+        """在当前结果上逐个试放 cid 的动作，更新 masked_actions / action_penalty，返回是否有可行动作"""
+        i = self.cid2ind[cid]
+        valid = False
+        for aid, action in enumerate(self.agents[i].action_space):
+            self.agents[i].candidate = action
+            if not self.is_feasible(cid, action):
+                self.agents[i].action_penalty[aid] = 0
+                self.agents[i].masked_actions[aid] = 0
+                continue
+
+            valid = True
+            p = self.incremental_penalty(cid, action)
+            self.agents[i].action_penalty[aid] = p
+            self.agents[i].masked_actions[aid] = 1
+        return valid
+
+    def step_agent(self, cid, actions, masked_actions):
+        i = self.cid2ind[cid]
+        if not self.evaluate_actions(cid):
+            self.handle_infeasible_case(cid)
+            actions[cid] = 0
+            masked_actions[cid] = self.agents[i].masked_actions
+            return
+        action_ind, mask = self.apply_action(cid)
+        actions[cid] = action_ind
+        masked_actions[cid] = mask
+
     def step(self):
         actions = {}
         masked_actions = {}
         for _, cid in self.agents_order.items():
-            i = self.cid2ind[cid]
-            valid = False
-            for aid, action in enumerate(self.agents[i].action_space):
-                self.agents[i].candidate = action
-                if not self.is_feasible(cid, action):
-                    self.agents[i].action_penalty[aid] = 0
-                    self.agents[i].masked_actions[aid] = 0
-                    continue
-                
-                valid = True
-                p = self.incremental_penalty(cid, action)
-                self.agents[i].action_penalty[aid] = p
-                self.agents[i].masked_actions[aid] = 1
-            if not valid:
-                self.handle_infeasible_case(cid)
-                actions[cid] = 0
-                masked_actions[cid] = self.agents[i].masked_actions
-                continue
-                # break
-            action_ind, mask = self.apply_action(cid)
-            actions[cid] = action_ind
-            masked_actions[cid] = mask
+            self.step_agent(cid, actions, masked_actions)
         # self.check("Precedence")
         return self.total_penalty(actions, masked_actions)
 
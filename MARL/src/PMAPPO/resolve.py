@@ -0,0 +1,135 @@
+"""
+数据小改动后的增量重排：以上一版 solution 为起点，未受影响的课程固定不动，
+只释放被修改的课程及其约束邻居（hard_constraints_cids / room_constraints_cids），
+在这个邻域内用贪心（CGCS 的按惩罚择优）或已训练的 MAPPO 策略重新排课。
+邻域内仍有排不下的课程时，把这些课程的邻居（包括占用其可选教室的课程）并入邻域再排，
+最多扩大 max_widen 次。
+"""
+import os
+import time
+from MARL.PMAPPO.env import CustomEnvironment
+from evaluator import load_solution
+
+
+def previous_actions(env, solution):
+    """load_solution 的结果 -> cid -> action；时间或教室已不在课程可选项中的课程不返回"""
+    actions = {}
+    for cid, (time_bits, room, _) in solution.items():
+        if time_bits is None or cid not in env.cid2ind:
+            continue
+        agent = env.agents[env.cid2ind[cid]]
+        weeks, days, start, _ = time_bits
+        tid = next((j for j, option in enumerate(agent.time_options)
+                    if tuple(option['optional_time_bits'][:3]) == (weeks, days, start)), None)
+        if agent.room_required:
+            rid = next((i for i, option in enumerate(agent.room_options) if option['id'] == room), None)
+        else:
+            rid = -1
+        if tid is None or rid is None:
+            continue
+        actions[cid] = next(action for action in agent.action_space if action[:2] == (rid, tid))
+    return actions
+
+
+def rebuild_greedy(env, cids):
+    """按 agents_order 依次为 cids 选可行动作中增量惩罚最小的一个"""
+    for cid in cids:
+        agent = env.agents[env.cid2ind[cid]]
+        if not env.evaluate_actions(cid):
+            env.handle_infeasible_case(cid)
+            continue
+        aid = min((aid for aid, m in enumerate(agent.masked_actions) if m), key=lambda aid: agent.action_penalty[aid])
+        env.assign(cid, agent.action_space[aid])
+
+
+def rebuild_policy(env, cids, mappo):
+    """在固定部分之上观测一次，用策略概率为 cids 采样动作"""
+    mappo_obs, masks = env.agents_observe()
+    state_list = [mappo_obs[agent.id].flatten() for agent in env.agents]
+    mask_list = [masks[agent.id].flatten() for agent in env.agents]
+    env.apply_mappo_action(mappo.take_action(state_list, mask_list))
+    actions, masked_actions = {}, {}
+    for cid in cids:
+        env.step_agent(cid, actions, masked_actions)
+
+
+def load_policy(env, config, pname, logger):
+    """加载 train() 保存的策略；没有权重或与当前实例维度不符时返回 None，改用贪心"""
+    from MARL.PMAPPO.MAPPO import MAPPO
+    mappo = MAPPO(len(env.agents), len(env.agents), env.max_value, config)
+    if not os.path.exists(os.path.join(mappo.weights_dir, f"{pname}/actor.pth")):
+        logger.info(f"no saved policy for {pname}, falling back to CGCS")
+        return None
+    try:
+        mappo.load(pname)
+    except RuntimeError as e:
+        logger.info(f"saved policy does not match {pname} ({e}), falling back to CGCS")
+        return None
+    return mappo
+
+
+def resolve(reader, logger, tools, output_folder, fileName, config):
+    pname = fileName.split('.xml')[0]
+    rname = f"{pname}.resolve"
+    os.makedirs(f"{output_folder}/{rname}", exist_ok=True)
+    options = config['resolve']
+    report = config['config']['report']
+    max_widen = options.get('max_widen', 3)
+    edited = {str(cid) for cid in options.get('edited') or []}
+
+    metrics_list = ["unassigned room", "freed classes", "Time penalty", "Room penalty", "Distribution penalty", "Total cost"]
+    tools.set_metrics(metrics_list)
+
+    t0 = time.perf_counter()
+    env = CustomEnvironment(reader, config)
+    env.order_agents()
+    mappo = load_policy(env, config, pname, logger) if options.get('method', 'CGCS') == "MAPPO" else None
+    attempts = options.get('attempts', 20) if mappo is not None else 1
+
+    previous = previous_actions(env, load_solution(options['previous']))
+    unknown = edited - env.cid2ind.keys()
+    if unknown:
+        logger.info(f"edited classes not in {reader.path.name}: {sorted(unknown)}")
+    # 新增或选项已失效的课程同样需要重排
+    free = (edited & env.cid2ind.keys()) | (env.cid2ind.keys() - previous.keys())
+    env.fix({cid: action for cid, action in previous.items() if cid not in free})
+    # 先只释放硬约束邻居；教室上的冲突要等课程排不下时才知道是哪些课程挡住了它
+    free |= env.neighbours(free, rooms=False)
+    logger.info(f"resolve {reader.path.name}: {len(edited)} edited, {len(free)}/{len(env.agents)} classes freed")
+
+    best = None # (未排数, 总惩罚, 放置结果)
+    for radius in range(max_widen + 1):
+        order = sorted(free, key=lambda cid: env.agent_order_dict[cid])
+        fixed = {cid: action for cid, action in previous.items() if cid not in free}
+        for _ in range(attempts):
+            env.fix(fixed)
+            if mappo is None:
+                rebuild_greedy(env, order)
+            else:
+                rebuild_policy(env, order, mappo)
+            unassigned = list(env._assignment)
+            result = env.total_penalty()
+            metrics = {"unassigned room": len(unassigned), "freed classes": len(free)}
+            metrics.update({key: result[key] for key in ("Time penalty", "Room penalty", "Distribution penalty", "Total cost")})
+            tools.update_metrics(metrics, len(unassigned), env, rname, output_folder, time.perf_counter() - t0)
+            if best is None or (len(unassigned), result["Total cost"]) < best[:2]:
+                best = (len(unassigned), result["Total cost"], {agent.id: agent.action for agent in env.agents if agent.action is not None})
+            if tools.expired():
+                break
+        if best[0] == 0 or radius == max_widen or tools.expired():
+            break
+        # 邻域不可行：把仍排不下的课程的邻居一起释放
+        env.fix(best[2])
+        unassigned = [agent.id for agent in env.agents if agent.action is None]
+        wider = env.neighbours(unassigned) - free
+        if not wider:
+            break
+        free |= wider
+        logger.info(f"{len(unassigned)} classes unassigned, widening to {len(free)} freed classes")
+
+    env.fix(best[2])
+    env._assignment = [agent.id for agent in env.agents if agent.action is None]
+    moved = sum(1 for cid, action in best[2].items() if previous.get(cid) != action)
+    logger.info(f"resolve finished: {best[0]} unassigned, {moved} classes moved, cost {best[1]}")
+    tools.conclude(time.perf_counter() - t0, report, rname, output_folder, reader)
+    return env
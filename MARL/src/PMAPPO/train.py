@@ -6,8 +6,13 @@ import numpy as np
 from MARL.PMAPPO.env import CustomEnvironment
 from MARL.PMAPPO.Scheduler import Scheduler
 from MARL.PMAPPO.MAPPO import MAPPO
+from MARL.utils.vec_env import VecEnv
+from MARL.utils.async_rollout import AsyncRollout
+from MARL.utils.local_search import LocalSearch
+from MARL.utils.lns import LNS
+from MARL.utils.checkpoint import checkpoint_path, save_checkpoint, load_checkpoint, rng_state, set_rng_state, env_state, set_env_state
 
-def train(reader, logger, tools, output_folder, fileName, config, quickrun=False):
+def train(reader, logger, tools, output_folder, fileName, config, quickrun=False, resume=False):
     pname = fileName.split('.xml')[0]
 
     update_metrics = tools.update_metrics
@@ -18,9 +23,15 @@ def train(reader, logger, tools, output_folder, fileName, config, quickrun=False
     report = config['config']['report']
     steps_clip = config['train']['steps_clip']
     total_episodes = int(config['train']['total_episodes'])
+    num_workers = config['train'].get('num_workers', 0)
+    async_actors = config['train'].get('async_actors', 0)
+    max_staleness = config['train'].get('max_staleness', 1)
+    checkpoint_interval = config['train'].get('checkpoint_interval', 0)
 
     logger.info(f"{reader.path.name} with {len(reader.courses)} courses, {len(reader.classes)} classes, {len(reader.rooms)} rooms, {len(reader.students)} students, {len(reader.distributions['hard_constraints'])} hard distributions, {len(reader.distributions['soft_constraints'])} soft distributions")
     env = CustomEnvironment(reader, config)
+    # 构造可行后依次运行的改进阶段
+    searches = [search(env, config) for search in (LocalSearch, LNS) if config.get(search.section, {}).get('enabled')]
     mappo_obs, masks, sched_obs, none_assignment = env.reset(order=True)
     team_size = len(env.agents)
     state_dim = len(env.agents)
@@ -32,8 +43,31 @@ def train(reader, logger, tools, output_folder, fileName, config, quickrun=False
     sched_mask = [1 for _ in sched_obs]
     fail = 0
     last_sched_reward = -inf
-    t0 = time.perf_counter()
-    for episode in tqdm(range(total_episodes), desc=f"Training"):
+    start_episode = 0
+    elapsed = 0
+    ckpt_path = checkpoint_path(output_folder, pname)
+    ckpt = load_checkpoint(ckpt_path) if resume else None
+    if ckpt is not None:
+        # 恢复完整训练状态：网络与优化器、Q 表、指标与最优解、环境排序和随机数状态
+        mappo.load_state_dict(ckpt["mappo"])
+        scheduler.load_state_dict(ckpt["scheduler"])
+        tools.load_state_dict(ckpt["tools"])
+        set_env_state(env, ckpt["env"])
+        set_rng_state(ckpt["rng"], searches)
+        loop = ckpt["loop"]
+        sched_obs, sched_mask, none_assignment = loop["sched_obs"], loop["sched_mask"], loop["none_assignment"]
+        fail, last_sched_reward = loop["fail"], loop["last_sched_reward"]
+        start_episode = ckpt["episode"]
+        elapsed = ckpt["runtime"]
+        logger.info(f"Resumed from {ckpt_path} at episode {start_episode}")
+    vec_env = None
+    async_rollout = None
+    if async_actors > 0:
+        async_rollout = AsyncRollout(CustomEnvironment, reader, config, mappo.actor, async_actors, steps_clip, max_staleness, config.get('seed', 42))
+    elif num_workers > 1:
+        vec_env = VecEnv(CustomEnvironment, reader, config, num_workers, config.get('seed', 42))
+    t0 = time.perf_counter() - elapsed
+    for episode in tqdm(range(start_episode, total_episodes), desc=f"Training"):
         sched_buffers = {
             'states': [],
             'actions': [],
@@ -63,16 +97,34 @@ def train(reader, logger, tools, output_folder, fileName, config, quickrun=False
         sched_cost = inf
         Avg_mappo_reward = []
 
-        pbar = tqdm(range(steps_clip))
-        for step in pbar:
-            pbar.set_description(f"iters {iters} best result {sched_none_assignment_num}/{sched_obs_dim} unassigned")
-            iters += 1
+        rollouts = None
+        if async_rollout is not None:
+            # actor 进程使用可能落后的策略快照持续采样，这里只取回结果
+            async_rollout.publish(env)
+            rollout_obs, probs, rollouts = async_rollout.collect(env)
+        elif vec_env is not None:
+            # 一个 episode 内策略固定，reset_step 后的观测相同，只需计算一次概率
             mappo_obs, masks = env.reset_step()
+            rollout_obs = {cid: np.array(obs) for cid, obs in mappo_obs.items()}
             state_list = [mappo_obs[agent.id].flatten() for agent in env.agents]
             mask_list = [masks[agent.id].flatten() for agent in env.agents]
             probs = mappo.take_action(state_list, mask_list)
-            env.apply_mappo_action(probs)
-            result = env.step()
+            rollouts = vec_env.rollout(env, probs, steps_clip)
+
+        pbar = tqdm(range(steps_clip))
+        for step in pbar:
+            pbar.set_description(f"iters {iters} best result {sched_none_assignment_num}/{sched_obs_dim} unassigned")
+            iters += 1
+            if rollouts is not None:
+                mappo_obs = rollout_obs
+                result = rollouts[step]
+            else:
+                mappo_obs, masks = env.reset_step()
+                state_list = [mappo_obs[agent.id].flatten() for agent in env.agents]
+                mask_list = [masks[agent.id].flatten() for agent in env.agents]
+                probs = mappo.take_action(state_list, mask_list)
+                env.apply_mappo_action(probs)
+                result = env.step()
             none_assignment = result['not assignment']
             next_mappo_obs = result['mappo_observations']
             next_states = result['scheduler_observations']
@@ -115,8 +167,13 @@ def train(reader, logger, tools, output_folder, fileName, config, quickrun=False
             #     }
             #     break
             mappo_obs = next_mappo_obs
+            # 并行 rollout 已全部生成且 env 同步为最后一次构造，需要走完本 episode 结果才与 env 一致
+            if rollouts is None and tools.expired():
+                break
         runtime = time.perf_counter() - t0
         a_loss, c_loss, ent = mappo.update(mappo_buffers)
+        if async_rollout is not None:
+            async_rollout.push(mappo.actor)
 
         sched_buffers['rewards'] = sched_reward
         sched_buffers['next_states'] = sched_obs
@@ -134,6 +191,11 @@ def train(reader, logger, tools, output_folder, fileName, config, quickrun=False
             "Avg Scheduler Reward": avg_sched_reward,
             "Avg Mappo Reward": np.mean(Avg_mappo_reward)
         }
+        for search in (searches if len(none_assignment) == 0 else []):
+            # 最后一次构造可行时，在 env 的结果上继续改进
+            improved = search.run(stop=tools.expired)
+            logger.info(f"{search.name}: {improved[search.name + ' before']} -> {improved['Total cost']} in {improved[search.name + ' steps']} steps")
+            result.update(improved)
         if len(none_assignment) == 0: metrics.update(result)
         else: metrics.update(best_result)
         isbest = update_metrics(metrics, sched_none_assignment_num, env, pname, output_folder, runtime)
@@ -152,7 +214,24 @@ def train(reader, logger, tools, output_folder, fileName, config, quickrun=False
             last_sched_reward = -inf
         else:
             _, _, _, none_assignment = env.reset()
-            
 
+        if checkpoint_interval and (episode + 1) % checkpoint_interval == 0:
+            save_checkpoint(ckpt_path, {
+                "episode": episode + 1,
+                "runtime": time.perf_counter() - t0,
+                "mappo": mappo.state_dict(),
+                "scheduler": scheduler.state_dict(),
+                "tools": tools.state_dict(),
+                "env": env_state(env),
+                "rng": rng_state(searches),
+                "loop": {"sched_obs": sched_obs, "sched_mask": sched_mask, "none_assignment": none_assignment, "fail": fail, "last_sched_reward": last_sched_reward},
+            })
+        if tools.expired():
+            break
+
+    if vec_env is not None:
+        vec_env.close()
+    if async_rollout is not None:
+        async_rollout.close()
     runtime = time.perf_counter() - t0
-    conclude(runtime, report, pname, output_folder)
+    conclude(runtime, report, pname, output_folder, reader)
@@ -81,6 +81,21 @@ class MAPPO:
         if os.path.exists(critic_path):
             self.critic.load_state_dict(torch.load(critic_path))
 
+    def state_dict(self):
+        # checkpoint 需要包含优化器状态，才能从中断处继续训练
+        return {
+            "actor": self.actor.state_dict(),
+            "critic": self.critic.state_dict(),
+            "actor_optimizer": self.actor_optimizer.state_dict(),
+            "critic_optimizer": self.critic_optimizer.state_dict(),
+        }
+
+    def load_state_dict(self, state):
+        self.actor.load_state_dict(state["actor"])
+        self.critic.load_state_dict(state["critic"])
+        self.actor_optimizer.load_state_dict(state["actor_optimizer"])
+        self.critic_optimizer.load_state_dict(state["critic_optimizer"])
+
     def take_action(self, state_per_agent, mask_per_agent):
         # actions = []
         action_probs = []
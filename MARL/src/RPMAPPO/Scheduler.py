@@ -1,8 +1,8 @@
 import os
 import torch
-import random
 import torch.nn.functional as F
 import numpy as np
+from MARL.utils.qtable import SparseQTable
 
 class Scheduler:
     def __init__(self, obs_dim, action_dim, config):
@@ -14,41 +14,55 @@ class Scheduler:
         self.max_epsilon = config['train']['sched']['max_epsilon']
         self.min_epsilon = config['train']['sched']['min_epsilon']
         self.decay_rate = config['train']['sched']['decay_rate']
-        self.Qtable = np.zeros((self.obs_dim, self.action_dim)) # ind/state-position
+        self.Qtable = SparseQTable(self.obs_dim, self.action_dim) # ind/state-position, 只存访问过的项
         
     def take_action(self, positions, masks):
-        # epsilon_greedy_policy
-        actions = [pos for ind, pos in enumerate(positions)]
+        # epsilon_greedy_policy：先一次性为所有未分配的位置取动作，再按顺序处理交换
+        pos_array = np.asarray(positions, dtype=np.int64)
+        free = np.flatnonzero(np.asarray(masks) == 0)
+        proposals = self.Qtable.argmax_rows(free)
+        explore = np.random.uniform(0, 1, len(free)) <= self.epsilon
+        # 探索时在 [0, pos) 中均匀取一个位置
+        proposals[explore] = (np.random.uniform(0, 1, explore.sum()) * pos_array[free[explore]]).astype(np.int64)
+        actions = list(positions)
         p2i = {pos:ind for ind, pos in enumerate(positions)}
-        poses = [pos for pos, mask in zip(positions, masks) if mask==0]
-        for ind, (pos, mask) in enumerate(zip(positions, masks)):
-            if mask == 1: continue
-            exploration_exploitation_tradeoff = random.uniform(0, 1)
-            if exploration_exploitation_tradeoff > self.epsilon:
-                action = np.argmax(self.Qtable[ind])
-            else:
-                action = random.randint(0, pos - 1)
+        poses = set(pos_array[free].tolist())
+        for ind, action in zip(free.tolist(), proposals.tolist()):
             if action in poses:
                 continue
-            poses.append(action)
+            poses.add(action)
             actions[ind] = action
-            actions[p2i[action]] = pos
+            actions[p2i[action]] = positions[ind]
         return actions
 
     def update(self, buffers):
-        for ind in range(self.obs_dim):
-            state = buffers["states"][ind]
-            action = buffers["actions"][ind]
-            reward = buffers["rewards"][ind]
-            new_state = buffers["next_states"][ind]
-            self.Qtable[ind, action] += self.lr * (reward + self.gamma * np.max(self.Qtable[:, action]) - self.Qtable[ind, action]) 
+        # 与原来逐行更新稠密表的结果相同（见 SparseQTable.update），所有位置都更新
+        actions = np.asarray(buffers["actions"], dtype=np.int64)
+        rewards = np.asarray(buffers["rewards"], dtype=np.float64)
+        self.Qtable.update(
+            np.arange(self.obs_dim), actions,
+            lambda q, q_max, rows: q + self.lr * (rewards[rows] + self.gamma * q_max - q)
+        )
 
     def set_epsilon(self, episode):
         self.epsilon = self.min_epsilon + (self.max_epsilon - self.min_epsilon) * np.exp(-self.decay_rate * episode)
         return self.epsilon
     
+    def state_dict(self):
+        return {"Qtable": self.Qtable, "epsilon": getattr(self, "epsilon", None)}
+
+    def load_state_dict(self, state):
+        self.Qtable = state["Qtable"]
+        if state["epsilon"] is not None:
+            self.epsilon = state["epsilon"]
+
     def save(self, pname):
-        np.save(f'{self.output_dir}/{pname}/{pname}.npy', self.Qtable)
+        self.Qtable.save(f'{self.output_dir}/{pname}/{pname}.npz')
     
     def load(self, pname):
-        self.Qtable = np.load(f'{self.output_dir}/{pname}/{pname}.npy')
+        path = f'{self.output_dir}/{pname}/{pname}'
+        if os.path.exists(f'{path}.npz'):
+            self.Qtable = SparseQTable.load(f'{path}.npz')
+        else:
+            # 兼容旧的稠密 .npy 格式
+            self.Qtable = SparseQTable.from_dense(np.load(f'{path}.npy'))
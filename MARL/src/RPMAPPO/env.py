@@ -24,8 +24,8 @@ class CustomEnvironment:
         for i, (key, each) in enumerate(self.reader.classes.items()):
             agent = agent_class(each, len(self.reader.classes), self.optimization)
             self.agents.append(agent)
-            if self.roomRelatedClass.get(key, 0) == 0: self.roomRelatedClass[key] = set()
-            self.roomRelatedClass[key].update(agent.rooms)
+            for rid in agent.rooms: # room id -> 可以使用该教室的课程
+                self.roomRelatedClass.setdefault(rid, set()).add(key)
             self.cid2ind[key] = i
         
         self.travel = self.reader.travel
@@ -1,8 +1,11 @@
 import time
 from tqdm import tqdm
 from MARL.Random.env import CustomEnvironment
+from MARL.utils.local_search import LocalSearch
+from MARL.utils.lns import LNS
+from MARL.utils.checkpoint import checkpoint_path, save_checkpoint, load_checkpoint, rng_state, set_rng_state, env_state, set_env_state
 
-def train(reader, logger, tools, output_folder, fileName, config, quickrun=False):
+def train(reader, logger, tools, output_folder, fileName, config, quickrun=False, resume=False):
     pname = fileName.split('.xml')[0]
     update_metrics = tools.update_metrics
     conclude = tools.conclude
@@ -13,14 +16,29 @@ def train(reader, logger, tools, output_folder, fileName, config, quickrun=False
     discount = config['train']['discount']
     steps_clip = config['train']['steps_clip']
     total_episodes = int(config['train']['total_episodes'])
+    checkpoint_interval = config['train'].get('checkpoint_interval', 0)
 
     logger.info(f"{reader.path.name} with {len(reader.courses)} courses, {len(reader.classes)} classes, {len(reader.rooms)} rooms, {len(reader.students)} students, {len(reader.distributions['hard_constraints'])} hard distributions, {len(reader.distributions['soft_constraints'])} soft distributions")
     env = CustomEnvironment(reader, discount)
+    # 构造可行后依次运行的改进阶段
+    searches = [search(env, config) for search in (LocalSearch, LNS) if config.get(search.section, {}).get('enabled')]
     
     epoch = 1
-    t0 = time.perf_counter()
+    start_episode = 0
+    elapsed = 0
+    ckpt_path = checkpoint_path(output_folder, pname)
+    ckpt = load_checkpoint(ckpt_path) if resume else None
+    if ckpt is not None:
+        tools.load_state_dict(ckpt["tools"])
+        set_env_state(env, ckpt["env"])
+        set_rng_state(ckpt["rng"], searches)
+        start_episode = ckpt["episode"]
+        epoch = start_episode + 1
+        elapsed = ckpt["runtime"]
+        logger.info(f"Resumed from {ckpt_path} at episode {start_episode}")
+    t0 = time.perf_counter() - elapsed
 
-    for episode in tqdm(range(total_episodes), desc=f"Training {epoch}"):
+    for episode in tqdm(range(start_episode, total_episodes), desc=f"Training {epoch}"):
         epoch += 1
         observations, none_assignment = env.reset()
         iters = 0
@@ -28,23 +46,36 @@ def train(reader, logger, tools, output_folder, fileName, config, quickrun=False
         t0_ep = time.perf_counter()
         while len(none_assignment) > 0:
             iters += 1
-            if iters > steps_clip:
+            if iters > steps_clip or tools.expired():
                 break
             result = env.step()
             none_assignment = result['not assignment']
             observations = env.reset_step()
         runtime = time.perf_counter() - t0_ep
-        if len(none_assignment) > 0:
-            continue
-        metrics = {
-            "runtime": runtime,
-            "episode_lengths": iters
-        }
-        result.update(metrics)
-        isbest = update_metrics(result, none_assignment, env, pname, output_folder, runtime)
-        if isbest and quickrun:
+        if len(none_assignment) == 0:
+            for search in searches:
+                improved = search.run(stop=tools.expired)
+                logger.info(f"{search.name}: {improved[search.name + ' before']} -> {improved['Total cost']} in {improved[search.name + ' steps']} steps")
+                result.update(improved)
+            metrics = {
+                "runtime": runtime,
+                "episode_lengths": iters
+            }
+            result.update(metrics)
+            isbest = update_metrics(result, none_assignment, env, pname, output_folder, runtime)
+            if isbest and quickrun:
+                break
+        if checkpoint_interval and (episode + 1) % checkpoint_interval == 0:
+            save_checkpoint(ckpt_path, {
+                "episode": episode + 1,
+                "runtime": time.perf_counter() - t0,
+                "tools": tools.state_dict(),
+                "env": env_state(env),
+                "rng": rng_state(searches),
+            })
+        if tools.expired():
             break
 
     runtime = time.perf_counter() - t0
 
-    conclude(runtime, report, pname, output_folder)
+    conclude(runtime, report, pname, output_folder, reader)
@@ -1,14 +1,105 @@
 # marlapp/consumers.py
 import json
+import time
+import asyncio
+from django.conf import settings
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
+from .jobs import get_manager, job_group
 
 class TrainingConsumer(AsyncWebsocketConsumer):
+    """
+    每个求解任务一个 group：连接 ws/train/<job_id>/ 或发送
+    {"action": "subscribe", "job": "<job_id>"} 订阅，订阅时先返回任务的最新状态快照。
+    推送按连接节流：间隔内到达的进度只保留最新一条，到期后再发送。
+    与 HTTP 任务接口相同，只能订阅自己提交的任务；未登录的连接直接关闭。
+    """
     async def connect(self):
-        await self.channel_layer.group_add("train_channel", self.channel_name)
+        self.jobs = set()
+        self.user = self.scope.get("user")
+        if self.user is None or not self.user.is_authenticated:
+            await self.close()
+            return
+        self.throttle = getattr(settings, "SOLVER_WS_THROTTLE", 0.5)
+        self.last_sent = {}
+        self.pending = {}
+        self.flush_tasks = {}
         await self.accept()
+        job_id = self.scope["url_route"]["kwargs"].get("job_id")
+        if job_id:
+            await self.subscribe(job_id)
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard("train_channel", self.channel_name)
+        for job_id in list(self.jobs):
+            await self.unsubscribe(job_id)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            message = json.loads(text_data or "{}")
+        except json.JSONDecodeError:
+            await self.send(text_data=json.dumps({"error": "invalid JSON"}))
+            return
+        action, job_id = message.get("action"), message.get("job")
+        if not job_id:
+            await self.send(text_data=json.dumps({"error": "missing job"}))
+        elif action == "subscribe":
+            await self.subscribe(job_id)
+        elif action == "unsubscribe":
+            await self.unsubscribe(job_id)
+        else:
+            await self.send(text_data=json.dumps({"error": f"unknown action: {action}"}))
+
+    async def subscribe(self, job_id):
+        # 任务状态在数据库中，任一进程都能返回快照
+        job = await database_sync_to_async(get_manager().status)(job_id)
+        # 其他用户的任务按不存在处理，不泄露快照
+        if job is None or job["owner"] != self.user.pk:
+            await self.send(text_data=json.dumps({"error": "job not found", "job": job_id}))
+            return
+        if job_id not in self.jobs:
+            self.jobs.add(job_id)
+            await self.channel_layer.group_add(job_group(job_id), self.channel_name)
+        await self.send(text_data=json.dumps({"type": "snapshot", "job": job_id, "data": job}, default=float))
+
+    async def unsubscribe(self, job_id):
+        if job_id not in self.jobs:
+            return
+        self.jobs.discard(job_id)
+        await self.channel_layer.group_discard(job_group(job_id), self.channel_name)
+        task = self.flush_tasks.pop(job_id, None)
+        if task is not None:
+            task.cancel()
+        self.pending.pop(job_id, None)
 
     async def send_log(self, event):
-        await self.send(text_data=json.dumps(event["data"]))
+        data = event["data"]
+        job_id = data.get("job")
+        if job_id not in self.jobs:
+            return
+        wait = self.last_sent.get(job_id, 0) + self.throttle - time.monotonic()
+        # 任务结束的消息不节流，保证前端拿到最终状态
+        if wait <= 0 or data.get("status") in ("finished", "failed", "cancelled"):
+            self.pending.pop(job_id, None)
+            await self._send_progress(job_id, data)
+            return
+        self.pending[job_id] = data
+        if job_id not in self.flush_tasks:
+            self.flush_tasks[job_id] = asyncio.ensure_future(self._flush(job_id, wait))
+
+    async def send_best(self, event):
+        # 新的最优解很少出现，不节流
+        data = event["data"]
+        job_id = data.get("job")
+        if job_id in self.jobs:
+            await self.send(text_data=json.dumps({"type": "best", "job": job_id, "data": data}, default=float))
+
+    async def _flush(self, job_id, wait):
+        await asyncio.sleep(wait)
+        self.flush_tasks.pop(job_id, None)
+        data = self.pending.pop(job_id, None)
+        if data is not None:
+            await self._send_progress(job_id, data)
+
+    async def _send_progress(self, job_id, data):
+        self.last_sent[job_id] = time.monotonic()
+        await self.send(text_data=json.dumps({"type": "progress", "job": job_id, "data": data}, default=float))
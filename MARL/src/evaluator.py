@@ -0,0 +1,321 @@
+"""
+本地 ITC2019 解评估器：按 ITC2019 规则计算硬约束可行性以及
+time / room / distribution / student 惩罚，不依赖 itc2019.org 在线验证。
+约束按类别批量在 numpy 数组上计算（两两约束用广播得到上三角违反矩阵）。
+"""
+import itertools
+import numpy as np
+import xml.etree.ElementTree as ET
+
+def load_solution(path):
+    """读取 solution XML，返回 cid -> (time_bits or None, room_id or None, student_ids)"""
+    root = ET.parse(str(path)).getroot()
+    solution = {}
+    for c in root.findall("class"):
+        cid = c.attrib["id"]
+        if "start" in c.attrib:
+            time_bits = (c.attrib.get("weeks"), c.attrib.get("days"), int(c.attrib["start"]), None)
+        else:
+            time_bits = None
+        students = [s.attrib["id"] for s in c.findall("student") if "id" in s.attrib]
+        solution[cid] = (time_bits, c.attrib.get("room"), students)
+    return solution
+
+def from_assignments(assignments):
+    """把 env.results() 的 cid -> (time_option, room_required, room_id, student_ids) 转为评估格式"""
+    solution = {}
+    for cid, (time_option, room_required, room_id, student_ids) in assignments.items():
+        time_bits = time_option['optional_time_bits'] if time_option is not None else None
+        solution[cid] = (time_bits, room_id if room_required else None, student_ids or [])
+    return solution
+
+def _first(bits):
+    return bits.find('1')
+
+def _upper(mat):
+    return int(np.triu(mat, k=1).sum())
+
+class Evaluator:
+    def __init__(self, reader):
+        self.reader = reader
+        self.optimization = reader.optimization or {"time": 0, "room": 0, "distribution": 0, "student": 0}
+        self.nrWeeks = reader.nrWeeks
+        self.nrDays = reader.nrDays
+
+        self.rid2idx = {rid: i for i, rid in enumerate(reader.rooms.keys())}
+        n_rooms = len(self.rid2idx)
+        self.travel = np.zeros((n_rooms + 1, n_rooms + 1), dtype=np.int64) # 最后一行/列代表“无教室”
+        for r1, others in (reader.travel or {}).items():
+            for r2, value in others.items():
+                if r1 in self.rid2idx and r2 in self.rid2idx:
+                    self.travel[self.rid2idx[r1], self.rid2idx[r2]] = value
+
+        self.unavailables = {}
+        for rid, room in reader.rooms.items():
+            rows = [(int(w, 2), int(d, 2), s, s + l) for w, d, s, l in room["unavailables_bits"]]
+            if rows:
+                self.unavailables[rid] = np.array(rows, dtype=np.int64)
+
+        # (weeks, days, start) -> (length, penalty)，(room id) -> penalty
+        self.time_options = {}
+        self.room_options = {}
+        for cid, cls in reader.classes.items():
+            self.time_options[cid] = {
+                (t["optional_time_bits"][0], t["optional_time_bits"][1], t["optional_time_bits"][2]): (t["optional_time_bits"][3], t["penalty"])
+                for t in cls["time_options"]
+            }
+            self.room_options[cid] = {r["id"]: r["penalty"] for r in cls["room_options"]}
+
+    # ---------- 解码 ----------
+    def _decode(self, solution):
+        cids = list(self.reader.classes.keys())
+        n = len(cids)
+        self.cid2idx = {cid: i for i, cid in enumerate(cids)}
+        assigned = np.zeros(n, dtype=bool)
+        start = np.zeros(n, dtype=np.int64)
+        end = np.zeros(n, dtype=np.int64)
+        days = np.zeros(n, dtype=np.int64)
+        weeks = np.zeros(n, dtype=np.int64)
+        room = np.full(n, len(self.rid2idx), dtype=np.int64)
+        first_week = np.zeros(n, dtype=np.int64)
+        first_day = np.zeros(n, dtype=np.int64)
+        weeks_bits = [None] * n
+        days_bits = [None] * n
+        room_ids = [None] * n
+        time_penalty = 0
+        room_penalty = 0
+        invalid = []
+        unassigned = []
+        for i, cid in enumerate(cids):
+            time_bits, room_id, _ = solution.get(cid, (None, None, []))
+            cls = self.reader.classes[cid]
+            if time_bits is None or (cls["room_required"] and room_id is None):
+                unassigned.append(cid)
+                continue
+            w, d, s = time_bits[0], time_bits[1], time_bits[2]
+            option = self.time_options[cid].get((w, d, s))
+            if option is None:
+                invalid.append(cid)
+                continue
+            length, penalty = option
+            time_penalty += penalty
+            if cls["room_required"]:
+                if room_id not in self.room_options[cid]:
+                    invalid.append(cid)
+                    continue
+                room_penalty += self.room_options[cid][room_id]
+                room[i] = self.rid2idx[room_id]
+                room_ids[i] = room_id
+            assigned[i] = True
+            start[i], end[i] = s, s + length
+            days[i], weeks[i] = int(d, 2), int(w, 2)
+            first_week[i], first_day[i] = _first(w), _first(d)
+            weeks_bits[i], days_bits[i] = w, d
+        self.arrays = {
+            "start": start, "end": end, "days": days, "weeks": weeks, "room": room,
+            "first_week": first_week, "first_day": first_day,
+        }
+        self.weeks_bits, self.days_bits, self.room_ids = weeks_bits, days_bits, room_ids
+        self.assigned = assigned
+        return time_penalty, room_penalty, unassigned, invalid
+
+    # ---------- 教室 ----------
+    def _room_violations(self):
+        a = self.arrays
+        conflicts = 0
+        unavailable = 0
+        by_room = {}
+        for i in np.flatnonzero(self.assigned & (a["room"] < len(self.rid2idx))):
+            by_room.setdefault(self.room_ids[i], []).append(i)
+        for rid, idx in by_room.items():
+            idx = np.array(idx)
+            s, e, d, w = a["start"][idx], a["end"][idx], a["days"][idx], a["weeks"][idx]
+            if len(idx) > 1:
+                overlap = (s[:, None] < e[None, :]) & (s[None, :] < e[:, None]) & \
+                          ((d[:, None] & d[None, :]) != 0) & ((w[:, None] & w[None, :]) != 0)
+                conflicts += _upper(overlap)
+            if rid in self.unavailables:
+                u = self.unavailables[rid]
+                hit = (s[:, None] < u[None, :, 3]) & (u[None, :, 2] < e[:, None]) & \
+                      ((d[:, None] & u[None, :, 1]) != 0) & ((w[:, None] & u[None, :, 0]) != 0)
+                unavailable += int(hit.any(axis=1).sum())
+        return conflicts, unavailable
+
+    # ---------- 分布约束 ----------
+    def _pairwise(self, base, attr, idx):
+        a = self.arrays
+        s, e, d, w, r = (a[k][idx] for k in ("start", "end", "days", "weeks", "room"))
+        si, sj, ei, ej = s[:, None], s[None, :], e[:, None], e[None, :]
+        di, dj, wi, wj = d[:, None], d[None, :], w[:, None], w[None, :]
+        no_days = (di & dj) == 0
+        no_weeks = (wi & wj) == 0
+        has_room = (r < len(self.rid2idx))
+        both_rooms = has_room[:, None] & has_room[None, :]
+        if base == "SameStart":
+            viol = si != sj
+        elif base == "SameTime":
+            viol = ~(((si <= sj) & (ej <= ei)) | ((sj <= si) & (ei <= ej)))
+        elif base == "DifferentTime":
+            viol = ~((ei <= sj) | (ej <= si))
+        elif base == "SameDays":
+            o = di | dj
+            viol = ~((o == di) | (o == dj))
+        elif base == "DifferentDays":
+            viol = ~no_days
+        elif base == "SameWeeks":
+            o = wi | wj
+            viol = ~((o == wi) | (o == wj))
+        elif base == "DifferentWeeks":
+            viol = ~no_weeks
+        elif base == "Overlap":
+            viol = ~((sj < ei) & (si < ej) & ~no_days & ~no_weeks)
+        elif base == "NotOverlap":
+            viol = ~((ei <= sj) | (ej <= si) | no_days | no_weeks)
+        elif base == "SameRoom":
+            viol = both_rooms & (r[:, None] != r[None, :])
+        elif base == "DifferentRoom":
+            viol = both_rooms & (r[:, None] == r[None, :])
+        elif base == "SameAttendees":
+            t_ij = self.travel[r[:, None], r[None, :]]
+            t_ji = self.travel[r[None, :], r[:, None]]
+            viol = ~((ei + t_ij <= sj) | (ej + t_ji <= si) | no_days | no_weeks)
+        elif base == "Precedence":
+            fwi, fwj = a["first_week"][idx][:, None], a["first_week"][idx][None, :]
+            fdi, fdj = a["first_day"][idx][:, None], a["first_day"][idx][None, :]
+            viol = ~((fwi < fwj) | ((fwi == fwj) & ((fdi < fdj) | ((fdi == fdj) & (ei <= sj)))))
+        elif base == "WorkDay":
+            S = int(attr)
+            viol = ~(no_days | no_weeks | (np.maximum(ei, ej) - np.minimum(si, sj) <= S))
+        elif base == "MinGap":
+            G = int(attr)
+            viol = ~(no_days | no_weeks | (ei + G <= sj) | (ej + G <= si))
+        else:
+            return None
+        return _upper(viol)
+
+    def _day_blocks(self, idx, S, strict):
+        """按 (week, day) 合并成块：间隔 ≤ S（strict 时 < S）的课程属于同一块"""
+        a = self.arrays
+        for w in range(self.nrWeeks):
+            for d in range(self.nrDays):
+                meet = [i for i in idx if self.weeks_bits[i][w] == '1' and self.days_bits[i][d] == '1']
+                if not meet:
+                    continue
+                intervals = sorted((a["start"][i], a["end"][i]) for i in meet)
+                blocks = []
+                for s, e in intervals:
+                    if blocks and (blocks[-1][1] + S > s if strict else blocks[-1][1] + S >= s):
+                        blocks[-1][1] = max(blocks[-1][1], e)
+                        blocks[-1][2] += 1
+                    else:
+                        blocks.append([s, e, 1])
+                yield blocks
+
+    def _aggregate(self, base, attr, idx, hard=False):
+        # 软约束按 ITC2019 规则把各 (week, day) 的超出量求和后除以周数；硬约束只要有超出即违反
+        a = self.arrays
+        weeks = 1 if hard else self.nrWeeks
+        if base == "MaxDays":
+            D = int(attr)
+            days = 0
+            for i in idx:
+                days |= int(a["days"][i])
+            return max(bin(days).count("1") - D, 0)
+        if base == "MaxDayLoad":
+            S = int(attr)
+            W = np.array([[c == '1' for c in self.weeks_bits[i]] for i in idx], dtype=np.int64)
+            D = np.array([[c == '1' for c in self.days_bits[i]] for i in idx], dtype=np.int64)
+            length = (a["end"][idx] - a["start"][idx])
+            load = np.einsum("kw,kd,k->wd", W, D, length)
+            return int(np.maximum(load - S, 0).sum()) // weeks
+        if base == "MaxBreaks":
+            R, S = map(int, attr.split(","))
+            excess = sum(max(len(blocks) - 1 - R, 0) for blocks in self._day_blocks(idx, S, strict=False))
+            return excess // weeks
+        if base == "MaxBlock":
+            M, S = map(int, attr.split(","))
+            over = sum(1 for blocks in self._day_blocks(idx, S, strict=True) for s, e, n in blocks if n > 1 and e - s > M)
+            return over // weeks
+        return None
+
+    def _distribution(self, cons):
+        ctype = cons["type"]
+        if "(" in ctype:
+            base, attr = ctype.split("(")[0], ctype.split("(")[1].split(")")[0]
+        else:
+            base, attr = ctype, None
+        idx = np.array([self.cid2idx[c] for c in cons["classes"] if self.assigned[self.cid2idx[c]]], dtype=np.int64)
+        if len(idx) == 0:
+            return 0
+        if base in ("MaxDays", "MaxDayLoad", "MaxBreaks", "MaxBlock"):
+            return self._aggregate(base, attr, idx, hard=cons["required"])
+        if len(idx) < 2:
+            return 0
+        viol = self._pairwise(base, attr, idx)
+        return viol or 0
+
+    # ---------- 学生 ----------
+    def _student_conflicts(self, solution):
+        a = self.arrays
+        enrolled = {}
+        for cid, (_, _, students) in solution.items():
+            if cid not in self.cid2idx or not self.assigned[self.cid2idx[cid]]:
+                continue
+            for sid in students:
+                enrolled.setdefault(sid, []).append(self.cid2idx[cid])
+        pairs = [pair for idx in enrolled.values() for pair in itertools.combinations(idx, 2)]
+        if not pairs:
+            return 0
+        pairs = np.array(pairs, dtype=np.int64)
+        i, j = pairs[:, 0], pairs[:, 1]
+        si, sj, ei, ej = a["start"][i], a["start"][j], a["end"][i], a["end"][j]
+        ri, rj = a["room"][i], a["room"][j]
+        no_days = (a["days"][i] & a["days"][j]) == 0
+        no_weeks = (a["weeks"][i] & a["weeks"][j]) == 0
+        ok = (ei + self.travel[ri, rj] <= sj) | (ej + self.travel[rj, ri] <= si) | no_days | no_weeks
+        return int((~ok).sum())
+
+    def evaluate(self, solution):
+        time_penalty, room_penalty, unassigned, invalid = self._decode(solution)
+        room_conflicts, room_unavailable = self._room_violations()
+        hard_violated = []
+        for cons in self.reader.distributions.get("hard_constraints", []):
+            if self._distribution(cons):
+                hard_violated.append(cons["type"])
+        distribution_penalty = 0
+        for cons in self.reader.distributions.get("soft_constraints", []):
+            viol = self._distribution(cons)
+            if viol:
+                distribution_penalty += viol * (cons["penalty"] or 0)
+        student_conflicts = self._student_conflicts(solution)
+        total_cost = self.optimization["time"] * time_penalty + \
+                        self.optimization["room"] * room_penalty + \
+                        self.optimization["distribution"] * distribution_penalty + \
+                        self.optimization["student"] * student_conflicts
+        valid = not (unassigned or invalid or room_conflicts or room_unavailable or hard_violated)
+        return {
+            "instance": self.reader.problem_name,
+            "valid": "valid" if valid else "invalid",
+            "Total cost": total_cost,
+            "Time penalty": time_penalty,
+            "Room penalty": room_penalty,
+            "Distribution penalty": distribution_penalty,
+            "Student conflicts": student_conflicts,
+            "Hard violations": {
+                "not assignment": unassigned,
+                "invalid options": invalid,
+                "room conflicts": room_conflicts,
+                "room unavailable": room_unavailable,
+                "distributions": hard_violated,
+            }
+        }
+
+def evaluate(reader, solution):
+    """
+    solution 可以是 solution XML 路径，也可以是 env.results() 返回的分配字典。
+    """
+    if isinstance(solution, dict):
+        solution = from_assignments(solution)
+    else:
+        solution = load_solution(solution)
+    return Evaluator(reader).evaluate(solution)
@@ -1,25 +1,71 @@
-import threading
-import time
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
+import sys
+import pathlib
+import yaml
 
-def start_training_thread():
-    t = threading.Thread(target=train_loop, daemon=True)
-    t.start()
+folder = pathlib.Path(__file__).parent.resolve()
+# 求解器模块按 MARL/src 为根导入（与命令行运行 main.py 一致）
+if str(folder) not in sys.path:
+    sys.path.append(str(folder))
 
-def train_loop():
-    channel_layer = get_channel_layer()
-    print(channel_layer.__getstate__)
-    for epoch in range(200):
-        time.sleep(0.1)
+def default_config(overrides=None):
+    """读取 MARL/src/config.yaml，并用请求中的同名字段逐层覆盖"""
+    # 直接读取 yaml，web 进程不导入 torch 等求解依赖
+    with open(f"{folder}/config.yaml", "r") as f:
+        config = yaml.safe_load(f)
+    _merge(config, overrides or {})
+    return config
 
-        log = {
-            "epoch": epoch,
-            "loss": epoch * 0.01,
-            "reward": 100 - epoch * 0.2,
-        }
-        # 广播给所有连接的前端
-        async_to_sync(channel_layer.group_send)(
-            "train_channel",
-            {"type": "send_log", "data": log}
-        )
+def _merge(base, overrides):
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            _merge(base[key], value)
+        else:
+            base[key] = value
+
+WEB_METHODS = ("Random", "PMAPPO", "RPMAPPO")
+
+def instance_path(config, name):
+    """data.folder 下的实例文件；不是该目录中已有的 .xml 文件时抛 ValueError"""
+    data_folder = pathlib.Path(config['data']['folder']).resolve()
+    path = (data_folder / name).resolve()
+    if path.parent != data_folder or path.suffix != ".xml" or not path.is_file():
+        raise ValueError(f"instance {name!r} not found in the data folder")
+    return path
+
+def web_config(method=None, file=None, time_budget=None, max_time_budget=600):
+    """
+    web 提交的任务只能选择方法、数据目录中的实例和不超过 max_time_budget 的限时，
+    其余配置（输出目录、数据目录、训练轮数等）一律取 config.yaml
+    """
+    config = default_config()
+    if method is not None:
+        if method not in WEB_METHODS:
+            raise ValueError(f"unknown method {method!r}")
+        config['method']['name'] = method
+    if file is not None:
+        config['data']['file'] = instance_path(config, file).name
+    config['data']['isthrough'] = False
+    config.setdefault('resolve', {})['previous'] = None
+    config['train']['time_budget'] = min(time_budget or max_time_budget, max_time_budget)
+    return config
+
+def run_job(job_id, config, conn):
+    """求解进程入口：运行一次 main()，进度经管道回传给 JobManager"""
+    import os
+    import traceback
+    from utils.progress import ProgressStream, PipeLayer
+    # 降低求解进程优先级，保证 web 请求延迟
+    os.nice(5)
+    # 独立的进程组：取消任务时连同 VecEnv / actor / 分解求解的子进程一起终止
+    os.setsid()
+    progress = ProgressStream(job_id, channel_layer=PipeLayer(conn), interval=config.get('metrics', {}).get('stream_interval', 0.2))
+    try:
+        # 求解依赖（torch 等）缺失时的导入错误同样回传给任务状态
+        from main import main
+        main(config, progress=progress)
+    except Exception:
+        progress.close()
+        conn.send(("error", job_id, traceback.format_exc(limit=5)))
+        raise
+    progress.close()
+    conn.close()
@@ -0,0 +1,294 @@
+"""
+求解任务管理：求解进程槽位 + 等待队列，任务状态保存在数据库（MARL.models.Job）中。
+多个 web 进程共享同一份任务表：任一进程都能提交、查询和取消任务，
+排队的任务由各进程的 JobManager 认领，同时运行的任务总数不超过 max_workers（全部进程合计）。
+求解在认领进程启动的子进程中运行，不与 ASGI 进程争用 GIL；进度经管道回传，
+由该进程写入任务表（按 progress_interval 节流）并推送到 WebSocket。
+"""
+import os
+import signal
+import time
+import uuid
+import socket
+import threading
+import multiprocessing as mp
+from multiprocessing.connection import wait
+from django.db import transaction, close_old_connections
+from ..models import Job
+from .interface import run_job
+from .utils.progress import ProgressStream
+
+def job_group(job_id):
+    return f"train_{job_id}"
+
+QUEUED, RUNNING, FINISHED, FAILED, CANCELLED = "queued", "running", "finished", "failed", "cancelled"
+
+class JobQueueFull(Exception):
+    pass
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class JobManager:
+    def __init__(self, max_workers=2, max_queued=16, stream_interval=0.2, poll_interval=1.0, progress_interval=1.0):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.stream_interval = stream_interval
+        self.progress_interval = progress_interval # 进度写入任务表的最小间隔
+        self.poll_interval = poll_interval # 没有运行中的任务时检查队列的间隔
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        # spawn：不在多线程的 web 进程里 fork
+        self.ctx = mp.get_context("spawn")
+        # 本进程启动的求解进程
+        self.processes = {}
+        self.conns = {}
+        self.streams = {}
+        self.progress = {} # job_id -> (上次写入进度的时间, 尚未写入的最新进度)
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self._recover()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _stream(self, job_id):
+        return ProgressStream(job_group(job_id), interval=self.stream_interval)
+
+    # ---------- 查询与提交（任一进程） ----------
+    def submit(self, config, owner=None):
+        with transaction.atomic():
+            if Job.objects.select_for_update().filter(status=QUEUED).count() >= self.max_queued:
+                raise JobQueueFull(f"too many queued jobs (max {self.max_queued})")
+            job = Job.objects.create(
+                id=uuid.uuid4().hex,
+                owner_id=owner,
+                status=QUEUED,
+                method=config['method']['name'],
+                instance=config['data']['file'],
+                config=config,
+                time_budget=config.get('train', {}).get('time_budget') or None,
+                created=time.time(),
+            )
+        self.wakeup.set()
+        return job.as_dict()
+
+    def status(self, job_id):
+        job = Job.objects.filter(pk=job_id).first()
+        return job.as_dict() if job is not None else None
+
+    def best_solution(self, job_id):
+        """返回 (任务状态, 最优解)；任务不存在时为 (None, None)，还没有可行解时最优解为 None"""
+        job = Job.objects.filter(pk=job_id).first()
+        if job is None:
+            return None, None
+        best = {**job.best, "solution": job.solution} if job.best is not None else None
+        return job.as_dict(), best
+
+    def list(self, owner=None):
+        """全部任务；给出 owner 时只返回该用户提交的任务"""
+        jobs = Job.objects.defer('config', 'solution')
+        if owner is not None:
+            jobs = jobs.filter(owner_id=owner)
+        return [job.as_dict() for job in jobs]
+
+    def cancel(self, job_id):
+        """排队的任务直接取消；运行中的任务由启动它的进程在下一次轮询时终止"""
+        if Job.objects.filter(pk=job_id, status=QUEUED).update(status=CANCELLED, finished=time.time()):
+            self._announce(job_id, CANCELLED)
+        elif Job.objects.filter(pk=job_id, status=RUNNING).update(cancel_requested=True):
+            with self.lock:
+                if job_id in self.processes:
+                    self._terminate(job_id)
+                    self._dispatch()
+        return self.status(job_id)
+
+    # ---------- 本进程运行的任务（调用方需持有 self.lock） ----------
+    def _update(self, job_id, **fields):
+        Job.objects.filter(pk=job_id).update(**fields)
+
+    def _announce(self, job_id, status, error=None):
+        stream = self.streams.pop(job_id, None) or self._stream(job_id)
+        stream.publish({"job": job_id, "status": status, "error": error})
+        stream.close()
+
+    def _finish(self, job_id, status, error=None):
+        fields = {"status": status, "finished": time.time()}
+        if error is not None:
+            fields["error"] = error
+        Job.objects.filter(pk=job_id, status=RUNNING).update(**fields)
+        self._announce(job_id, status, Job.objects.filter(pk=job_id).values_list('error', flat=True).first())
+
+    def _group(self, process):
+        """求解进程是否已 setsid 成为进程组组长（刚启动时可能还没有）"""
+        try:
+            return os.getpgid(process.pid) == process.pid
+        except ProcessLookupError:
+            return False
+
+    def _terminate(self, job_id):
+        process = self.processes.pop(job_id)
+        # 求解进程启动的 VecEnv / actor / 分解求解子进程在同一进程组中，一并终止
+        group = self._group(process)
+        if group:
+            os.killpg(process.pid, signal.SIGTERM)
+        else:
+            process.terminate()
+        process.join(5)
+        if group:
+            try:
+                # 没有响应 SIGTERM 的进程
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        elif process.is_alive():
+            process.kill()
+        process.join()
+        self.conns.pop(job_id).close()
+        self.progress.pop(job_id, None)
+        self._finish(job_id, CANCELLED)
+
+    def _recover(self):
+        """本机上已退出的 web 进程留下的运行中任务标记为失败"""
+        host = socket.gethostname()
+        for job_id, worker in Job.objects.filter(status=RUNNING).values_list('pk', 'worker'):
+            name, _, pid = worker.rpartition(":")
+            if name == host and pid.isdigit() and (worker == self.worker or not _alive(int(pid))):
+                Job.objects.filter(pk=job_id, status=RUNNING).update(status=FAILED, finished=time.time(), error="worker process exited")
+
+    def _claim(self):
+        """认领最早的排队任务；全部进程运行中的任务已达 max_workers 或没有排队任务时返回 None"""
+        with transaction.atomic():
+            # 锁住所有活动任务，多个进程的认领依次进行
+            active = list(Job.objects.select_for_update().filter(status__in=(QUEUED, RUNNING)).values_list('pk', 'status'))
+            if sum(1 for _, status in active if status == RUNNING) >= self.max_workers:
+                return None
+            job = Job.objects.filter(status=QUEUED).order_by('created').first()
+            if job is None:
+                return None
+            Job.objects.filter(pk=job.pk).update(status=RUNNING, started=time.time(), worker=self.worker)
+            return job
+
+    def _dispatch(self):
+        while True:
+            job = self._claim()
+            if job is None:
+                return
+            conn, child_conn = self.ctx.Pipe(duplex=False)
+            process = self.ctx.Process(target=run_job, args=(job.pk, job.config, child_conn), daemon=True)
+            try:
+                process.start()
+            except Exception as e:
+                # 启动失败不能让轮询线程退出，否则本进程认领的任务会一直停在 running
+                conn.close()
+                child_conn.close()
+                self._finish(job.pk, FAILED, f"failed to start solver process: {e}")
+                continue
+            child_conn.close()
+            self.processes[job.pk] = process
+            self.conns[job.pk] = conn
+            self.streams[job.pk] = self._stream(job.pk)
+
+    def _handle(self, job_id, event):
+        kind, _, data = event
+        if kind == "progress":
+            written, _ = self.progress.get(job_id, (0, None))
+            self.progress[job_id] = (written, data)
+            self._write_progress(job_id)
+            self.streams[job_id].publish({"job": job_id, **data})
+        elif kind == "best":
+            # best 只保留惩罚摘要，完整解由 best_solution() 返回
+            summary = {key: value for key, value in data.items() if key != "solution"}
+            self._update(job_id, best=summary, solution=data.get("solution"))
+            self.streams[job_id].publish_best({"job": job_id, **summary})
+        elif kind == "error":
+            self._update(job_id, error=data)
+
+    def _write_progress(self, job_id, force=False):
+        written, data = self.progress.get(job_id, (0, None))
+        if data is None or (not force and time.monotonic() - written < self.progress_interval):
+            return
+        self._update(job_id, progress=data)
+        self.progress[job_id] = (time.monotonic(), None)
+
+    def _receive(self, job_id):
+        # 返回 False 表示子进程一端已关闭
+        conn = self.conns[job_id]
+        try:
+            while conn.poll():
+                self._handle(job_id, conn.recv())
+        except (EOFError, OSError):
+            return False
+        return True
+
+    def _reap(self):
+        for job_id, process in list(self.processes.items()):
+            if process.is_alive():
+                continue
+            process.join()
+            # 先读完管道中剩余的进度，再标记结束
+            self._receive(job_id)
+            self.conns.pop(job_id).close()
+            del self.processes[job_id]
+            self._write_progress(job_id, force=True)
+            self.progress.pop(job_id, None)
+            if process.exitcode == 0:
+                self._finish(job_id, FINISHED)
+            else:
+                self._finish(job_id, FAILED, None if self._error(job_id) else f"exit code {process.exitcode}")
+
+    def _error(self, job_id):
+        return Job.objects.filter(pk=job_id).values_list('error', flat=True).first()
+
+    def _cancelled(self):
+        """其他进程请求取消的、由本进程运行的任务"""
+        if not self.processes:
+            return []
+        return list(Job.objects.filter(pk__in=list(self.processes), cancel_requested=True).values_list('pk', flat=True))
+
+    def _run(self):
+        while True:
+            with self.lock:
+                conns = {conn: job_id for job_id, conn in self.conns.items()}
+            if conns:
+                ready = wait(list(conns), timeout=0.2)
+            else:
+                ready = []
+                self.wakeup.wait(self.poll_interval)
+                self.wakeup.clear()
+            close_old_connections()
+            with self.lock:
+                for conn in ready:
+                    job_id = conns[conn]
+                    if job_id in self.conns:
+                        self._receive(job_id)
+                self._reap()
+                for job_id in list(self.progress):
+                    self._write_progress(job_id)
+                for job_id in self._cancelled():
+                    self._terminate(job_id)
+                self._dispatch()
+
+_manager = None
+_manager_lock = threading.Lock()
+
+def get_manager():
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            from django.conf import settings
+            _manager = JobManager(
+                max_workers=getattr(settings, "SOLVER_MAX_JOBS", 2),
+                max_queued=getattr(settings, "SOLVER_MAX_QUEUED", 16),
+                stream_interval=getattr(settings, "SOLVER_STREAM_INTERVAL", 0.2),
+                progress_interval=getattr(settings, "SOLVER_PROGRESS_INTERVAL", 1.0),
+            )
+            _manager.start()
+        return _manager
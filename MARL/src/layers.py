@@ -0,0 +1,423 @@
+"""
+无需外部 broker 的跨进程 channel layer（单机）。
+同一台机器上的进程通过 Unix domain socket 连到一个 hub：第一个拿到文件锁的进程在后台线程中运行 hub，
+hub 只维护 group 成员和“channel 属于哪个进程”的路由表，消息仍投递到接收进程本地的队列。
+发送方的写线程把排队的帧合并成一批写出，hub 对同一目标进程的投递也按批合并，
+因此 group_send 的开销与连接数无关、与进程数成正比。
+hub 所在进程退出后，其余进程自动重连并重新选出 hub，重新登记自己的 channel 和 group。
+hub 对每个连接使用非阻塞写和各自的发送缓冲，读得慢的进程不影响其他进程；积压超过 max_pending 的连接被断开（随后重连）。
+本地队列中超过 expiry 秒未被接收的消息被丢弃；消费者断开（receive 被取消）后删除它的队列。
+
+settings.py:
+    CHANNEL_LAYERS = {"default": {"BACKEND": "MARL.src.layers.UnixSocketChannelLayer",
+                                  "CONFIG": {"path": "/tmp/ett_channels.sock"}}}
+"""
+import os
+import json
+import time
+import uuid
+import queue
+import fcntl
+import socket
+import struct
+import logging
+import asyncio
+import tempfile
+import threading
+import selectors
+from collections import deque
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+_HEADER = struct.Struct("!I")
+logger = logging.getLogger(__name__)
+
+def _encode(frame):
+    data = json.dumps(frame, default=float).encode()
+    return _HEADER.pack(len(data)) + data
+
+def _encode_batch(frames):
+    """编码一批帧；有不能序列化的消息时逐条编码并丢弃这些消息，返回 None 表示整批都被丢弃"""
+    try:
+        return _encode(["batch", frames])
+    except (TypeError, ValueError):
+        kept = []
+        for frame in frames:
+            try:
+                json.dumps(frame, default=float)
+            except (TypeError, ValueError) as e:
+                logger.error("dropping %s to %s: message is not JSON serialisable (%s)", frame[0], frame[1], e)
+                continue
+            kept.append(frame)
+        return _encode(["batch", kept]) if kept else None
+
+def _decode(buffer):
+    """从缓冲区切出完整帧，返回 (帧列表, 剩余字节)"""
+    frames = []
+    while len(buffer) >= _HEADER.size:
+        size = _HEADER.unpack_from(buffer)[0]
+        if len(buffer) < _HEADER.size + size:
+            break
+        frames.append(json.loads(buffer[_HEADER.size:_HEADER.size + size]))
+        buffer = buffer[_HEADER.size + size:]
+    return frames, buffer
+
+def _owner(channel):
+    # 进程专属 channel（prefix.<owner>!suffix）按 owner 路由，普通 channel 按全名路由
+    if "!" not in channel:
+        return channel
+    head = channel.split("!")[0]
+    return head.rsplit(".", 1)[-1] + "!"
+
+class _Hub:
+    """路由线程：持有 group 成员表和 owner -> 连接 的映射"""
+    def __init__(self, server, max_pending=16 << 20):
+        self.server = server
+        self.max_pending = max_pending
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(server, selectors.EVENT_READ)
+        self.buffers = {}
+        self.pending = {} # sock -> 尚未写出的字节
+        self.owners = {} # owner -> [sock]
+        self.groups = {} # group -> set(channel)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            out = {}
+            for key, events in self.selector.select():
+                sock = key.fileobj
+                if sock is self.server:
+                    conn, _ = sock.accept()
+                    conn.setblocking(False)
+                    self.selector.register(conn, selectors.EVENT_READ)
+                    self.buffers[conn] = b""
+                    self.pending[conn] = bytearray()
+                    continue
+                if sock not in self.buffers:
+                    # 本轮中已断开
+                    continue
+                if events & selectors.EVENT_WRITE:
+                    self._flush(sock)
+                if not events & selectors.EVENT_READ or sock not in self.buffers:
+                    continue
+                try:
+                    data = sock.recv(1 << 16)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    data = b""
+                if not data:
+                    self._drop(sock)
+                    continue
+                frames, self.buffers[sock] = _decode(self.buffers[sock] + data)
+                for frame in frames:
+                    self._handle(sock, frame, out)
+            # 同一目标进程的投递合并为一帧
+            for sock, frames in out.items():
+                if sock not in self.buffers:
+                    continue
+                self.pending[sock] += _encode(["batch", frames])
+                self._flush(sock)
+
+    def _flush(self, sock):
+        """写出能写的部分，其余留到连接可写时"""
+        pending = self.pending[sock]
+        try:
+            sent = sock.send(pending) if pending else 0
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self._drop(sock)
+            return
+        del pending[:sent]
+        if len(pending) > self.max_pending:
+            logger.warning("disconnecting a channel layer client with %d unread bytes", len(pending))
+            self._drop(sock)
+            return
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if pending else 0)
+        if self.selector.get_key(sock).events != events:
+            self.selector.modify(sock, events)
+
+    def _handle(self, sock, frame, out):
+        op = frame[0]
+        if op == "batch":
+            for sub in frame[1]:
+                self._handle(sock, sub, out)
+        elif op == "register":
+            socks = self.owners.setdefault(frame[1], [])
+            if sock not in socks:
+                socks.append(sock)
+        elif op == "group_add":
+            self.groups.setdefault(frame[1], set()).add(frame[2])
+        elif op == "group_discard":
+            members = self.groups.get(frame[1])
+            if members is not None:
+                members.discard(frame[2])
+                if not members:
+                    del self.groups[frame[1]]
+        elif op == "send":
+            self._route(frame[1], frame[2], out)
+        elif op == "group_send":
+            for channel in self.groups.get(frame[1], ()):
+                self._route(channel, frame[2], out)
+
+    def _route(self, channel, message, out):
+        socks = self.owners.get(_owner(channel))
+        if socks:
+            out.setdefault(socks[0], []).append(["deliver", channel, message])
+
+    def _drop(self, sock):
+        self.selector.unregister(sock)
+        self.buffers.pop(sock, None)
+        self.pending.pop(sock, None)
+        sock.close()
+        dead = set()
+        for owner, socks in list(self.owners.items()):
+            if sock in socks:
+                socks.remove(sock)
+            if not socks:
+                del self.owners[owner]
+                dead.add(owner)
+        # 断开进程的 channel 从所有 group 中移除
+        for group, members in list(self.groups.items()):
+            members.difference_update([c for c in members if _owner(c) in dead])
+            if not members:
+                del self.groups[group]
+
+class UnixSocketChannelLayer(BaseChannelLayer):
+    extensions = ["groups", "flush"]
+
+    def __init__(self, path=None, expiry=60, capacity=100, channel_capacity=None, batch_size=256, **kwargs):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity, **kwargs)
+        self.path = str(path or os.path.join(tempfile.gettempdir(), "ett_channels.sock"))
+        self.batch_size = batch_size
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:12]}!"
+        self.lock = threading.Lock()
+        self.channels = {} # channel -> {"loop", "queue", "buffer"}，队列中是 (过期时间, 消息)
+        self.swept = time.monotonic() # 上次清理过期消息的时间
+        self.listening = set()
+        self.groups = {} # 本进程的 group 成员，重连时重新登记
+        self.outgoing = queue.Queue()
+        self.sock = None
+        self.hub = None
+        self.lock_file = None
+        self.started = False
+
+    # ---------- 连接与 hub 选举 ----------
+    def _start(self):
+        with self.lock:
+            if self.started:
+                return
+            self.started = True
+        self._connect()
+        threading.Thread(target=self._reader, daemon=True).start()
+        threading.Thread(target=self._writer, daemon=True).start()
+
+    def _try_hub(self):
+        # 持有文件锁的进程就是 hub，锁随进程退出自动释放
+        lock_file = open(f"{self.path}.lock", "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # socket 文件创建时即为 0600，不留其他用户可连接的窗口
+        umask = os.umask(0o177)
+        try:
+            server.bind(self.path)
+        finally:
+            os.umask(umask)
+        server.listen(128)
+        self.lock_file = lock_file
+        self.hub = _Hub(server)
+
+    def _connect(self):
+        while True:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                sock.close()
+                if self.hub is None:
+                    self._try_hub()
+                time.sleep(0.05)
+        with self.lock:
+            frames = [["register", self.owner]] + [["register", name] for name in self.listening]
+            frames += [["group_add", group, channel] for group, members in self.groups.items() for channel in members]
+        sock.sendall(_encode(["batch", frames]))
+        self.sock = sock
+
+    def _reader(self):
+        buffer = b""
+        while True:
+            try:
+                data = self.sock.recv(1 << 16)
+            except OSError:
+                data = b""
+            if not data:
+                # hub 退出：重新连接（可能由本进程接任 hub）
+                self.sock.close()
+                buffer = b""
+                self._connect()
+                continue
+            frames, buffer = _decode(buffer + data)
+            for frame in frames:
+                for op, channel, message in (frame[1] if frame[0] == "batch" else [frame]):
+                    self._deliver(channel, message)
+
+    def _writer(self):
+        while True:
+            frames = [self.outgoing.get()]
+            # 把已排队的帧合并为一批写出
+            while len(frames) < self.batch_size:
+                try:
+                    frames.append(self.outgoing.get_nowait())
+                except queue.Empty:
+                    break
+            data = _encode_batch(frames)
+            while data is not None:
+                try:
+                    self.sock.sendall(data)
+                    break
+                except OSError:
+                    # 由读线程负责重连
+                    time.sleep(0.05)
+
+    def _post(self, frame):
+        self._start()
+        self.outgoing.put(frame)
+
+    # ---------- 本地队列 ----------
+    def _record(self, channel):
+        record = self.channels.get(channel)
+        if record is None:
+            record = self.channels[channel] = {"loop": None, "queue": None, "buffer": deque()}
+        return record
+
+    def _sweep(self, now):
+        """调用方需持有 lock：每 expiry 秒删除一次没有接收者、缓存的消息都已过期的 channel"""
+        if now < self.swept + self.expiry:
+            return
+        self.swept = now
+        for channel, record in list(self.channels.items()):
+            if record["queue"] is not None:
+                continue
+            buffer = record["buffer"]
+            while buffer and buffer[0][0] < now:
+                buffer.popleft()
+            if not buffer:
+                del self.channels[channel]
+
+    def _deliver(self, channel, message):
+        now = time.monotonic()
+        entry = (now + self.expiry, message)
+        with self.lock:
+            self._sweep(now)
+            record = self._record(channel)
+            capacity = self.get_capacity(channel)
+            if record["queue"] is None:
+                if len(record["buffer"]) < capacity:
+                    record["buffer"].append(entry)
+                return
+            loop, q = record["loop"], record["queue"]
+        loop.call_soon_threadsafe(self._put, q, entry, capacity)
+
+    @staticmethod
+    def _put(q, entry, capacity):
+        # 远端投递遇到满队列时丢弃，与 redis layer 一致
+        if q.qsize() < capacity:
+            q.put_nowait(entry)
+
+    # ---------- Channel layer API ----------
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_channel_name(channel)
+        if _owner(channel) == self.owner or channel in self.listening:
+            with self.lock:
+                record = self._record(channel)
+                size = record["queue"].qsize() if record["queue"] is not None else len(record["buffer"])
+                if size >= self.get_capacity(channel):
+                    raise ChannelFull(channel)
+            self._deliver(channel, message)
+        else:
+            self._post(["send", channel, message])
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        if _owner(channel) != self.owner and channel not in self.listening:
+            self.listening.add(channel)
+            self._post(["register", channel])
+        with self.lock:
+            record = self._record(channel)
+            if record["queue"] is None:
+                record["loop"] = asyncio.get_running_loop()
+                record["queue"] = asyncio.Queue()
+                while record["buffer"]:
+                    record["queue"].put_nowait(record["buffer"].popleft())
+            q = record["queue"]
+        try:
+            while True:
+                expires, message = await q.get()
+                if expires >= time.monotonic():
+                    return message
+        except asyncio.CancelledError:
+            # 消费者断开时 receive 被取消：未取走的消息放回缓存（过期后清理），没有消息时直接删除
+            with self.lock:
+                if self.channels.get(channel) is record:
+                    record["loop"] = record["queue"] = None
+                    while not q.empty():
+                        record["buffer"].append(q.get_nowait())
+                    if not record["buffer"]:
+                        del self.channels[channel]
+            raise
+
+    async def new_channel(self, prefix="specific."):
+        self._start()
+        return f"{prefix}.{self.owner}{uuid.uuid4().hex[:12]}"
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        with self.lock:
+            self.groups.setdefault(group, set()).add(channel)
+        self._post(["group_add", group, channel])
+
+    async def group_discard(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        with self.lock:
+            members = self.groups.get(group)
+            if members is not None:
+                members.discard(channel)
+                if not members:
+                    del self.groups[group]
+        self._post(["group_discard", group, channel])
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_group_name(group)
+        self._post(["group_send", group, message])
+
+    async def group_send_many(self, group, messages):
+        """一次提交多条 group 消息，由写线程合并为一帧"""
+        self.require_valid_group_name(group)
+        for message in messages:
+            self._post(["group_send", group, message])
+
+    async def flush(self):
+        # 只清理本进程的状态，不影响其他进程
+        with self.lock:
+            for group, members in self.groups.items():
+                for channel in members:
+                    self.outgoing.put(["group_discard", group, channel])
+            self.groups = {}
+            self.channels = {}
+
+    async def close(self):
+        pass
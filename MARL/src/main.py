@@ -1,5 +1,6 @@
 from dataReader import PSTTReader
 import logging
+import argparse
 import pathlib
 import os
 import yaml
@@ -12,10 +13,10 @@ def load_cfg(path: str):
     with open(path, "r") as f:
         return yaml.safe_load(f)
 
-def setup_logger(logger_name, log_file, level=logging.INFO):
+def setup_logger(logger_name, log_file, level=logging.INFO, mode='w'):
     l = logging.getLogger(logger_name)
     formatter = logging.Formatter('%(asctime)s : %(message)s')
-    fileHandler = logging.FileHandler(log_file, mode='w')
+    fileHandler = logging.FileHandler(log_file, mode=mode)
     fileHandler.setFormatter(formatter)
     streamHandler = logging.StreamHandler()
     streamHandler.setFormatter(formatter)
@@ -24,18 +25,42 @@ def setup_logger(logger_name, log_file, level=logging.INFO):
     l.addHandler(fileHandler)
     l.addHandler(streamHandler) 
 
-def startup(data_folder, output_folder, fileName):
+def startup(data_folder, output_folder, fileName, resume=False):
     pname = fileName.split('.xml')[0]
     # 设置log的格式
     os.makedirs(f"{output_folder}/{pname}", exist_ok=True)
-    setup_logger(pname, f"{output_folder}/{pname}/{pname}.log")
+    # 断点续训时追加日志而不是覆盖
+    setup_logger(pname, f"{output_folder}/{pname}/{pname}.log", mode="a" if resume else "w")
     logger = logging.getLogger(pname)
     file = f"{data_folder}/{fileName}"
     reader = PSTTReader(file)
     return reader, logger
 
-def main(config):
-    if config['method']['name'] == "Random":
+def main(config, resume=False, progress=None):
+    if config.get('resolve', {}).get('previous'):
+        # 增量重排：只处理 data.file 一个实例
+        output_folder = config['config']['output']
+        from MARL.PMAPPO.resolve import resolve
+        data_folder = config["data"]["folder"]
+        fileName = config["data"]["file"]
+        reader, logger = startup(data_folder, output_folder, fileName)
+        Tools = tools(logger, config, progress)
+        resolve(reader, logger, Tools, output_folder, fileName, config)
+    elif config.get('decompose', {}).get('enabled'):
+        # 按连通分量拆分后并行求解，不支持断点续训
+        output_folder = config['config']['output']
+        quickrun = config["method"].get("quickrun", False)
+        from MARL.utils.decompose import solve_components
+        data_folder = config["data"]["folder"]
+        if config['data']['isthrough']:
+            fileNames = [fileName for fileName in os.listdir(data_folder) if fileName.endswith('.xml')]
+        else:
+            fileNames = [config["data"]["file"]]
+        for fileName in fileNames:
+            reader, logger = startup(data_folder, output_folder, fileName)
+            Tools = tools(logger, config, progress)
+            solve_components(reader, logger, Tools, output_folder, fileName, config, quickrun)
+    elif config['method']['name'] == "Random":
         output_folder = config['config']['output']
         quickrun = config["method"].get("quickrun", False)
         from MARL.Random.train import train
@@ -43,15 +68,15 @@ def main(config):
             data_folder = config["data"]["folder"]
             for fileName in os.listdir(data_folder):
                 if fileName.endswith('.xml'):
-                    reader, logger = startup(data_folder, output_folder, fileName)
-                    Tools = tools(logger, config)
-                    train(reader, logger, Tools, output_folder, fileName, config, quickrun)
+                    reader, logger = startup(data_folder, output_folder, fileName, resume)
+                    Tools = tools(logger, config, progress)
+                    train(reader, logger, Tools, output_folder, fileName, config, quickrun, resume)
         else:
             data_folder = config["data"]["folder"]
             fileName = config["data"]["file"]
-            reader, logger = startup(data_folder, output_folder, fileName)
-            Tools = tools(logger, config)
-            train(reader, logger, Tools, output_folder, fileName, config, quickrun)
+            reader, logger = startup(data_folder, output_folder, fileName, resume)
+            Tools = tools(logger, config, progress)
+            train(reader, logger, Tools, output_folder, fileName, config, quickrun, resume)
     elif config['method']['name'] == "PMAPPO":
         output_folder = config['config']['output']
         quickrun = config["method"].get("quickrun", False)
@@ -60,15 +85,15 @@ def main(config):
             data_folder = config["data"]["folder"]
             for fileName in os.listdir(data_folder):
                 if fileName.endswith('.xml'):
-                    reader, logger = startup(data_folder, output_folder, fileName)
-                    Tools = tools(logger, config)
-                    train(reader, logger, Tools, output_folder, fileName, config, quickrun)
+                    reader, logger = startup(data_folder, output_folder, fileName, resume)
+                    Tools = tools(logger, config, progress)
+                    train(reader, logger, Tools, output_folder, fileName, config, quickrun, resume)
         else:
             data_folder = config["data"]["folder"]
             fileName = config["data"]["file"]
-            reader, logger = startup(data_folder, output_folder, fileName)
-            Tools = tools(logger, config)
-            train(reader, logger, Tools, output_folder, fileName, config, quickrun)
+            reader, logger = startup(data_folder, output_folder, fileName, resume)
+            Tools = tools(logger, config, progress)
+            train(reader, logger, Tools, output_folder, fileName, config, quickrun, resume)
     elif config['method']['name'] == "RPMAPPO":
         output_folder = config['config']['output']
         quickrun = config["method"].get("quickrun", False)
@@ -77,18 +102,26 @@ def main(config):
             data_folder = config["data"]["folder"]
             for fileName in os.listdir(data_folder):
                 if fileName.endswith('.xml'):
-                    reader, logger = startup(data_folder, output_folder, fileName)
-                    Tools = tools(logger, config)
-                    train(reader, logger, Tools, output_folder, fileName, config, quickrun)
+                    reader, logger = startup(data_folder, output_folder, fileName, resume)
+                    Tools = tools(logger, config, progress)
+                    train(reader, logger, Tools, output_folder, fileName, config, quickrun, resume)
         else:
             data_folder = config["data"]["folder"]
             fileName = config["data"]["file"]
-            reader, logger = startup(data_folder, output_folder, fileName)
-            Tools = tools(logger, config)
-            train(reader, logger, Tools, output_folder, fileName, config, quickrun)
+            reader, logger = startup(data_folder, output_folder, fileName, resume)
+            Tools = tools(logger, config, progress)
+            train(reader, logger, Tools, output_folder, fileName, config, quickrun, resume)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default=f"{folder}/config.yaml")
+    parser.add_argument("--resume", action="store_true", help="continue from the last checkpoint in the output folder")
+    parser.add_argument("--previous", help="previous solution XML; re-solve only the edited classes and their neighbours")
+    parser.add_argument("--edited", nargs="*", default=[], help="ids of the edited classes")
+    args = parser.parse_args()
     # Load configuration
-    config = load_cfg(f"{folder}/config.yaml")
+    config = load_cfg(args.config)
+    if args.previous:
+        config.setdefault('resolve', {}).update(previous=args.previous, edited=args.edited)
     device = torch.device("cuda" if config['device'] == "gpu" and torch.cuda.is_available() else "cpu")
-    main(config)
\ No newline at end of file
+    main(config, args.resume)
\ No newline at end of file
@@ -1,24 +1,123 @@
 import os
 import json
+import logging
+import time
+import queue
+import threading
 import numpy as np
 from math import inf
 from matplotlib import pyplot as plt
+from matplotlib.figure import Figure
 from Solution_writter import export_solution_xml
 from validator import report_result
+from evaluator import evaluate
+
+class MetricsWriter:
+    """
+    后台写线程：训练线程只把记录放进队列，
+    由该线程写入 metrics.jsonl（每 flush_interval 秒 flush 一次）并执行绘图等耗时任务。
+    新的训练覆盖原文件；从检查点恢复时（resume_episode 不为 None）保留该 episode 之前的记录，继续追加。
+    """
+    def __init__(self, out_dir, flush_interval=5.0, logger=None, resume_episode=None):
+        os.makedirs(out_dir, exist_ok=True)
+        self.flush_interval = flush_interval
+        self.logger = logger or logging.getLogger(__name__)
+        self.queue = queue.Queue()
+        path = os.path.join(out_dir, "metrics.jsonl")
+        if resume_episode is not None and os.path.exists(path):
+            # 检查点之后写入的记录会重新生成
+            with open(path) as f:
+                kept = [line for line in f if line.strip() and json.loads(line).get("episode", 0) < resume_episode]
+            self.file = open(path, "w")
+            self.file.writelines(kept)
+        else:
+            self.file = open(path, "w")
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def append(self, record):
+        self.queue.put(("append", record))
+
+    def submit(self, fn, *args):
+        self.queue.put(("call", (fn, args)))
+
+    def _run(self):
+        last_flush = time.perf_counter()
+        while True:
+            try:
+                item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = ("flush", None)
+            if item is None:
+                break
+            cmd, data = item
+            if cmd == "append":
+                self.file.write(json.dumps(data, default=float) + "\n")
+            elif cmd == "call":
+                fn, args = data
+                try:
+                    fn(*args)
+                except Exception:
+                    self.logger.exception("MetricsWriter task failed")
+            if time.perf_counter() - last_flush >= self.flush_interval:
+                self.file.flush()
+                last_flush = time.perf_counter()
+        self.file.flush()
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        self.file.close()
 
 class tools:
-    def __init__(self, logger=None, config=None):
+    def __init__(self, logger=None, config=None, progress=None):
         self.logger = logger
         self.config = config
+        self.progress = progress # ProgressStream，为 None 时不推送
         self.best_cost = inf
         self.best_result = {}
         self.last_result = {}
         self.metrics = {}
+        metrics_config = (config or {}).get('metrics', {})
+        self.flush_interval = metrics_config.get('flush_interval', 5.0)
+        self.plot_interval = metrics_config.get('plot_interval', 50)
+        self.snapshot_interval = metrics_config.get('snapshot_interval', 50)
+        self.validator = (config or {}).get('config', {}).get('validator', 'local')
+        self.writer = None
+        self.episode = 0
+        # 墙钟预算（秒），从创建 tools 开始计时；0 表示不限时
+        self.time_budget = (config or {}).get('train', {}).get('time_budget') or 0
+        self.started = time.perf_counter()
+        self.best_solution = None
+        self.resumed = False # 从检查点恢复，metrics.jsonl 接着原记录写
+
+    def expired(self):
+        """设置了 train.time_budget 且已用完时返回 True，训练循环据此在当前 step 后停止"""
+        return bool(self.time_budget) and time.perf_counter() - self.started >= self.time_budget
 
     def set_metrics(self, metrics_list):
         for key in metrics_list:
             self.metrics[key] = []
 
+    def state_dict(self):
+        return {
+            "best_cost": self.best_cost,
+            "best_result": self.best_result,
+            "last_result": self.last_result,
+            "metrics": self.metrics,
+            "episode": self.episode,
+            "best_solution": self.best_solution,
+        }
+
+    def load_state_dict(self, state):
+        self.best_cost = state["best_cost"]
+        self.best_result = state["best_result"]
+        self.last_result = state["last_result"]
+        self.metrics = state["metrics"]
+        self.episode = state.get("episode", 0)
+        self.best_solution = state.get("best_solution")
+        self.resumed = True
+
     def save_to_xml(self, model, pname, out_path, runtime, config):
         assignments = model.results()
         export_solution_xml(
@@ -128,7 +227,10 @@ class tools:
         plt.savefig(os.path.join(plots_dir, net_name))
         plt.close(fig)
 
-    def plot_metrics(self, pname):
+    def plot_metrics(self, pname, metrics_dict=None):
+        """按需绘图：重绘全部指标并重写 metrics.json"""
+        if metrics_dict is None:
+            metrics_dict = self.metrics
         env_name = self.config['train']['env_name']
         net_name = f"{env_name}_metrics"
         plots_dir = f"{self.config['config']['output']}/{pname}"
@@ -146,16 +248,16 @@ class tools:
             11: [4, 3],
             12: [4, 3]
         }
-        metrics_dict = self.metrics
         if len(metrics_dict) > len(layout_dict):
             print("Metrics_dict length overflow! Please assign a proper layout first.")
         layout = layout_dict[len(metrics_dict)]
-        # 创建子图布局
-        fig, axes = plt.subplots(layout[0], layout[1], figsize=(18, 10))
+        # 创建子图布局（使用 Figure 而非 pyplot，可在后台线程中绘制）
+        fig = Figure(figsize=(18, 10))
+        axes = fig.subplots(layout[0], layout[1])
         fig.suptitle(f'Training Metrics of {env_name}', fontsize=16)
         
         # 压平axes数组以便迭代
-        axes = axes.flatten()
+        axes = np.array(axes).flatten()
         
         # 为每个指标获取x轴值
         any_metric = list(metrics_dict.values())[0]
@@ -176,18 +278,42 @@ class tools:
         for i in range(len(metrics_dict), layout[0] * layout[1]):
             fig.delaxes(axes[i])
         
-        plt.tight_layout(rect=[0, 0, 1, 0.95])
-        plt.savefig(os.path.join(plots_dir, net_name))
-        plt.close(fig)
+        fig.tight_layout(rect=[0, 0, 1, 0.95])
+        fig.savefig(os.path.join(plots_dir, net_name))
         with open(os.path.join(plots_dir, "metrics.json"), "w") as f:
-            json.dump(self.metrics, f, indent=4)
+            json.dump(metrics_dict, f, default=float)
 
-    def update_metrics(self, result, sched_none_assignment_num, env, pname, output_folder, runtime):
+    def log_metrics(self, pname, result):
+        """追加本 episode 的指标，每 plot_interval 个 episode 在后台线程重绘一次"""
+        if self.writer is None:
+            self.writer = MetricsWriter(f"{self.config['config']['output']}/{pname}", self.flush_interval, self.logger,
+                                        self.episode if self.resumed else None)
+        record = {"episode": self.episode}
         for key in self.metrics.keys():
             self.metrics[key].append(result[key])
-        self.plot_metrics(pname)
+            record[key] = result[key]
+        self.writer.append(record)
+        if self.progress is not None:
+            self.progress.publish({"instance": pname, "status": "running", "best cost": self.best_cost if self.best_cost < inf else None, **record})
+        self.episode += 1
+        if self.plot_interval and self.episode % self.plot_interval == 0:
+            # 拷贝一份快照，避免与训练线程的 append 竞争
+            snapshot = {key: list(values) for key, values in self.metrics.items()}
+            self.writer.submit(self.plot_metrics, pname, snapshot)
+
+    def close_writer(self, pname):
+        if self.writer is None:
+            return
+        if self.metrics and len(list(self.metrics.values())[0]) > 0:
+            self.writer.submit(self.plot_metrics, pname, {key: list(values) for key, values in self.metrics.items()})
+        self.writer.close()
+        self.writer = None
 
+    def update_metrics(self, result, sched_none_assignment_num, env, pname, output_folder, runtime):
+        self.log_metrics(pname, result)
         self.last_result = result
+        # 非最优 episode 的 JSON 快照按 snapshot_interval 节流
+        snapshot = self.snapshot_interval and self.episode % self.snapshot_interval == 0
 
         if sched_none_assignment_num==0:
             if result['Total cost'] < self.best_cost:
@@ -202,10 +328,11 @@ class tools:
                 self.logger.info("====================================================================")
                 self.best_result = result
                 self.best_cost = result['Total cost']
+                self.publish_best(assignments, pname, out_path, runtime)
                 return True
             else:
-                assignments = env.results()
-                env.save(f"{output_folder}/{pname}/{pname}.json")
+                if snapshot:
+                    env.save(f"{output_folder}/{pname}/{pname}.json")
                 out_path = f"{output_folder}/{pname}/{pname}.last_solution.xml"
                 self.logger.info(f"valid Episode Total cost: {result['Total cost']}")
                 self.logger.info(f"valid Episode Time penalty: {result['Time penalty']}")
@@ -214,8 +341,8 @@ class tools:
                 self.logger.info("====================================================================")
                 return False
         else:
-            assignments = env.results()
-            env.save(f"{output_folder}/{pname}/{pname}.json")
+            if snapshot:
+                env.save(f"{output_folder}/{pname}/{pname}.json")
             out_path = f"{output_folder}/{pname}/{pname}.last_solution.xml"
             self.logger.info(f"Episode Total cost: {result['Total cost']}")
             self.logger.info(f"Episode no assignment: {sched_none_assignment_num}")
@@ -225,16 +352,48 @@ class tools:
             self.logger.info("====================================================================")
             return False
     
-    def conclude(self, runtime, report, pname, output_folder):
+    def publish_best(self, assignments, pname, out_path, runtime):
+        """
+        记录当前最优可行解（cid -> [weeks, days, start, length, room]），有进度流时立即推送，
+        任务接口据此随时返回目前最好的解。
+        """
+        solution = {}
+        for cid, (time_option, room_required, room_id, _) in assignments.items():
+            if time_option is not None:
+                solution[cid] = [*time_option['optional_time_bits'], room_id if room_required else None]
+        self.best_solution = {
+            "instance": pname,
+            "episode": self.episode,
+            "runtime": runtime,
+            "path": out_path,
+            **{key: self.best_result[key] for key in ("Total cost", "Time penalty", "Room penalty", "Distribution penalty")},
+            "solution": solution,
+        }
+        if self.progress is not None:
+            self.progress.publish_best(self.best_solution)
+
+    def validate(self, file, reader=None):
+        # 默认在本地按 ITC2019 规则评估，validator: remote 时才提交到 itc2019.org
+        if self.validator == 'remote' or reader is None:
+            return report_result(file)
+        return evaluate(reader, file)
+
+    def conclude(self, runtime, report, pname, output_folder, reader=None):
+        self.close_writer(pname)
+        if self.progress is not None:
+            result = self.best_result if self.best_cost < inf else self.last_result
+            self.progress.publish({"instance": pname, "status": "finished", "episode": self.episode, "runtime": runtime, "valid": self.best_cost < inf, **result})
         self.logger.info("results:")
         self.logger.info(f"Total runtime: {runtime}")
+        if self.expired():
+            self.logger.info(f"stopped at the time budget of {self.time_budget}s")
         if self.best_cost < inf:
             self.logger.info(f"best Episode Total cost: {self.best_result['Total cost']}")
             self.logger.info(f"best Episode Time penalty: {self.best_result['Time penalty']}")
             self.logger.info(f"best Episode Room penalty: {self.best_result['Room penalty']}")
             self.logger.info(f"best Episode Distribution penalty: {self.best_result['Distribution penalty']}")
             if report:
-                validor_result = report_result(f"{output_folder}/{pname}/{pname}.best_solution.xml")
+                validor_result = self.validate(f"{output_folder}/{pname}/{pname}.best_solution.xml", reader)
                 self.logger.info(f"Validation result: {validor_result}")
         else:
             self.logger.info(f"no valid assignments!")
@@ -243,5 +402,5 @@ class tools:
             self.logger.info(f"last Episode Room penalty: {self.last_result['Room penalty']}")
             self.logger.info(f"last Episode Distribution penalty: {self.last_result['Distribution penalty']}")
             if report:
-                validor_result = report_result(f"{output_folder}/{pname}/{pname}.last_solution.xml")
+                validor_result = self.validate(f"{output_folder}/{pname}/{pname}.last_solution.xml", reader)
                 self.logger.info(f"Validation result: {validor_result}")
\ No newline at end of file
@@ -0,0 +1,151 @@
+import copy
+import queue
+import multiprocessing as mp
+import numpy as np
+import torch
+from MARL.utils.vec_env import _dump_state, _load_state
+
+def _actor(remote, parent_remote, results, stop, lock, version, shared_actor, env_cls, reader, config, seed, steps_clip):
+    parent_remote.close()
+    torch.set_num_threads(1)
+    env = env_cls(reader, config)
+    for agent in env.agents:
+        agent._action_space.seed(seed)
+    env.reset(order=True)
+    published = None
+    try:
+        while not stop.is_set():
+            # 取最新发布的排序，尚未发布时阻塞等待
+            while published is None or remote.poll():
+                if not remote.poll(0.1):
+                    if stop.is_set():
+                        return
+                    continue
+                published = remote.recv()
+            order_version, (env.agents_order, env.agent_order_dict) = published
+
+            mappo_obs, masks = env.reset_step()
+            obs = {cid: np.array(o) for cid, o in mappo_obs.items()}
+            state_list = [mappo_obs[agent.id].flatten() for agent in env.agents]
+            mask_list = [masks[agent.id].flatten() for agent in env.agents]
+            with lock:
+                policy_version = version.value
+                s = torch.tensor(np.array(state_list), dtype=torch.float)
+                m = torch.tensor(np.array(mask_list), dtype=torch.float)
+                with torch.no_grad():
+                    probs = list(shared_actor(s, m).numpy())
+
+            rollouts = []
+            for _ in range(steps_clip):
+                env.reset_step()
+                env.apply_mappo_action(probs)
+                rollouts.append(env.step())
+            episode = {
+                "version": policy_version,
+                "order_version": order_version,
+                "obs": obs,
+                "probs": probs,
+                "rollouts": rollouts,
+                "state": _dump_state(env),
+            }
+            while not stop.is_set():
+                try:
+                    results.put(episode, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+    except KeyboardInterrupt:
+        pass
+    finally:
+        remote.close()
+
+class AsyncRollout:
+    """
+    异步 actor-learner：actor 进程持续用共享内存中的策略快照生成 episode，
+    learner 在 mappo.update 的同时不阻塞采样。
+    每个 episode 记录生成时的策略版本，落后超过 max_staleness 次更新的 episode 被丢弃，
+    PPO 的重要性比率使用 actor 记录的行为概率，从而保持有效。
+    episode 还记录所用 agents 排序的版本，与 learner 当前排序不同的 episode 同样丢弃：
+    scheduler 的经验按 learner 的排序记录，不能用其他排序下的结果。
+    """
+    def __init__(self, env_cls, reader, config, actor, num_actors, steps_clip, max_staleness=1, seed=42, poll_interval=1.0):
+        self.max_staleness = max_staleness
+        self.poll_interval = poll_interval # 等待 episode 时检查 actor 是否退出的间隔
+        self.dropped = 0 # 策略过旧丢弃的 episode 数
+        self.reordered = 0 # 排序不符丢弃的 episode 数
+        self.order = None
+        self.order_version = 0
+        ctx = mp.get_context("fork") if "fork" in mp.get_all_start_methods() else mp.get_context()
+        self.shared_actor = copy.deepcopy(actor).to("cpu")
+        self.shared_actor.share_memory()
+        self.lock = ctx.Lock()
+        self.version = ctx.Value('i', 0)
+        self.stop = ctx.Event()
+        self.results = ctx.Queue(maxsize=num_actors)
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe() for _ in range(num_actors)])
+        self.processes = []
+        for wid, (work_remote, remote) in enumerate(zip(self.work_remotes, self.remotes)):
+            args = (work_remote, remote, self.results, self.stop, self.lock, self.version, self.shared_actor,
+                    env_cls, reader, config, seed + wid + 1, steps_clip)
+            process = ctx.Process(target=_actor, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+        self.closed = False
+
+    def publish(self, env):
+        """下发 learner 当前的 agents 排序，actor 在下一个 episode 开始时使用；排序没有变化时不重新下发"""
+        if self.order is not None and self.order == env.agents_order:
+            return
+        self.order = dict(env.agents_order)
+        self.order_version += 1
+        for remote in self.remotes:
+            remote.send((self.order_version, (env.agents_order, env.agent_order_dict)))
+
+    def push(self, actor):
+        """把 learner 更新后的 actor 权重写入共享内存并递增版本号"""
+        with self.lock:
+            self.shared_actor.load_state_dict(actor.state_dict())
+            self.version.value += 1
+
+    def collect(self, env):
+        """
+        取一个按最近下发的排序生成、且不超过陈旧度上限的 episode，
+        并把 env 同步为该 episode 最后一次构造的分配（env 的排序保持不变）。
+        返回 (reset_step 观测, 行为概率, steps_clip 个 step 结果)
+        """
+        while True:
+            episode = self._get()
+            if episode["order_version"] != self.order_version:
+                self.reordered += 1
+            elif self.version.value - episode["version"] > self.max_staleness:
+                self.dropped += 1
+            else:
+                break
+        _load_state(env, episode["state"])
+        return episode["obs"], episode["probs"], episode["rollouts"]
+
+    def _get(self):
+        # actor 异常退出（OOM、环境报错）后不会再有 episode，不能无限等待
+        while True:
+            try:
+                return self.results.get(timeout=self.poll_interval)
+            except queue.Empty:
+                pass
+            for wid, process in enumerate(self.processes):
+                if not process.is_alive():
+                    raise RuntimeError(f"rollout actor {wid} exited with code {process.exitcode}")
+
+    def close(self):
+        if self.closed:
+            return
+        self.stop.set()
+        # 清空结果队列，避免 actor 阻塞在 put 上
+        while any(process.is_alive() for process in self.processes):
+            try:
+                self.results.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        for process in self.processes:
+            process.join()
+        self.closed = True
@@ -0,0 +1,66 @@
+import os
+import copy
+import random
+import numpy as np
+import torch
+
+def checkpoint_path(output_folder, pname):
+    return f"{output_folder}/{pname}/{pname}.ckpt.pth"
+
+def save_checkpoint(path, state):
+    # 先写临时文件再原子替换，避免中断时留下半个 checkpoint
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        torch.save(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    return torch.load(path, map_location="cpu", weights_only=False)
+
+def rng_state(searches=()):
+    """全局随机数状态；searches 为 LocalSearch / LNS，各自的 random.Random 一并保存"""
+    state = {
+        "random": random.getstate(),
+        "numpy": np.random.get_state(),
+        "torch": torch.get_rng_state(),
+        "searches": {search.section: search.random.getstate() for search in searches},
+    }
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+def set_rng_state(state, searches=()):
+    random.setstate(state["random"])
+    for search in searches:
+        # 旧 checkpoint 没有搜索的随机数状态
+        if search.section in state.get("searches", {}):
+            search.random.setstate(state["searches"][search.section])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+def env_state(env):
+    """跨 episode 保留的环境状态：排序、agent 价值和每个 agent 的采样随机数状态"""
+    state = {
+        "agents": [{
+            "value": agent.value,
+            "rng": copy.deepcopy(agent._action_space.np_random.bit_generator.state),
+        } for agent in env.agents]
+    }
+    for key in ("agents_order", "agent_order_dict", "agents_value"):
+        if hasattr(env, key):
+            state[key] = copy.deepcopy(getattr(env, key))
+    return state
+
+def set_env_state(env, state):
+    for agent, agent_state in zip(env.agents, state["agents"]):
+        agent.value = agent_state["value"]
+        agent._action_space.np_random.bit_generator.state = agent_state["rng"]
+    for key in ("agents_order", "agent_order_dict", "agents_value"):
+        if key in state:
+            setattr(env, key, state[key])
@@ -1,6 +1,4 @@
 import itertools
-import numpy as np
-import torch
 
 class ConstraintBase:
     def __init__(self):
@@ -0,0 +1,198 @@
+"""
+按课程交互图分解实例：两门课共享可选教室、同在一条硬 / 软约束中、有共同选课学生时连边，
+连通分量之间没有耦合，可以各自独立求解后直接合并。
+学生连边默认在实例计入学生冲突惩罚（optimization.student > 0）时启用；显式关闭时，
+不同分量的课程之间仍可能有学生冲突，各自求解不会考虑，合并后的学生惩罚可能变大。
+小分量合并成不小于 min_size 的子问题，避免为几门课单独启动训练；
+子问题在独立的 spawn 进程中并行求解，每个子问题的 team_size / state_dim 只取决于自身的课程数。
+"""
+import os
+import copy
+import time
+import pathlib
+import logging
+import importlib
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+TRAINERS = {
+    "Random": "MARL.Random.train",
+    "PMAPPO": "MARL.PMAPPO.train",
+    "RPMAPPO": "MARL.RPMAPPO.train",
+}
+
+
+class SubReader:
+    """reader 的一个子集，属性与 PSTTReader 相同（环境和 train() 用到的部分）"""
+    def __init__(self, reader, cids, name):
+        cids = set(cids)
+        self.problem_name = name
+        self.path = pathlib.Path(f"{name}.xml")
+        self.nrDays = reader.nrDays
+        self.nrWeeks = reader.nrWeeks
+        self.slotsPerDay = reader.slotsPerDay
+        self.optimization = reader.optimization
+        self.classes = {cid: info for cid, info in reader.classes.items() if cid in cids}
+        self.cid_to_idx = {cid: i for i, cid in enumerate(self.classes)}
+        rids = {option["id"] for info in self.classes.values() for option in info["room_options"]}
+        self.rooms = {rid: room for rid, room in reader.rooms.items() if rid in rids}
+        self.rid_to_idx = {rid: i for i, rid in enumerate(self.rooms)}
+        self.travel = {
+            rid: {other: value for other, value in targets.items() if other in rids}
+            for rid, targets in (reader.travel or {}).items() if rid in rids
+        }
+        self.courses = {
+            key: course for key, course in reader.courses.items()
+            if any(cid in cids for cid in _course_classes(course))
+        }
+        course_ids = {str(course["id"]) for course in self.courses.values()}
+        self.students = {
+            sid: student for sid, student in reader.students.items()
+            if any(str(course) in course_ids for course in student["courses"])
+        }
+        self.sid_to_idx = {sid: i for i, sid in enumerate(self.students)}
+        self.distributions = {
+            key: [cons for cons in reader.distributions[key] if cons["classes"] and cons["classes"][0] in cids]
+            for key in ("hard_constraints", "soft_constraints")
+        }
+        self.solution = None
+
+
+def _course_classes(course):
+    for config in course.get("configs", {}).values():
+        for subpart in config["subparts"].values():
+            yield from subpart["classes"]
+
+
+def components(reader, students=False):
+    """课程交互图的连通分量，按课程数降序；每个分量内的课程保持 reader.classes 中的顺序"""
+    parent = {cid: cid for cid in reader.classes}
+
+    def find(cid):
+        while parent[cid] != cid:
+            parent[cid] = parent[parent[cid]]
+            cid = parent[cid]
+        return cid
+
+    def union(cids):
+        cids = [cid for cid in cids if cid in parent]
+        if not cids:
+            return
+        root = find(cids[0])
+        for cid in cids[1:]:
+            other = find(cid)
+            if other != root:
+                parent[other] = root
+
+    by_room = {}
+    for cid, info in reader.classes.items():
+        for option in info["room_options"]:
+            by_room.setdefault(option["id"], []).append(cid)
+    for cids in by_room.values():
+        union(cids)
+    for key in ("hard_constraints", "soft_constraints"):
+        for cons in reader.distributions[key]:
+            union(cons["classes"])
+    if students:
+        course_classes = {str(course["id"]): list(_course_classes(course)) for course in reader.courses.values()}
+        for student in reader.students.values():
+            union([cid for course in student["courses"] for cid in course_classes.get(str(course), [])])
+
+    groups = {}
+    for cid in reader.classes:
+        groups.setdefault(find(cid), []).append(cid)
+    return sorted(groups.values(), key=len, reverse=True)
+
+
+def pack(groups, min_size):
+    """不小于 min_size 的分量单独成为子问题，其余分量依次拼接到不小于 min_size 为止"""
+    parts, current = [], []
+    for cids in groups:
+        if len(cids) >= min_size:
+            parts.append(cids)
+            continue
+        current = current + cids
+        if len(current) >= min_size:
+            parts.append(current)
+            current = []
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _solve_part(reader, config, quickrun, deadline):
+    """子进程入口：对子问题运行一次 train()，返回 (最优可行解 or None, 最后一个 episode 的结果)"""
+    from main import setup_logger
+    from tools import tools
+    train = importlib.import_module(TRAINERS[config['method']['name']]).train
+    pname = reader.problem_name
+    output_folder = config['config']['output']
+    os.makedirs(f"{output_folder}/{pname}", exist_ok=True)
+    setup_logger(pname, f"{output_folder}/{pname}/{pname}.log")
+    logger = logging.getLogger(pname)
+    if deadline is not None:
+        # 排队等待的子问题只用剩余的预算
+        config = copy.deepcopy(config)
+        config['train']['time_budget'] = max(deadline - time.time(), 1e-3)
+    Tools = tools(logger, config)
+    train(reader, logger, Tools, output_folder, f"{pname}.xml", config, quickrun)
+    return Tools.best_solution, Tools.last_result
+
+
+def merge(reader, solutions):
+    """子问题的 best_solution（cid -> [weeks, days, start, length, room]）合并成 env.results() 格式"""
+    assignments = {cid: (None, info["room_required"], None, None) for cid, info in reader.classes.items()}
+    for solution in solutions:
+        for cid, (*bits, room) in solution.items():
+            info = reader.classes[cid]
+            option = next(option for option in info["time_options"] if tuple(option["optional_time_bits"]) == tuple(bits))
+            assignments[cid] = (option, info["room_required"], room, None)
+    return assignments
+
+
+def solve_components(reader, logger, tools, output_folder, fileName, config, quickrun=False):
+    from evaluator import evaluate
+    pname = fileName.split('.xml')[0]
+    options = config.get('decompose', {})
+    report = config['config']['report']
+    t0 = time.perf_counter()
+
+    students = options.get('students')
+    if students is None:
+        students = bool((reader.optimization or {}).get('student'))
+    groups = components(reader, students)
+    parts = pack(groups, options.get('min_size', 50))
+    logger.info(f"{reader.path.name}: {len(groups)} components (largest {len(groups[0]) if groups else 0} classes), solved as {len(parts)} parts")
+    if len(parts) <= 1:
+        train = importlib.import_module(TRAINERS[config['method']['name']]).train
+        train(reader, logger, tools, output_folder, fileName, config, quickrun)
+        return
+
+    budget = config['train'].get('time_budget') or 0
+    deadline = time.time() + budget - (time.perf_counter() - tools.started) if budget else None
+    # spawn：父进程可能已有 torch / 日志等线程，fork 后子进程可能在它们持有的锁上死锁
+    ctx = mp.get_context("spawn")
+    workers = options.get('workers') or os.cpu_count()
+    with ProcessPoolExecutor(max_workers=min(workers, len(parts)), mp_context=ctx) as pool:
+        futures = [
+            pool.submit(_solve_part, SubReader(reader, cids, f"{pname}.part{k}"), config, quickrun, deadline)
+            for k, cids in enumerate(parts)
+        ]
+        results = [future.result() for future in futures]
+
+    failed = [k for k, (best, _) in enumerate(results) if best is None]
+    for k in failed:
+        logger.info(f"part {k} ({len(parts[k])} classes) found no feasible solution, its classes stay unassigned")
+    assignments = merge(reader, [best["solution"] for best, _ in results if best is not None])
+    runtime = time.perf_counter() - t0
+    result = evaluate(reader, assignments)
+    tools.last_result = result
+    if not failed and result["valid"] == "valid":
+        out_path = f"{output_folder}/{pname}/{pname}.best_solution.xml"
+        tools.best_result = result
+        tools.best_cost = result["Total cost"]
+        tools.assignments_to_xml(assignments, pname, out_path, runtime)
+        tools.publish_best(assignments, pname, out_path, runtime)
+    else:
+        tools.assignments_to_xml(assignments, pname, f"{output_folder}/{pname}/{pname}.last_solution.xml", runtime)
+    tools.conclude(runtime, report, pname, output_folder, reader)
@@ -0,0 +1,109 @@
+"""
+环境结果的撤销日志：排课、撤课和排课失败都经过 Journal，记录改动前的状态，
+可以回滚到之前的任意标记。标记只是日志长度（O(1)），回滚按改动数倒序恢复：
+agent 的 action / penalty、教室 ocupied（恢复到原来的位置）、未排课程列表 _assignment
+以及按改动增量维护的时间 / 教室惩罚（LocalSearch.evaluate 直接读取，不再遍历全部课程）。
+观测相关的派生状态（masked_actions、observe_space、room_constraints_cids）不在日志中，使用前会重新计算。
+适用于 PMAPPO / RPMAPPO / Random 环境和 CGCS trainer（共用 agents / rooms 的结构）。
+"""
+from math import inf
+
+
+class Journal:
+    def __init__(self, env):
+        """在环境当前结果上开始记录；环境整体重置（reset / fix）前应先 close()"""
+        self.env = env
+        self.log = []
+        # 已排课程的时间 / 教室惩罚（未乘权重），口径与 LocalSearch.evaluate 相同
+        self.time_penalty = 0
+        self.room_penalty = 0
+        for agent in env.agents:
+            if agent.action is not None:
+                self._count(agent, agent.action, 1)
+        env.journal = self
+
+    def close(self):
+        self.log = []
+        self.env.journal = None
+
+    def _agent(self, cid):
+        return self.env.agents[self.env.cid2ind[cid]]
+
+    def _count(self, agent, action, sign):
+        room_option_ind, time_option_ind, _ = action
+        self.time_penalty += sign * agent.time_options[time_option_ind]['penalty']
+        if agent.room_required and room_option_ind != -1:
+            self.room_penalty += sign * agent.room_options[room_option_ind]['penalty']
+
+    def _ocupied(self, agent, action):
+        if action[0] == -1:
+            return None
+        return self.env.rooms[agent.room_options[action[0]]['id']]['ocupied']
+
+    def _place(self, agent, action, index=None):
+        agent.candidate = None
+        agent.action = action
+        agent.penalty = action[2]
+        ocupied = self._ocupied(agent, action)
+        if ocupied is not None:
+            entry = (agent.id, agent.time_options[action[1]]['optional_time_bits'], action)
+            ocupied.insert(len(ocupied) if index is None else index, entry)
+        self._count(agent, action, 1)
+
+    def _remove(self, agent):
+        """撤掉 agent 当前的动作，返回它在教室 ocupied 中的位置"""
+        index = None
+        ocupied = self._ocupied(agent, agent.action)
+        if ocupied is not None:
+            # 回滚按倒序进行，要找的占用通常在末尾
+            index = next(i for i in range(len(ocupied) - 1, -1, -1) if ocupied[i][0] == agent.id)
+            del ocupied[index]
+        self._count(agent, agent.action, -1)
+        agent.action = None
+        agent.penalty = inf
+        return index
+
+    # ---------- 改动 ----------
+    def assign(self, cid, action):
+        """把 cid 放到 action（已排时先撤掉原动作）"""
+        agent = self._agent(cid)
+        previous = (agent.action, agent.penalty)
+        index = self._remove(agent) if agent.action is not None else None
+        self._place(agent, action)
+        self.log.append(("assign", cid, previous, index))
+
+    def unassign(self, cid):
+        agent = self._agent(cid)
+        if agent.action is None:
+            return
+        previous = (agent.action, agent.penalty)
+        index = self._remove(agent)
+        self.log.append(("unassign", cid, previous, index))
+
+    def fail(self, cid):
+        """cid 没有可行动作，记入未排课程"""
+        self.env._assignment.append(cid)
+        self.log.append(("fail", cid, None, None))
+
+    # ---------- 标记与回滚 ----------
+    def mark(self):
+        return len(self.log)
+
+    def rollback(self, marker=0):
+        """撤销 marker 之后的全部改动"""
+        while len(self.log) > marker:
+            kind, cid, previous, index = self.log.pop()
+            if kind == "fail":
+                self.env._assignment.pop()
+                continue
+            agent = self._agent(cid)
+            if kind == "assign":
+                self._remove(agent)
+            action, penalty = previous
+            if action is not None:
+                self._place(agent, action, index)
+            agent.penalty = penalty
+
+    def commit(self):
+        """保留当前结果，丢弃日志；之前的标记失效"""
+        self.log = []
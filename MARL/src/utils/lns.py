@@ -0,0 +1,161 @@
+"""
+ruin-and-recreate 大邻域搜索：每次从当前结果中取一组相关课程（同一教室、同在一条约束中或同一天同一时段），
+撤掉后只重排这组课程，其余课程固定。重排沿用构造阶段的做法：按增量惩罚贪心择优（CGCS），
+或按策略最近一次输出的概率（agent.probs）在可行动作中采样。
+可行性和惩罚只计算这组课程相关的约束，接受规则、回滚和统计与 LocalSearch 相同。
+"""
+from MARL.utils.local_search import LocalSearch
+
+RELATIONS = ("room", "constraint", "time")
+BLOCK = 12 # 时间关系分桶的时段粒度（slot 数）
+
+
+class LNS(LocalSearch):
+    name = "lns"
+    section = "lns"
+
+    def __init__(self, env, config=None, seed=None):
+        super().__init__(env, config, seed)
+        options = (config or {}).get(self.section, {})
+        self.iterations = options.get('iterations', 200)
+        self.size = options.get('size', 8)
+        self.method = options.get('method', 'greedy')
+        self.relations = options.get('relations') or list(RELATIONS)
+        # cid -> 与其同在某条硬 / 软约束中的课程
+        self.linked = {}
+        for index in (self.hard_by_class, self.soft_by_class):
+            for cid, constraints in index.items():
+                for cons in constraints:
+                    self.linked.setdefault(cid, set()).update(cons['classes'])
+        for cid, linked in self.linked.items():
+            linked.discard(cid)
+        # cid -> 每个时间选项的 (weeks, days) 整数位图与起止，只解析一次
+        self.times = {
+            agent.id: [
+                (int(weeks, 2), int(days, 2), start, length)
+                for weeks, days, start, length in (option['optional_time_bits'] for option in agent.time_options)
+            ]
+            for agent in env.agents
+        }
+        self.buckets = {} # (day 位, 时段块) -> 当前排在这里的课程
+        self.keys = {} # cid -> 它所在的桶
+
+    # ---------- ruin ----------
+    def _times(self, cid):
+        return self.times[cid][self._agent(cid).action[1]]
+
+    def _bucket_keys(self, cid):
+        _, days, start, length = self._times(cid)
+        blocks = range(start // BLOCK, (start + length - 1) // BLOCK + 1)
+        return [(day, block) for day in range(days.bit_length()) if days >> day & 1 for block in blocks]
+
+    def _index(self, cid):
+        """按 cid 当前的时间更新分桶"""
+        for key in self.keys.pop(cid, ()):
+            self.buckets[key].discard(cid)
+        if self._agent(cid).action is None:
+            return
+        keys = self.keys[cid] = self._bucket_keys(cid)
+        for key in keys:
+            self.buckets.setdefault(key, set()).add(cid)
+
+    def _relatives(self, cid, relation):
+        agent = self._agent(cid)
+        if relation == "room":
+            room = self._room(agent, agent.action)
+            return [entry[0] for entry in self.env.rooms[room]['ocupied']] if room is not None else []
+        if relation == "constraint":
+            return list(self.linked.get(cid, ()))
+        # 只看同一天同一时段块中的课程，再精确判断重叠
+        weeks, days, start, length = self._times(cid)
+        candidates = set()
+        for key in self.keys.get(cid, ()):
+            candidates |= self.buckets[key]
+        related = []
+        for other in sorted(candidates):
+            weeks2, days2, start2, length2 = self._times(other)
+            if weeks & weeks2 and days & days2 and start < start2 + length2 and start2 < start + length:
+                related.append(other)
+        return related
+
+    def _select(self):
+        """从随机一门课出发按一种关系扩展，得到不超过 size 门已排课程"""
+        relation = self.random.choice(self.relations)
+        seed = self.random.choice(self.assigned)
+        subset, seen, frontier = [seed], {seed}, [seed]
+        while frontier and len(subset) < self.size:
+            cid = frontier.pop(self.random.randrange(len(frontier)))
+            related = [
+                other for other in self._relatives(cid, relation)
+                if other not in seen and self._agent(other).action is not None
+            ]
+            self.random.shuffle(related)
+            for other in related[:self.size - len(subset)]:
+                seen.add(other)
+                subset.append(other)
+                frontier.append(other)
+        return subset
+
+    # ---------- recreate ----------
+    def _choose(self, cid):
+        """其余课程固定时 cid 的动作：贪心取增量惩罚最小的可行动作，policy 时按策略概率采样；没有可行动作返回 None"""
+        agent = self._agent(cid)
+        soft = self.env.Soft_validator
+        probs = getattr(agent, 'probs', None) if self.method == 'policy' else None
+        best, best_penalty, feasible, weights = None, None, [], []
+        for aid, action in enumerate(agent.action_space):
+            if not self._feasible(cid, action):
+                continue
+            if probs is not None:
+                feasible.append(action)
+                weights.append(probs[aid] + 1e-6)
+                continue
+            agent.candidate = action
+            penalty = action[2] + self.optimization['distribution'] * sum(
+                (soft._violation_rate(cons, cid) or 0) * cons['penalty'] for cons in self.soft_by_class.get(cid, [])
+            )
+            agent.candidate = None
+            if best is None or penalty < best_penalty:
+                best, best_penalty = action, penalty
+        if probs is not None:
+            return self.random.choices(feasible, weights)[0] if feasible else None
+        return best
+
+    def _recreate(self, cids):
+        order = list(cids)
+        self.random.shuffle(order)
+        for cid in order:
+            action = self._choose(cid)
+            if action is None:
+                return False
+            self.journal.assign(cid, action)
+        return True
+
+    # ---------- 邻域 ----------
+    def _prepare(self):
+        self.assigned = [agent.id for agent in self.env.agents if agent.action is not None]
+        self.buckets, self.keys = {}, {}
+        if "time" in self.relations:
+            for cid in self.assigned:
+                self._index(cid)
+        return bool(self.assigned)
+
+    def _neighbour(self):
+        subset = self._select()
+        journal = self.journal
+        marker = journal.mark()
+        constraints = self._related(subset)
+        before = sum(self._agent(cid).action[2] for cid in subset) + self.optimization['distribution'] * self._soft(constraints)
+        for cid in subset:
+            journal.unassign(cid)
+        delta = None
+        if self._recreate(subset):
+            after = sum(self._agent(cid).action[2] for cid in subset) + self.optimization['distribution'] * self._soft(constraints)
+            if self._accept(after - before):
+                delta = after - before
+        if delta is None:
+            journal.rollback(marker)
+        if self.keys:
+            for cid in subset:
+                self._index(cid)
+        return delta
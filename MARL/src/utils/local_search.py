@@ -0,0 +1,209 @@
+"""
+构造完成后的局部搜索：在环境当前结果上做 move（一门课换到自己的另一个可选动作）
+和 swap（两门课互换教室、时间不变）两种邻域，用模拟退火决定是否接受。
+每个候选只检查相关课程的约束：教室冲突看目标教室的 ocupied，硬 / 软约束按课程预先建好索引，
+惩罚变化只由这几条软约束和动作自身的惩罚算出。改动经过 Journal，被拒绝的候选和最优之后的改动都靠回滚撤销。
+适用于 PMAPPO / RPMAPPO / Random 环境和 CGCS trainer（它们共用 agents / rooms / 校验器的结构）。
+"""
+import math
+import time
+import random
+from MARL.utils.journal import Journal
+
+
+class LocalSearch:
+    name = "local search" # 统计项前缀
+    section = "local_search" # config 中的配置段
+
+    def __init__(self, env, config=None, seed=None):
+        options = (config or {}).get(self.section, {})
+        self.env = env
+        self.iterations = options.get('iterations', 2000)
+        self.swap_rate = options.get('swap_rate', 0.3)
+        self.temperature = options.get('temperature', 1.0)
+        self.cooling = options.get('cooling', 0.999)
+        self.random = random.Random(options.get('seed', seed))
+        self.optimization = env.reader.optimization
+        self.hard_by_class = {}
+        self.soft_by_class = {}
+        for constraints, index in ((env.hard_constrains, self.hard_by_class), (env.soft_constrains, self.soft_by_class)):
+            for cons in constraints:
+                for cid in cons['classes']:
+                    index.setdefault(cid, []).append(cons)
+        # cid -> {(room 下标, time 下标): action}，swap 时按下标找动作
+        self.actions = {agent.id: {action[:2]: action for action in agent.action_space} for agent in env.agents}
+        self.room_index = {
+            agent.id: {option['id']: i for i, option in enumerate(agent.room_options)} for agent in env.agents
+        }
+        self.journal = None # run() 期间的撤销日志，只保留当前最优之后接受的改动
+        self._t = self.temperature
+
+    # ---------- 放置 ----------
+    def _agent(self, cid):
+        return self.env.agents[self.env.cid2ind[cid]]
+
+    def _room(self, agent, action):
+        return agent.room_options[action[0]]['id'] if action[0] != -1 else None
+
+    def _feasible(self, cid, action):
+        """cid 已从教室占用中移除时，检查放到 action 是否违反硬约束"""
+        agent = self._agent(cid)
+        hard = self.env.Hard_validator
+        agent.candidate = action
+        try:
+            room = self._room(agent, action)
+            if room is not None:
+                if hard.RoomConflicts(cid, self.env.rooms[room]['ocupied']):
+                    return False
+                if hard.RoomUnavailable(cid, self.env.rooms[room]['unavailables_bits']):
+                    return False
+            return not any(hard._violation_rate(cons, cid) for cons in self.hard_by_class.get(cid, []))
+        finally:
+            agent.candidate = None
+
+    def _soft(self, constraints):
+        soft = self.env.Soft_validator
+        return sum((soft._violation_rate(cons) or 0) * cons['penalty'] for cons in constraints)
+
+    def _related(self, cids):
+        seen, constraints = set(), []
+        for cid in cids:
+            for cons in self.soft_by_class.get(cid, []):
+                if id(cons) not in seen:
+                    seen.add(id(cons))
+                    constraints.append(cons)
+        return constraints
+
+    # ---------- 邻域 ----------
+    def _try(self, changes):
+        """
+        changes: [(cid, 新动作)]，依次放置并检查可行性；可行且被接受时保留并返回惩罚变化，否则回滚返回 None
+        """
+        journal = self.journal
+        marker = journal.mark()
+        constraints = self._related([cid for cid, _ in changes])
+        # 只累加改动课程的动作惩罚，避免全局计数的浮点误差影响零变化的判断
+        before = sum(self._agent(cid).action[2] for cid, _ in changes) + self.optimization['distribution'] * self._soft(constraints)
+        for cid, _ in changes:
+            journal.unassign(cid)
+        for cid, action in changes:
+            if not self._feasible(cid, action):
+                break
+            journal.assign(cid, action)
+        else:
+            after = sum(action[2] for _, action in changes) + self.optimization['distribution'] * self._soft(constraints)
+            delta = after - before
+            if self._accept(delta):
+                return delta
+        journal.rollback(marker)
+        return None
+
+    def _accept(self, delta):
+        if delta <= 0:
+            return True
+        if self._t <= 0:
+            return False
+        return self.random.random() < math.exp(-delta / self._t)
+
+    def _prepare(self):
+        """搜索开始时收集可动的课程，没有可动课程时返回 False"""
+        env = self.env
+        self.movable = [agent.id for agent in env.agents if agent.action is not None and len(agent.action_space) > 1]
+        self.roomed = [agent.id for agent in env.agents if agent.action is not None and agent.action[0] != -1 and len(agent.room_options) > 1]
+        return bool(self.movable)
+
+    def _neighbour(self):
+        """尝试一个邻域动作，接受时返回惩罚变化，否则返回 None"""
+        if self.roomed and self.random.random() < self.swap_rate:
+            return self._swap(self.roomed)
+        return self._move(self.movable)
+
+    def _move(self, movable):
+        cid = self.random.choice(movable)
+        agent = self._agent(cid)
+        action = self.random.choice(agent.action_space)
+        if action == agent.action:
+            return None
+        return self._try([(cid, action)])
+
+    def _swap(self, roomed):
+        cid1 = self.random.choice(roomed)
+        agent1 = self._agent(cid1)
+        room1 = self._room(agent1, agent1.action)
+        room2 = self.random.choice(agent1.room_options)['id']
+        ocupied = self.env.rooms[room2]['ocupied']
+        if room2 == room1 or not ocupied:
+            return None
+        cid2 = self.random.choice(ocupied)[0]
+        agent2 = self._agent(cid2)
+        if room1 not in self.room_index[cid2]:
+            return None
+        action1 = self.actions[cid1].get((self.room_index[cid1][room2], agent1.action[1]))
+        action2 = self.actions[cid2].get((self.room_index[cid2][room1], agent2.action[1]))
+        if action1 is None or action2 is None:
+            return None
+        return self._try([(cid1, action1), (cid2, action2)])
+
+    # ---------- 评估 ----------
+    def evaluate(self):
+        """与环境 total_penalty 相同口径的惩罚，不计算观测；有打开的 Journal 时时间 / 教室惩罚直接取它的计数"""
+        journal = getattr(self.env, 'journal', None)
+        if journal is not None:
+            time_penalty, room_penalty = journal.time_penalty, journal.room_penalty
+        else:
+            time_penalty = room_penalty = 0
+            for agent in self.env.agents:
+                if agent.action is None:
+                    continue
+                rid, tid, _ = agent.action
+                if agent.room_required:
+                    room_penalty += agent.room_options[rid]['penalty']
+                time_penalty += agent.time_options[tid]['penalty']
+        distribution_penalty = self._soft(self.env.soft_constrains)
+        return {
+            "Total cost": self.optimization["time"] * time_penalty + self.optimization["room"] * room_penalty +
+                          self.optimization["distribution"] * distribution_penalty,
+            "Time penalty": time_penalty,
+            "Room penalty": room_penalty,
+            "Distribution penalty": distribution_penalty,
+        }
+
+    def run(self, iterations=None, stop=None):
+        """
+        在当前结果上搜索 iterations 步，结束时回到搜索过程中的最优结果；
+        stop 为可选的无参回调（如 tools.expired），返回 True 时提前结束。返回改进后的惩罚和搜索统计。
+        """
+        started = time.perf_counter()
+        env = self.env
+        env.Hard_validator.setClasses(env.agents)
+        env.Soft_validator.setClasses(env.agents)
+        self.journal = Journal(env)
+        searchable = self._prepare()
+        before = self.evaluate()["Total cost"]
+        current = best = 0 # 相对搜索开始时的惩罚变化
+        self._t = self.temperature
+        accepted = improved = steps = 0
+        for steps in range(1, (iterations or self.iterations) + 1):
+            if not searchable or (stop is not None and stop()):
+                break
+            delta = self._neighbour()
+            self._t *= self.cooling
+            if delta is None:
+                continue
+            accepted += 1
+            current += delta
+            if current < best - 1e-9:
+                best = current
+                improved += 1
+                self.journal.commit()
+        self.journal.rollback()
+        result = self.evaluate()
+        self.journal.close()
+        result.update({
+            f"{self.name} before": before,
+            f"{self.name} steps": steps,
+            f"{self.name} accepted": accepted,
+            f"{self.name} improved": improved,
+            f"{self.name} seconds": time.perf_counter() - started,
+        })
+        return result
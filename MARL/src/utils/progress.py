@@ -0,0 +1,83 @@
+import logging
+import threading
+import time
+from asgiref.sync import async_to_sync
+
+logger = logging.getLogger(__name__)
+
+class ProgressStream:
+    """
+    训练进度推送：训练线程 publish 只覆盖最新状态（容量为 1 的合并队列），
+    后台线程按 interval 节流，把最新状态 group_send 给 TrainingConsumer。
+    socket 跟不上时中间状态被丢弃，最新状态优先，publish 不会阻塞求解。
+    """
+    def __init__(self, group, channel_layer=None, interval=0.2, event_type="send_log"):
+        self.group = group
+        self.channel_layer = channel_layer
+        self.interval = interval
+        self.event_type = event_type
+        self.lock = threading.Lock()
+        self.send_lock = threading.Lock()
+        self.pending = None
+        self.coalesced = 0
+        self.event = threading.Event()
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def publish(self, data):
+        with self.lock:
+            if self.pending is not None:
+                self.coalesced += 1
+            self.pending = data
+        self.event.set()
+
+    def publish_best(self, data):
+        """新的最优解不合并、不节流，在调用线程直接发送（事件类型 send_best）"""
+        self._send(data, "send_best")
+
+    def _take(self):
+        with self.lock:
+            data, self.pending = self.pending, None
+            self.event.clear()
+        return data
+
+    def _send(self, data, event_type=None):
+        if self.channel_layer is None:
+            from channels.layers import get_channel_layer
+            self.channel_layer = get_channel_layer()
+        try:
+            with self.send_lock:
+                async_to_sync(self.channel_layer.group_send)(self.group, {"type": event_type or self.event_type, "data": data})
+        except Exception:
+            # 推送失败不影响训练
+            logger.warning("progress stream send to %s failed", self.group, exc_info=True)
+
+    def _run(self):
+        while not self.stop.is_set():
+            if not self.event.wait(0.1):
+                continue
+            data = self._take()
+            if data is not None:
+                self._send(data)
+            time.sleep(self.interval)
+        data = self._take()
+        if data is not None:
+            self._send(data)
+
+    def close(self):
+        """停止后台线程，并把最后一个状态发送出去"""
+        self.stop.set()
+        self.thread.join()
+
+class PipeLayer:
+    """
+    供求解子进程使用的最小 channel layer：把 group_send 的数据写入到主进程的管道，
+    由主进程转发到真正的 channel layer。
+    """
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def group_send(self, group, message):
+        kind = "best" if message["type"] == "send_best" else "progress"
+        self.conn.send((kind, group, message["data"]))
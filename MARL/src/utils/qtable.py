@@ -0,0 +1,123 @@
+import numpy as np
+
+class SparseQTable:
+    """
+    只存储访问过的 (state, action) 项的 Q 表，未访问项视为 0，
+    与 np.zeros((obs_dim, action_dim)) 的稠密表语义一致。
+    同时按行、按列建索引，列 max 只扫描非零项；每行的 argmax 在写入时更新并存成数组，
+    可以一次取出多行（argmax_rows）。
+    """
+    def __init__(self, obs_dim, action_dim):
+        self.obs_dim = obs_dim
+        self.action_dim = action_dim
+        self.rows = {} # state -> {action: value}
+        self.cols = {} # action -> {state: value}
+        self.best = np.zeros(obs_dim, dtype=np.int64) # state -> argmax
+
+    def __setstate__(self, state):
+        # 旧检查点中的表没有 best
+        self.__dict__.update(state)
+        if "best" not in state:
+            self.best = np.zeros(self.obs_dim, dtype=np.int64)
+            for s in self.rows:
+                self.best[s] = self._row_argmax(s)
+
+    def __len__(self):
+        return sum(len(row) for row in self.rows.values())
+
+    def get(self, state, action):
+        return self.rows.get(state, {}).get(action, 0.0)
+
+    def set(self, state, action, value):
+        self.rows.setdefault(state, {})[action] = value
+        self.cols.setdefault(action, {})[state] = value
+        self.best[state] = self._row_argmax(state)
+
+    def argmax(self, state):
+        return int(self.best[state])
+
+    def argmax_rows(self, states):
+        """多行的 argmax，等价于 np.argmax(Q[states], axis=1)"""
+        return self.best[np.asarray(states, dtype=np.int64)]
+
+    def _row_argmax(self, state):
+        # 等价于稠密表的 np.argmax(Q[state])：取最大值，并列时取最小下标
+        row = self.rows.get(state)
+        if not row:
+            return 0
+        best = max(row.values())
+        if best <= 0 and len(row) < self.action_dim:
+            # 未访问项为 0，可能与最大值并列或更大
+            unseen = next(a for a in range(self.action_dim) if a not in row)
+            if best < 0:
+                return unseen
+            return min(unseen, min(a for a, v in row.items() if v == 0))
+        return min(a for a, v in row.items() if v == best)
+
+    def col_max(self, action):
+        # 等价于稠密表的 np.max(Q[:, action])
+        col = self.cols.get(action)
+        if not col:
+            return 0.0
+        best = max(col.values())
+        if len(col) < self.obs_dim:
+            best = max(best, 0.0)
+        return best
+
+    def update(self, states, actions, targets_fn):
+        """
+        与稠密表上按 states 顺序逐行更新 Q[s, a] = targets_fn(Q[s, a], max(Q[:, a])) 的结果相同。
+        本批 actions 互不相同时（scheduler 的动作是位置的一个排列），每列只被写一次，
+        先对各列计算一次 max 再一次性写回；有重复列时后面的行要看到前面的写入，逐行更新。
+        targets_fn(old_values, col_max, rows) 返回新值数组，rows 为这些值在本批中的下标。
+        """
+        states = np.asarray(states, dtype=np.int64)
+        actions = np.asarray(actions, dtype=np.int64)
+        columns = np.unique(actions)
+        if len(columns) < len(actions):
+            for i in range(len(states)):
+                self._write(states[i:i + 1], actions[i:i + 1], targets_fn, np.array([i]))
+            return
+        self._write(states, actions, targets_fn, np.arange(len(states)))
+
+    def _write(self, states, actions, targets_fn, rows):
+        columns = np.unique(actions)
+        col_max = {int(a): self.col_max(int(a)) for a in columns}
+        old_values = np.array([self.get(int(s), int(a)) for s, a in zip(states, actions)], dtype=np.float64)
+        max_values = np.array([col_max[int(a)] for a in actions], dtype=np.float64)
+        new_values = targets_fn(old_values, max_values, rows)
+        for s, a, v in zip(states.tolist(), actions.tolist(), new_values.tolist()):
+            self.set(s, a, v)
+
+    def to_arrays(self):
+        states, actions, values = [], [], []
+        for s, row in self.rows.items():
+            for a, v in row.items():
+                states.append(s)
+                actions.append(a)
+                values.append(v)
+        return (
+            np.array(states, dtype=np.int32),
+            np.array(actions, dtype=np.int32),
+            np.array(values, dtype=np.float64),
+        )
+
+    def save(self, path):
+        states, actions, values = self.to_arrays()
+        np.savez_compressed(path, shape=np.array([self.obs_dim, self.action_dim]), states=states, actions=actions, values=values)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        obs_dim, action_dim = data["shape"].tolist()
+        table = cls(obs_dim, action_dim)
+        for s, a, v in zip(data["states"].tolist(), data["actions"].tolist(), data["values"].tolist()):
+            table.set(s, a, v)
+        return table
+
+    @classmethod
+    def from_dense(cls, Qtable):
+        table = cls(*Qtable.shape)
+        for s, a in zip(*np.nonzero(Qtable)):
+            table.set(int(s), int(a), float(Qtable[s, a]))
+        return table
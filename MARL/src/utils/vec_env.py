@@ -0,0 +1,87 @@
+import multiprocessing as mp
+
+def _dump_state(env):
+    # 只回传重建 results()/save() 所需的分配状态
+    return {
+        "actions": [agent.action for agent in env.agents],
+        "rooms": env.rooms,
+        "not assignment": env._assignment,
+    }
+
+def _load_state(env, state):
+    for agent, action in zip(env.agents, state["actions"]):
+        agent.action = action
+    env.rooms = state["rooms"]
+    env._assignment = state["not assignment"]
+
+def _worker(remote, parent_remote, env_cls, reader, config, seed):
+    parent_remote.close()
+    # reader 在 fork 后以写时复制方式共享，只读使用
+    env = env_cls(reader, config)
+    for agent in env.agents:
+        agent._action_space.seed(seed)
+    env.reset(order=True)
+    try:
+        while True:
+            cmd, data = remote.recv()
+            if cmd == "rollout":
+                agents_order, agent_order_dict, probs, n = data
+                env.agents_order = agents_order
+                env.agent_order_dict = agent_order_dict
+                rollouts = []
+                for _ in range(n):
+                    env.reset_step()
+                    env.apply_mappo_action(probs)
+                    result = env.step()
+                    rollouts.append((result, _dump_state(env)))
+                remote.send(rollouts)
+            elif cmd == "close":
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        remote.close()
+
+class VecEnv:
+    """
+    K 个子进程各持有一份环境副本，在同一 episode 内并行执行 steps_clip 次构造。
+    episode 内策略固定，reset_step 后的观测只取决于 agents_order，
+    因此主进程只需下发排序和 MAPPO 概率，各 worker 独立采样。
+    """
+    def __init__(self, env_cls, reader, config, num_workers, seed=42):
+        self.num_workers = num_workers
+        ctx = mp.get_context("fork") if "fork" in mp.get_all_start_methods() else mp.get_context()
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe() for _ in range(num_workers)])
+        self.processes = []
+        for wid, (work_remote, remote) in enumerate(zip(self.work_remotes, self.remotes)):
+            # 每个 worker 使用不同的种子，避免各副本采样出相同的分配
+            args = (work_remote, remote, env_cls, reader, config, seed + wid + 1)
+            process = ctx.Process(target=_worker, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+        self.closed = False
+
+    def rollout(self, env, probs, steps_clip):
+        """
+        并行执行 steps_clip 次 reset_step -> apply_mappo_action -> step，
+        按 worker 顺序合并结果，并把 env 同步为最后一次构造的分配（与串行模式一致）。
+        """
+        counts = [steps_clip // self.num_workers + (1 if i < steps_clip % self.num_workers else 0) for i in range(self.num_workers)]
+        for remote, n in zip(self.remotes, counts):
+            remote.send(("rollout", (env.agents_order, env.agent_order_dict, probs, n)))
+        rollouts = []
+        for remote, n in zip(self.remotes, counts):
+            part = remote.recv()
+            rollouts.extend(part)
+        _load_state(env, rollouts[-1][1])
+        return [result for result, _ in rollouts]
+
+    def close(self):
+        if self.closed:
+            return
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self.closed = True
@@ -1,3 +1,727 @@
-from django.test import TestCase
+import importlib
+import importlib.util
+import multiprocessing as mp
+import os
+import time
+import numpy as np
+from unittest import mock, skipUnless
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
 
-# Create your tests here.
+HAS_TORCH = importlib.util.find_spec("torch") is not None
+
+
+def _import(names):
+    # 与 run_job 相同：spawn 子进程中先导入 interface，再按求解器自己的方式导入
+    from MARL.src import interface  # noqa: F401
+    for name in names:
+        importlib.import_module(name)
+
+
+class SolverImportTest(SimpleTestCase):
+    def _import_in_child(self, names):
+        process = mp.get_context("spawn").Process(target=_import, args=(names,))
+        process.start()
+        process.join(60)
+        self.assertEqual(process.exitcode, 0)
+
+    def test_solver_packages_resolve(self):
+        from MARL.src import interface  # noqa: F401
+        for name in ("main", "MARL.PMAPPO.train", "MARL.RPMAPPO.train", "MARL.Random.train",
+                     "MARL.PMAPPO.resolve", "MARL.utils.decompose"):
+            self.assertIsNotNone(importlib.util.find_spec(name), name)
+
+    def test_import_in_job_process(self):
+        self._import_in_child(["MARL.utils.lns", "MARL.utils.qtable", "utils.progress"])
+
+    @skipUnless(HAS_TORCH, "torch is not installed")
+    def test_import_trainers_in_job_process(self):
+        self._import_in_child(["main", "MARL.PMAPPO.train", "MARL.RPMAPPO.train", "MARL.Random.train"])
+
+
+def _solver_with_child(conn):
+    # 与 run_job 相同先 setsid，再启动一个子进程（相当于 VecEnv / actor 进程）
+    import os, subprocess, time
+    os.setsid()
+    child = subprocess.Popen(["sleep", "60"])
+    conn.send(child.pid)
+    time.sleep(60)
+
+
+def _exited(pid):
+    """进程已退出（不存在或只剩僵尸）"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] in ("Z", "X")
+    except FileNotFoundError:
+        return True
+
+
+class _Manager:
+    """记录提交的配置，不启动求解进程"""
+    def __init__(self):
+        self.jobs = {}
+
+    def submit(self, config, owner=None):
+        job = {"id": f"job{len(self.jobs)}", "owner": owner, "status": "queued", "config": config}
+        self.jobs[job["id"]] = job
+        return job
+
+    def status(self, job_id):
+        return self.jobs.get(job_id)
+
+    def list(self, owner=None):
+        return [job for job in self.jobs.values() if owner is None or job["owner"] == owner]
+
+    def best_solution(self, job_id):
+        return self.jobs.get(job_id), None
+
+    def cancel(self, job_id):
+        self.jobs[job_id]["status"] = "cancelled"
+        return self.jobs[job_id]
+
+
+@override_settings(SOLVER_MAX_TIME_BUDGET=60)
+class TrainingEndpointTest(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username="u1", password="p")
+        self.other = User.objects.create_user(username="u2", password="p")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.manager = _Manager()
+        patcher = mock.patch("MARL.views.get_manager", return_value=self.manager)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_requires_authentication(self):
+        self.assertEqual(APIClient().post("/start/", {}, format="json").status_code, 401)
+        self.assertEqual(APIClient().get("/jobs/").status_code, 401)
+
+    def test_submit_uses_server_config_and_caps_budget(self):
+        response = self.client.post("/start/", {"method": "PMAPPO"}, format="json")
+        self.assertEqual(response.status_code, 202)
+        config = response.data["job"]["config"]
+        self.assertEqual(config["method"]["name"], "PMAPPO")
+        self.assertEqual(config["train"]["time_budget"], 60)
+        self.assertIsNone(config["resolve"]["previous"])
+        self.assertEqual(response.data["job"]["owner"], self.user.pk)
+
+    def test_rejects_other_keys(self):
+        for body in ({"config": {"output": "/tmp"}}, {"data": {"folder": "/"}}, {"time_budget": 3600},
+                     {"method": "CGCS"}, {"file": "../../etc/passwd"}):
+            response = self.client.post("/start/", body, format="json")
+            self.assertEqual(response.status_code, 400, body)
+        self.assertEqual(self.manager.jobs, {})
+
+    def test_jobs_are_private(self):
+        job = self.client.post("/start/", {}, format="json").data["job"]
+        other = APIClient()
+        other.force_authenticate(self.other)
+        for url in (f"/jobs/{job['id']}/", f"/jobs/{job['id']}/best/"):
+            self.assertEqual(other.get(url).status_code, 404)
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(other.post(f"/jobs/{job['id']}/cancel/").status_code, 404)
+        self.assertEqual(self.manager.jobs[job["id"]]["status"], "queued")
+        self.assertEqual(other.get("/jobs/").data["jobs"], [])
+        self.assertEqual(len(self.client.get("/jobs/").data["jobs"]), 1)
+
+
+@mock.patch("MARL.src.jobs.JobManager._announce")
+class SharedJobRegistryTest(TestCase):
+    """两个 JobManager 模拟两个 web 进程，共用数据库中的任务表"""
+    def setUp(self):
+        from MARL.src.jobs import JobManager
+        from MARL.src.interface import default_config
+        self.config = default_config()
+        self.a = JobManager(max_workers=1, max_queued=2)
+        self.b = JobManager(max_workers=1, max_queued=2)
+        self.b.worker = "other-host:1"
+
+    def test_status_and_cancel_from_another_process(self, announce):
+        job = self.a.submit(self.config, owner=None)
+        self.assertEqual(self.b.status(job["id"])["status"], "queued")
+        self.assertEqual([j["id"] for j in self.b.list()], [job["id"]])
+        self.assertEqual(self.b.cancel(job["id"])["status"], "cancelled")
+        self.assertEqual(self.a.status(job["id"])["status"], "cancelled")
+
+    def test_queue_and_workers_are_global(self, announce):
+        from MARL.src.jobs import JobQueueFull
+        first = self.a.submit(self.config)
+        self.b.submit(self.config)
+        with self.assertRaises(JobQueueFull):
+            self.a.submit(self.config)
+        self.assertEqual(self.a._claim().pk, first["id"])
+        self.assertIsNone(self.b._claim())
+        # 运行中的任务由认领它的进程终止
+        self.b.cancel(first["id"])
+        self.a.processes[first["id"]] = None
+        self.assertEqual(self.a._cancelled(), [first["id"]])
+
+    def test_running_jobs_of_exited_workers_fail(self, announce):
+        import os, socket
+        job = self.a.submit(self.config)
+        self.a._claim()
+        self.a.worker = f"{socket.gethostname()}:{os.getpid()}"
+        from MARL.models import Job
+        Job.objects.filter(pk=job["id"]).update(worker=f"{socket.gethostname()}:999999999")
+        self.a._recover()
+        self.assertEqual(self.b.status(job["id"])["status"], "failed")
+
+
+    def test_progress_writes_are_throttled(self, announce):
+        from MARL.models import Job
+        job = self.a.submit(self.config)
+        self.a.progress_interval = 60
+        self.a.streams[job["id"]] = mock.Mock()
+        for episode in range(3):
+            self.a._handle(job["id"], ("progress", job["id"], {"episode": episode}))
+        self.assertEqual(Job.objects.get(pk=job["id"]).progress, {"episode": 0})
+        self.a._write_progress(job["id"], force=True)
+        self.assertEqual(Job.objects.get(pk=job["id"]).progress, {"episode": 2})
+
+    @skipUnless(os.path.exists("/proc"), "needs /proc")
+    def test_cancel_kills_process_group(self, announce):
+        job = self.a.submit(self.config)
+        self.a._claim()
+        conn, child_conn = self.a.ctx.Pipe(duplex=False)
+        process = self.a.ctx.Process(target=_solver_with_child, args=(child_conn,), daemon=True)
+        process.start()
+        child_conn.close()
+        child = conn.recv()
+        self.a.processes[job["id"]], self.a.conns[job["id"]] = process, conn
+        self.a._terminate(job["id"])
+        for _ in range(50):
+            if _exited(child):
+                break
+            time.sleep(0.1)
+        self.assertTrue(_exited(child))
+        self.assertEqual(self.a.status(job["id"])["status"], "cancelled")
+
+
+class ChannelLayerEncodingTest(SimpleTestCase):
+    def test_unserialisable_message_is_dropped_alone(self):
+        from MARL.src.layers import _encode_batch, _decode
+        good = ["group_send", "g", {"type": "send_log", "data": {"cost": 1}}]
+        bad = ["group_send", "g", {"type": "send_log", "data": {"x": object()}}]
+        with self.assertLogs("MARL.src.layers", level="ERROR"):
+            frames, rest = _decode(_encode_batch([good, bad, good]))
+        self.assertEqual(frames, [["batch", [good, good]]])
+        self.assertEqual(rest, b"")
+        with self.assertLogs("MARL.src.layers", level="ERROR"):
+            self.assertIsNone(_encode_batch([bad]))
+
+
+class UnixSocketChannelLayerTest(SimpleTestCase):
+    def setUp(self):
+        import tempfile
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.path = os.path.join(self.dir.name, "channels.sock")
+
+    async def test_expiry_and_disconnect(self):
+        import asyncio
+        from MARL.src.layers import UnixSocketChannelLayer
+        layer = UnixSocketChannelLayer(path=self.path, expiry=0.05)
+        channel = await layer.new_channel()
+        await layer.send(channel, {"type": "old"})
+        await asyncio.sleep(0.1)
+        await layer.send(channel, {"type": "new"})
+        self.assertEqual((await layer.receive(channel))["type"], "new")
+        # 消费者断开（receive 被取消）后不再保留它的队列
+        task = asyncio.ensure_future(layer.receive(channel))
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        self.assertNotIn(channel, layer.channels)
+        # 没有接收者的 channel 在消息过期后被清理
+        await layer.send(channel, {"type": "unread"})
+        await asyncio.sleep(0.1)
+        await layer.send(await layer.new_channel(), {"type": "other"})
+        self.assertNotIn(channel, layer.channels)
+
+    def test_socket_is_private(self):
+        import stat
+        from MARL.src.layers import UnixSocketChannelLayer
+        layer = UnixSocketChannelLayer(path=self.path)
+        layer._try_hub()
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+
+    def test_stalled_client_does_not_block_others(self):
+        import socket
+        from MARL.src.layers import _Hub, _encode, _decode
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.path)
+        server.listen()
+        _Hub(server)
+        clients = []
+        for owner in ("stalled!", "reader!"):
+            client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            client.connect(self.path)
+            client.sendall(_encode(["register", owner]))
+            clients.append(client)
+        stalled, reader = clients
+        reader.settimeout(5)
+        # 远超 socket 缓冲区、从不读取
+        payload = "x" * (100 << 10)
+        for _ in range(50):
+            reader.sendall(_encode(["send", "stalled!a", {"data": payload}]))
+        reader.sendall(_encode(["send", "reader!b", {"type": "ping"}]))
+        buffer, frames = b"", []
+        while not frames:
+            received, buffer = _decode(buffer + reader.recv(1 << 16))
+            frames += received
+        self.assertEqual(frames[0][1], [["deliver", "reader!b", {"type": "ping"}]])
+        stalled.close()
+        reader.close()
+
+
+@skipUnless(HAS_TORCH, "torch is not installed")
+class AsyncRolloutOrderTest(SimpleTestCase):
+    def test_episodes_of_other_orders_are_dropped(self):
+        import queue
+        from types import SimpleNamespace
+        from MARL.utils.async_rollout import AsyncRollout
+        rollout = AsyncRollout.__new__(AsyncRollout)
+        rollout.max_staleness, rollout.dropped, rollout.reordered = 1, 0, 0
+        rollout.order, rollout.order_version = None, 0
+        rollout.remotes = []
+        rollout.version = SimpleNamespace(value=0)
+        rollout.results = queue.Queue()
+        env = SimpleNamespace(agents=[], agents_order={0: "a", 1: "b"}, agent_order_dict={"a": 0, "b": 1})
+        rollout.publish(env)
+        rollout.publish(env) # 排序没变，版本不变
+        self.assertEqual(rollout.order_version, 1)
+        state = {"actions": [], "rooms": {}, "not assignment": []}
+        rollout.results.put({"version": 0, "order_version": 0, "obs": "old", "probs": None, "rollouts": None, "state": state})
+        rollout.results.put({"version": 0, "order_version": 1, "obs": "new", "probs": None, "rollouts": None, "state": state})
+        order = env.agents_order
+        self.assertEqual(rollout.collect(env)[0], "new")
+        self.assertEqual(rollout.reordered, 1)
+        self.assertIs(env.agents_order, order)
+
+    def test_dead_actor_raises(self):
+        import queue
+        from types import SimpleNamespace
+        from MARL.utils.async_rollout import AsyncRollout
+        rollout = AsyncRollout.__new__(AsyncRollout)
+        rollout.results, rollout.poll_interval = queue.Queue(), 0.01
+        rollout.processes = [SimpleNamespace(is_alive=lambda: False, exitcode=-9)]
+        with self.assertRaisesRegex(RuntimeError, "actor 0 exited"):
+            rollout.collect(None)
+
+
+@skipUnless(importlib.util.find_spec("pandas") is not None, "pandas is not installed")
+class MetricsWriterTest(SimpleTestCase):
+    def _write(self, out_dir, episodes, **kwargs):
+        from MARL.src import interface  # noqa: F401
+        from tools import MetricsWriter
+        writer = MetricsWriter(out_dir, **kwargs)
+        for episode in episodes:
+            writer.append({"episode": episode})
+        return writer
+
+    def _episodes(self, out_dir):
+        import json, os
+        with open(os.path.join(out_dir, "metrics.jsonl")) as f:
+            return [json.loads(line)["episode"] for line in f]
+
+    def test_fresh_run_overwrites_and_resume_appends(self):
+        import tempfile
+        with tempfile.TemporaryDirectory() as out_dir:
+            self._write(out_dir, range(5)).close()
+            self._write(out_dir, range(3)).close()
+            self.assertEqual(self._episodes(out_dir), [0, 1, 2])
+            # 检查点在 episode 2，之后的记录重新生成
+            self._write(out_dir, [2, 3], resume_episode=2).close()
+            self.assertEqual(self._episodes(out_dir), [0, 1, 2, 3])
+
+    def test_task_failure_is_logged(self):
+        import tempfile
+        with tempfile.TemporaryDirectory() as out_dir:
+            writer = self._write(out_dir, [])
+            with self.assertLogs("tools", level="ERROR"):
+                writer.submit(lambda: 1 / 0)
+                writer.close()
+
+
+class DecomposeTest(SimpleTestCase):
+    def test_student_edges(self):
+        from types import SimpleNamespace
+        from MARL.src import interface  # noqa: F401
+        from MARL.utils.decompose import components
+        classes = {cid: {"room_options": [{"id": f"r{cid}"}]} for cid in ("1", "2")}
+        courses = {cid: {"id": cid, "configs": {"c": {"subparts": {"s": {"classes": {cid: {}}}}}}} for cid in classes}
+        reader = SimpleNamespace(
+            classes=classes, courses=courses, students={"s": {"courses": ["1", "2"]}},
+            distributions={"hard_constraints": [], "soft_constraints": []},
+        )
+        self.assertEqual(len(components(reader)), 2)
+        # 共同选课的学生把两门课连成一个分量
+        self.assertEqual(components(reader, students=True), [["1", "2"]])
+
+
+class SparseQTableTest(SimpleTestCase):
+    """与原来的稠密表逐行更新（所有位置，列 max 包含本批之前的写入）结果一致"""
+    def _dense_update(self, Q, actions, rewards, lr=0.7, gamma=0.95):
+        for ind in range(Q.shape[0]):
+            a = actions[ind]
+            Q[ind, a] += lr * (rewards[ind] + gamma * np.max(Q[:, a]) - Q[ind, a])
+
+    def _sparse_update(self, table, actions, rewards, lr=0.7, gamma=0.95):
+        table.update(np.arange(table.obs_dim), actions, lambda q, q_max, rows: q + lr * (rewards[rows] + gamma * q_max - q))
+
+    def test_matches_dense_table(self):
+        from MARL.src import interface  # noqa: F401
+        from MARL.utils.qtable import SparseQTable
+        rng = np.random.default_rng(0)
+        n = 12
+        dense, sparse = np.zeros((n, n)), SparseQTable(n, n)
+        for episode in range(40):
+            # scheduler 的动作是位置的排列；偶尔出现重复列时逐行更新
+            actions = rng.permutation(n) if episode % 4 else rng.integers(0, n, n)
+            rewards = rng.normal(size=n) * (episode % 3 - 1)
+            self._dense_update(dense, actions, rewards)
+            self._sparse_update(sparse, actions, rewards)
+            table = np.zeros((n, n))
+            for s, row in sparse.rows.items():
+                for a, v in row.items():
+                    table[s, a] = v
+            np.testing.assert_allclose(table, dense)
+            np.testing.assert_array_equal(sparse.argmax_rows(np.arange(n)), np.argmax(dense, axis=1))
+            self.assertEqual([sparse.col_max(a) for a in range(n)], list(np.max(dense, axis=0)))
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class TrainingConsumerAuthTest(SimpleTestCase):
+    """WebSocket 订阅与 HTTP 任务接口一样只对任务所有者开放"""
+    def setUp(self):
+        self.manager = _Manager()
+        self.job = self.manager.submit({}, owner=1)
+        patcher = mock.patch("MARL.src.consumers.get_manager", return_value=self.manager)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def _connect(self, user, job_id):
+        from asgiref.testing import ApplicationCommunicator
+        from channels.routing import URLRouter
+        from MARL.routing import websocket_urlpatterns
+        scope = {"type": "websocket", "path": f"/ws/train/{job_id}/", "user": user,
+                 "headers": [], "query_string": b"", "subprotocols": []}
+        communicator = ApplicationCommunicator(URLRouter(websocket_urlpatterns), scope)
+        await communicator.send_input({"type": "websocket.connect"})
+        return communicator
+
+    async def test_anonymous_is_closed(self):
+        from django.contrib.auth.models import AnonymousUser
+        communicator = await self._connect(AnonymousUser(), self.job["id"])
+        self.assertEqual((await communicator.receive_output(1))["type"], "websocket.close")
+        await communicator.wait(1)
+
+    async def test_only_owner_gets_snapshot(self):
+        import json
+        from types import SimpleNamespace
+        for pk, expected in ((2, "job not found"), (1, "snapshot")):
+            communicator = await self._connect(SimpleNamespace(pk=pk, is_authenticated=True), self.job["id"])
+            self.assertEqual((await communicator.receive_output(1))["type"], "websocket.accept")
+            message = json.loads((await communicator.receive_output(1))["text"])
+            self.assertEqual(message.get("type", message.get("error")), expected)
+            await communicator.send_input({"type": "websocket.disconnect", "code": 1000})
+            await communicator.wait(1)
+
+
+def _option(start, length=12, days="1000000", weeks="1", penalty=0):
+    return {"optional_time_bits": (weeks, days, start, length), "penalty": penalty}
+
+
+def _trainer(classes, rooms=(), soft=(), nrWeeks=1):
+    """CGCS trainer 作为不依赖 torch 的小环境；classes: cid -> ({教室: 惩罚}, 时间选项)，没有教室时不需要教室"""
+    from types import SimpleNamespace
+    from MARL.src import interface  # noqa: F401
+    from MARL.CGCS.train import trainer
+    reader = SimpleNamespace(
+        classes={
+            cid: {"id": cid, "limit": 10, "parent": None, "room_required": bool(room_options),
+                  "room_options": [{"id": rid, "penalty": p} for rid, p in room_options.items()], "time_options": times}
+            for cid, (room_options, times) in classes.items()
+        },
+        rooms={rid: {"id": rid, "capacity": 10, "unavailables_bits": [], "ocupied": []} for rid in rooms},
+        distributions={"hard_constraints": [], "soft_constraints": list(soft)},
+        travel={}, nrDays=7, nrWeeks=nrWeeks, optimization={"time": 1, "room": 1, "distribution": 1, "student": 0},
+    )
+    return trainer(reader)
+
+
+def _action(env, cid, room, time):
+    agent = env.agents[env.cid2ind[cid]]
+    return next(action for action in agent.action_space if action[:2] == (room, time))
+
+
+def _state(env):
+    import copy
+    return copy.deepcopy(env.rooms), [(agent.action, agent.penalty) for agent in env.agents]
+
+
+def _penalties(env):
+    """全量统计的时间 / 教室惩罚"""
+    time_penalty = room_penalty = 0
+    for agent in env.agents:
+        if agent.action is not None:
+            time_penalty += agent.time_options[agent.action[1]]['penalty']
+            if agent.room_required:
+                room_penalty += agent.room_options[agent.action[0]]['penalty']
+    return time_penalty, room_penalty
+
+
+class LocalSearchTest(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch("MARL.CGCS.train.tqdm", side_effect=lambda iterable, **kwargs: iterable)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # 贪心先排 3（时间 0），1 为避开与 3 的 DifferentTime 排到时间 12（时间惩罚 1），2 只能去 r2
+        # 最优：3 移到 24、1 回到时间 0，总惩罚 0
+        self.env = _trainer({
+            "1": ({"r1": 0, "r2": 2}, [_option(0), _option(12, penalty=1)]),
+            "2": ({"r1": 0, "r2": 0}, [_option(0, penalty=3), _option(12)]),
+            "3": ({}, [_option(0), _option(24)]),
+        }, rooms=("r1", "r2"), soft=[{"type": "DifferentTime", "required": False, "penalty": 4, "classes": ["1", "3"]}])
+
+    def _search(self, iterations=300):
+        from MARL.utils.local_search import LocalSearch
+        return LocalSearch(self.env, {"local_search": {"iterations": iterations, "temperature": 0, "seed": 0}})
+
+    def test_accepts_improving_moves_after_cgcs_step(self):
+        search = self._search()
+        self.env.step(searches=[search])
+        self.assertEqual(self.env.not_assignment, [])
+        result = search.evaluate()
+        self.assertEqual(result["Total cost"], 0)
+        self.assertEqual(self.env.total_penalty()["penalty"], 0)
+        # 教室占用与课程动作一致
+        ocupied = sorted((cid, rid) for rid, room in self.env.rooms.items() for cid, _, _ in room["ocupied"])
+        expected = sorted((a.id, a.room_options[a.action[0]]["id"]) for a in self.env.agents if a.action[0] != -1)
+        self.assertEqual(ocupied, expected)
+
+    def test_run_reports_improvement(self):
+        self.env.step()
+        result = self._search().run()
+        self.assertEqual(result["local search before"], 1)
+        self.assertEqual(result["Total cost"], 0)
+        self.assertGreaterEqual(result["local search improved"], 1)
+
+    def test_rejected_moves_restore_state(self):
+        from MARL.utils.journal import Journal
+        self.env.step()
+        search = self._search()
+        search.journal = Journal(self.env)
+        search._prepare()
+        search._t = 0
+        before = _state(self.env)
+        counters = (search.journal.time_penalty, search.journal.room_penalty)
+        # 变差的 move 被拒绝；与 1 在 r1 冲突的 move 不可行
+        self.assertIsNone(search._try([("2", _action(self.env, "2", 0, 0))]))
+        self.assertIsNone(search._try([("2", _action(self.env, "2", 0, 1))]))
+        self.assertEqual(_state(self.env), before)
+        self.assertEqual((search.journal.time_penalty, search.journal.room_penalty), counters)
+
+
+class JournalTest(SimpleTestCase):
+    def setUp(self):
+        # a、b、c 依次排在 r1 的时间 0、12、24
+        self.env = _trainer({
+            cid: ({"r1": 0, "r2": 1}, [_option(start), _option(36, penalty=2)])
+            for cid, start in (("a", 0), ("b", 12), ("c", 24))
+        }, rooms=("r1", "r2"))
+        for cid in "abc":
+            self.env.apply_action(cid, _action(self.env, cid, 0, 0))
+
+    def _moves(self, journal):
+        journal.unassign("b")
+        journal.assign("a", _action(self.env, "a", 1, 1))
+        journal.assign("b", _action(self.env, "b", 1, 0))
+        journal.assign("c", _action(self.env, "c", 0, 1))
+
+    def test_rollback_restores_state_and_counters(self):
+        from MARL.utils.journal import Journal
+        journal = Journal(self.env)
+        before, counters = _state(self.env), (journal.time_penalty, journal.room_penalty)
+        self._moves(journal)
+        self.assertEqual((journal.time_penalty, journal.room_penalty), _penalties(self.env))
+        journal.rollback()
+        # ocupied 中的位置也恢复
+        self.assertEqual([entry[0] for entry in self.env.rooms["r1"]["ocupied"]], ["a", "b", "c"])
+        self.assertEqual(_state(self.env), before)
+        self.assertEqual((journal.time_penalty, journal.room_penalty), counters)
+
+    def test_mark_and_commit(self):
+        from MARL.utils.journal import Journal
+        journal = Journal(self.env)
+        self._moves(journal)
+        journal.commit()
+        committed = _state(self.env)
+        marker = journal.mark()
+        journal.assign("a", _action(self.env, "a", 0, 0))
+        journal.rollback(marker)
+        self.assertEqual(_state(self.env), committed)
+        # 提交的改动不再回滚
+        journal.rollback()
+        self.assertEqual(_state(self.env), committed)
+        self.assertEqual((journal.time_penalty, journal.room_penalty), _penalties(self.env))
+
+    def test_evaluate_reads_counters(self):
+        from MARL.utils.journal import Journal
+        from MARL.utils.local_search import LocalSearch
+        search = LocalSearch(self.env)
+        journal = Journal(self.env)
+        self._moves(journal)
+        with mock.patch.object(self.env, "agents", wraps=self.env.agents) as agents:
+            counted = search.evaluate()
+            agents.__iter__.assert_not_called()
+        journal.close()
+        self.assertEqual(counted, search.evaluate())
+        self.assertEqual((counted["Time penalty"], counted["Room penalty"]), (4, 2))
+
+
+class LNSTimeRelationTest(SimpleTestCase):
+    """按 (天, 时段块) 分桶得到的时间关系与两两比较全部课程的结果相同"""
+    def _overlap(self, env):
+        times = {
+            agent.id: agent.time_options[agent.action[1]]["optional_time_bits"]
+            for agent in env.agents if agent.action is not None
+        }
+        related = {}
+        for cid, (weeks, days, start, length) in times.items():
+            related[cid] = {
+                other for other, (weeks2, days2, start2, length2) in times.items()
+                if int(weeks, 2) & int(weeks2, 2) and int(days, 2) & int(days2, 2)
+                and start < start2 + length2 and start2 < start + length
+            }
+        return related
+
+    def test_buckets_match_pairwise_overlap(self):
+        import random
+        from MARL.utils.journal import Journal
+        from MARL.utils.lns import LNS
+        rng = random.Random(0)
+
+        def option():
+            days = format(rng.randrange(1, 1 << 7), "07b")
+            # 长度可以跨越多个时段块
+            return _option(rng.randrange(0, 120), rng.randrange(1, 40), days, rng.choice(["10", "01", "11"]))
+
+        env = _trainer({str(cid): ({}, [option() for _ in range(3)]) for cid in range(40)}, nrWeeks=2)
+        for agent in env.agents[:-5]:
+            env.apply_action(agent.id, rng.choice(agent.action_space))
+        lns = LNS(env, {"lns": {"relations": ["time"], "seed": 0}})
+        lns._prepare()
+        for _ in range(2):
+            expected = self._overlap(env)
+            for cid in expected:
+                self.assertEqual(set(lns._relatives(cid, "time")), expected[cid], cid)
+            # 移动一部分课程后分桶随之更新
+            journal = Journal(env)
+            for agent in rng.sample(env.agents, 10):
+                journal.assign(agent.id, rng.choice(agent.action_space))
+                lns._index(agent.id)
+            journal.close()
+
+
+class EvaluatorTest(SimpleTestCase):
+    """本地 ITC2019 评估器：手工构造的小实例，各规则的违反数与加权总分"""
+    def _evaluate(self, placed, hard=(), soft=(), students=None, nrWeeks=1, optimization=None):
+        """placed: cid -> (weeks, days, start, length, 教室或 None, 时间惩罚)；教室 r1 惩罚 1、r2 惩罚 0"""
+        from types import SimpleNamespace
+        from MARL.src import interface  # noqa: F401
+        from evaluator import Evaluator
+        rooms = [{"id": "r1", "penalty": 1}, {"id": "r2", "penalty": 0}]
+        reader = SimpleNamespace(
+            problem_name="tiny", nrWeeks=nrWeeks, nrDays=5,
+            optimization=optimization or {"time": 1, "room": 1, "distribution": 1, "student": 1},
+            classes={
+                cid: {"room_required": room is not None, "room_options": rooms if room is not None else [],
+                      "time_options": [{"optional_time_bits": (weeks, days, start, length), "penalty": penalty}]}
+                for cid, (weeks, days, start, length, room, penalty) in placed.items()
+            },
+            # r1 在第一天的 0~3 不可用
+            rooms={"r1": {"unavailables_bits": [("1" * nrWeeks, "10000", 0, 3)]}, "r2": {"unavailables_bits": []}},
+            travel={"r1": {"r2": 5}, "r2": {"r1": 5}},
+            distributions={"hard_constraints": list(hard), "soft_constraints": list(soft)},
+        )
+        students = students or {}
+        solution = {
+            cid: ((weeks, days, start, length), room, [sid for sid, cids in students.items() if cid in cids])
+            for cid, (weeks, days, start, length, room, _) in placed.items()
+        }
+        return Evaluator(reader).evaluate(solution)
+
+    def _cons(self, ctype, classes, penalty=1, required=False):
+        return {"type": ctype, "classes": classes, "penalty": None if required else penalty, "required": required}
+
+    def test_weighted_total(self):
+        result = self._evaluate(
+            {"1": ("1", "10000", 3, 10, "r1", 2), "2": ("1", "10000", 5, 10, "r2", 3)},
+            soft=[self._cons("DifferentDays", ["1", "2"], penalty=4)],
+            students={"s": ["1", "2"]},
+            optimization={"time": 2, "room": 3, "distribution": 5, "student": 7},
+        )
+        self.assertEqual(result["valid"], "valid")
+        self.assertEqual((result["Time penalty"], result["Room penalty"]), (5, 1))
+        self.assertEqual((result["Distribution penalty"], result["Student conflicts"]), (4, 1))
+        self.assertEqual(result["Total cost"], 2 * 5 + 3 * 1 + 5 * 4 + 7 * 1)
+
+    def test_pairwise(self):
+        placed = {
+            "1": ("1", "10000", 0, 12, None, 0),
+            "2": ("1", "10000", 0, 6, None, 0), # 在 1 的时间内
+            "3": ("1", "01000", 6, 12, None, 0),
+        }
+        # SameTime：(1, 3)、(2, 3) 违反；DifferentDays：(1, 2) 违反
+        result = self._evaluate(placed, soft=[
+            self._cons("SameTime", ["1", "2", "3"], penalty=2), self._cons("DifferentDays", ["1", "2", "3"], penalty=3),
+        ])
+        self.assertEqual(result["Distribution penalty"], 2 * 2 + 3 * 1)
+        result = self._evaluate(placed, hard=[
+            self._cons("SameTime", ["1", "2"], required=True), self._cons("DifferentDays", ["1", "2"], required=True),
+        ])
+        self.assertEqual(result["Hard violations"]["distributions"], ["DifferentDays"])
+        self.assertEqual(result["valid"], "invalid")
+
+    def test_max_day_load(self):
+        # 第一周第一天 10 + 8 = 18，超出 6；第二周 10，不超出；按周数平均
+        result = self._evaluate({
+            "1": ("11", "10000", 0, 10, None, 0), "2": ("10", "10000", 20, 8, None, 0),
+        }, soft=[self._cons("MaxDayLoad(12)", ["1", "2"])], nrWeeks=2)
+        self.assertEqual(result["Distribution penalty"], 6 // 2)
+
+    def test_max_breaks(self):
+        # 间隔 1 ≤ 2 的两门课属于同一块，间隔 10 形成第二块：1 个休息，超出 R=0
+        result = self._evaluate({
+            "1": ("1", "10000", 0, 10, None, 0), "2": ("1", "10000", 11, 9, None, 0), "3": ("1", "10000", 30, 10, None, 0),
+        }, soft=[self._cons("MaxBreaks(0,2)", ["1", "2", "3"])])
+        self.assertEqual(result["Distribution penalty"], 1)
+
+    def test_max_block(self):
+        # 第一天 0~25 的块有两门课、长度超过 20；第二天只有一门课，不计
+        result = self._evaluate({
+            "1": ("1", "10000", 0, 10, None, 0), "2": ("1", "10000", 11, 14, None, 0), "3": ("1", "01000", 0, 30, None, 0),
+        }, soft=[self._cons("MaxBlock(20,2)", ["1", "2", "3"])])
+        self.assertEqual(result["Distribution penalty"], 1)
+
+    def test_room_conflict_and_unavailable(self):
+        result = self._evaluate({
+            "1": ("1", "10000", 0, 12, "r1", 0), # 与 r1 的不可用时间重叠
+            "2": ("1", "10000", 6, 12, "r1", 0), # 与 1 冲突
+            "3": ("1", "10000", 0, 12, "r2", 0),
+        })
+        violations = result["Hard violations"]
+        self.assertEqual((violations["room conflicts"], violations["room unavailable"]), (1, 1))
+        self.assertEqual(result["valid"], "invalid")
+
+    def test_student_conflicts_with_travel(self):
+        # s1：1 在 10 结束，去 r2 需要 5，赶不上 12 开始的 2；s2 的两门课不在同一天
+        result = self._evaluate({
+            "1": ("1", "10000", 3, 7, "r1", 0), "2": ("1", "10000", 12, 8, "r2", 0), "3": ("1", "01000", 0, 10, "r2", 0),
+        }, students={"s1": ["1", "2"], "s2": ["1", "3"]})
+        self.assertEqual(result["Student conflicts"], 1)
+        self.assertEqual(result["valid"], "valid")
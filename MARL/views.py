@@ -1,10 +1,69 @@
-from django.shortcuts import render
-from django.http import JsonResponse
-from .src.interface import start_training_thread
+from django.conf import settings
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .serializers import TrainingRequestSerializer
+from .src.interface import web_config
+from .src.jobs import get_manager, JobQueueFull
 
-def start_training(request):
-    start_training_thread()
-    return JsonResponse({"status": "started"})
+
+def _own_job(request, job_id):
+    """当前用户提交的任务；不存在或属于其他用户时返回 None"""
+    job = get_manager().status(job_id)
+    if job is None or job["owner"] != request.user.pk:
+        return None
+    return job
+
+
+def _not_found():
+    return Response({"error": "job not found"}, status=status.HTTP_404_NOT_FOUND)
+
+
+class StartTrainingView(APIView):
+    def post(self, request):
+        # 请求体可选：{"method": "PMAPPO", "file": "x.xml", "time_budget": 30}
+        # 任务总是限时（默认 SOLVER_MAX_TIME_BUDGET），期间用 jobs/<id>/best/ 取目前最好的解
+        serializer = TrainingRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({"error": serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            config = web_config(max_time_budget=getattr(settings, "SOLVER_MAX_TIME_BUDGET", 600), **serializer.validated_data)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            job = get_manager().submit(config, owner=request.user.pk)
+        except JobQueueFull as e:
+            return Response({"error": str(e)}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+        return Response({"status": "started", "job": job}, status=status.HTTP_202_ACCEPTED)
+
+
+class JobListView(APIView):
+    def get(self, request):
+        return Response({"jobs": get_manager().list(owner=request.user.pk)})
+
+
+class JobStatusView(APIView):
+    def get(self, request, job_id):
+        job = _own_job(request, job_id)
+        if job is None:
+            return _not_found()
+        return Response(job)
+
+
+class JobBestView(APIView):
+    def get(self, request, job_id):
+        if _own_job(request, job_id) is None:
+            return _not_found()
+        job, best = get_manager().best_solution(job_id)
+        # 还没有可行解时 best 为 null
+        return Response({"job": job_id, "status": job["status"], "best": best})
+
+
+class JobCancelView(APIView):
+    def post(self, request, job_id):
+        if _own_job(request, job_id) is None:
+            return _not_found()
+        return Response(get_manager().cancel(job_id))
 
 # def ui(request):
-#     return render(request, 'backend/MARL/test.html')
\ No newline at end of file
+#     return render(request, 'backend/MARL/test.html')
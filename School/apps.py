@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class SchoolConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "School"
+
+    def ready(self):
+        from .signals import connect
+        connect()
@@ -0,0 +1,106 @@
+"""
+批量导入：一次事务内按批 bulk_create，嵌套的时间段与关联表同样批量插入。
+bulk_create 不触发信号，写入后显式使该用户的求解实例与空闲教室索引缓存失效。
+调用方传入已通过 *BulkSerializer(many=True) 校验的 validated_data，
+引用的教师 / 教室 / 课程 ID 在这里各用一条查询校验归属。
+"""
+from django.db import transaction
+from rest_framework import serializers
+from .models import *
+from .instance import invalidate_instance
+from .occupancy import invalidate_occupancy
+
+BULK_BATCH_SIZE = 1000
+
+
+def _check_refs(items, key, existing, label):
+    # 收集所有引用不到的 ID，按条目下标返回，便于前端定位
+    errors = {}
+    for i, item in enumerate(items):
+        refs = item.get(key, [])
+        refs = refs if isinstance(refs, list) else [refs]
+        missing = [ref for ref in refs if ref not in existing]
+        if missing:
+            errors[i] = {key: [f"{label}不存在: {missing}"]}
+    if errors:
+        raise serializers.ValidationError(errors)
+
+
+def _lesson_ids(user, items):
+    ids = {ref for item in items for ref in item.get('lessons', [])}
+    return set(Lesson.objects.filter(staff__user=user, id__in=ids).values_list('id', flat=True))
+
+
+@transaction.atomic
+def bulk_create_rooms(user, items):
+    rooms = Room.objects.bulk_create([
+        Room(user=user, name=item['name'], description=item.get('description'),
+             capacity=item.get('capacity'), note=item.get('note'))
+        for item in items
+    ], batch_size=BULK_BATCH_SIZE)
+    TimeSlot_Room.objects.bulk_create([
+        TimeSlot_Room(room=room, **slot)
+        for room, item in zip(rooms, items) for slot in item.get('unavailable', [])
+    ], batch_size=BULK_BATCH_SIZE)
+    Travel.objects.bulk_create([
+        Travel(fromRoom=room, **travel)
+        for room, item in zip(rooms, items) for travel in item.get('travels', [])
+    ], batch_size=BULK_BATCH_SIZE)
+    invalidate_instance(user.pk)
+    invalidate_occupancy(user.pk)
+    return [room.id for room in rooms]
+
+
+@transaction.atomic
+def bulk_create_lessons(user, items):
+    staffs = {staff.index: staff for staff in Staff.objects.filter(user=user, index__in={item['staff_id'] for item in items})}
+    _check_refs(items, 'staff_id', staffs, "教师")
+    room_ids = {ref for item in items for ref in item.get('rooms', [])}
+    _check_refs(items, 'rooms', set(Room.objects.filter(user=user, id__in=room_ids).values_list('id', flat=True)), "教室")
+    lessons = Lesson.objects.bulk_create([
+        Lesson(staff=staffs[item['staff_id']], name=item['name'],
+               description=item.get('description'), note=item.get('note'),
+               limit=item.get('limit'), room_required=item.get('room_required'))
+        for item in items
+    ], batch_size=BULK_BATCH_SIZE)
+    TimeSlot_Lesson.objects.bulk_create([
+        TimeSlot_Lesson(lesson=lesson, **slot)
+        for lesson, item in zip(lessons, items) for slot in item.get('timeslots', [])
+    ], batch_size=BULK_BATCH_SIZE)
+    Lesson_opt_Room.objects.bulk_create([
+        Lesson_opt_Room(lesson=lesson, room_id=room_id)
+        for lesson, item in zip(lessons, items) for room_id in item.get('rooms', [])
+    ], batch_size=BULK_BATCH_SIZE)
+    invalidate_instance(user.pk)
+    return [lesson.id for lesson in lessons]
+
+
+@transaction.atomic
+def bulk_create_students(user, items):
+    _check_refs(items, 'lessons', _lesson_ids(user, items), "课程")
+    students = Student.objects.bulk_create([
+        Student(user=user, name=item['name'], description=item.get('description'), note=item.get('note'))
+        for item in items
+    ], batch_size=BULK_BATCH_SIZE)
+    Student_opt_Lesson.objects.bulk_create([
+        Student_opt_Lesson(student=student, lesson_id=lesson_id)
+        for student, item in zip(students, items) for lesson_id in item.get('lessons', [])
+    ], batch_size=BULK_BATCH_SIZE)
+    invalidate_instance(user.pk)
+    return [student.id for student in students]
+
+
+@transaction.atomic
+def bulk_create_distributions(user, items):
+    _check_refs(items, 'lessons', _lesson_ids(user, items), "课程")
+    distributions = Distribution.objects.bulk_create([
+        Distribution(type=item['type'], required=item.get('required', False), penalty=item.get('penalty'),
+                     description=item.get('description'), note=item.get('note'))
+        for item in items
+    ], batch_size=BULK_BATCH_SIZE)
+    Distribution_constraints_Lesson.objects.bulk_create([
+        Distribution_constraints_Lesson(distribution=distribution, lesson_id=lesson_id)
+        for distribution, item in zip(distributions, items) for lesson_id in item.get('lessons', [])
+    ], batch_size=BULK_BATCH_SIZE)
+    invalidate_instance(user.pk)
+    return [distribution.id for distribution in distributions]
@@ -0,0 +1,120 @@
+import threading
+import uuid
+from django.db import transaction
+from .models import CacheVersion
+
+_local = threading.local()
+
+
+class GenerationCache:
+    """
+    进程内缓存：每个 key 记录失效次数，构建期间发生失效时构建结果不写入缓存，
+    避免旧数据覆盖新写入。构建在锁外进行，同一 key 可能被并发构建，结果相同。
+
+    多个 web 进程各有一份缓存：条目还记录构建时所依赖范围（scopes(key)）的共享版本（CacheVersion），
+    get 时版本不一致说明其他进程写过，重新构建。invalidate 立即丢弃本进程的条目，
+    共享版本在事务提交后更新（同一事务内同一范围只更新一次）。
+    """
+    def __init__(self, name, scopes):
+        self.name = name
+        self.scopes = scopes # key -> 条目依赖的范围，不含缓存名前缀
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.generation = {}
+        self.versions = {} # key -> {范围: 构建时的 token}
+
+    def _scopes(self, key):
+        return [self.name] + [f"{self.name}:{scope}" for scope in self.scopes(key)]
+
+    def get(self, key, build):
+        versions = _versions(self._scopes(key))
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None and self.versions.get(key) != versions:
+                self.drop(key)
+                value = None
+            generation = self.generation.setdefault(key, 0)
+        if value is None:
+            value = build()
+            with self.lock:
+                if self.generation[key] == generation:
+                    self.entries[key] = value
+                    self.versions[key] = versions
+        return value
+
+    def drop(self, key):
+        """调用方需持有 lock"""
+        self.entries.pop(key, None)
+        self.versions.pop(key, None)
+        self.generation[key] = self.generation.get(key, 0) + 1
+
+    def invalidate(self, match=None, scope=None):
+        """
+        match(key) 为真的条目失效，match 为 None 时全部失效；
+        scope 为其他进程中要失效的范围（与 scopes(key) 的元素对应），None 表示整个缓存
+        """
+        with self.lock:
+            for key in list(self.generation):
+                if match is None or match(key):
+                    self.drop(key)
+        _on_commit(self._scope(scope))
+
+    def updated(self, keys, scope):
+        """本进程已就地更新 keys 的条目（调用时不要持有 lock）：其他进程按 scope 失效，本进程的条目保留"""
+        with self.lock:
+            kept = [(self, key, self.entries[key]) for key in keys if key in self.entries]
+        _on_commit(self._scope(scope), kept)
+
+    def _scope(self, scope):
+        return self.name if scope is None else f"{self.name}:{scope}"
+
+    def _relabel(self, key, value, old, new):
+        # 条目仍是就地更新过的那一份、且构建后没有其他进程写入时，换成新版本继续使用
+        with self.lock:
+            versions = self.versions.get(key)
+            if self.entries.get(key) is not value or versions is None:
+                return
+            for scope, token in new.items():
+                if scope in versions and versions[scope] == old[scope]:
+                    versions[scope] = token
+
+
+def _versions(scopes):
+    found = dict(CacheVersion.objects.filter(scope__in=scopes).values_list('scope', 'token'))
+    return {scope: found.get(scope) for scope in scopes}
+
+
+def _publish(scopes, kept=()):
+    new = {scope: uuid.uuid4().hex for scope in scopes}
+    with transaction.atomic():
+        old = _versions(list(new))
+        CacheVersion.objects.bulk_create(
+            [CacheVersion(scope=scope, token=token) for scope, token in new.items()],
+            update_conflicts=True, unique_fields=['scope'], update_fields=['token'],
+        )
+    for cache, key, value in kept:
+        cache._relabel(key, value, old, new)
+
+
+class _Pending:
+    """当前事务提交后要更新的范围和要保留的条目"""
+    def __init__(self):
+        self.scopes = set()
+        self.kept = []
+
+    def __call__(self):
+        _publish(sorted(self.scopes), self.kept)
+
+
+def _on_commit(scope, kept=()):
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        _publish([scope], kept)
+        return
+    pending = getattr(_local, 'pending', None)
+    # 事务回滚后回调被丢弃，需要重新登记
+    if pending is None or not any(entry[1] is pending for entry in connection.run_on_commit):
+        pending = _local.pending = _Pending()
+        transaction.on_commit(pending)
+    pending.scopes.add(scope)
+    pending.kept.extend(kept)
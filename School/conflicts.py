@@ -0,0 +1,164 @@
+"""
+交互式调课的冲突检查：在课表当前结果上试放一门课 (lesson, room, timeslot)，
+返回教室冲突、教室不可用、违反的硬约束以及惩罚变化。
+约束判定直接复用求解环境的 HardConstraints / SoftConstraints（candidate 对比其他课程的 action），
+检查器为每门课预先建好相关约束的索引和每间教室的占用表，一次检查只看与这门课有关的约束。
+
+检查器按 (用户, 课表) 缓存在进程内；求解实例重建或课表结果写入后重新构建。
+"""
+import threading
+import time
+from collections import defaultdict
+from MARL.src.utils.constraints import HardConstraints, SoftConstraints
+from .models import *
+from .cache import GenerationCache
+from .instance import get_instance
+
+_cache = GenerationCache("conflicts", lambda key: [f"timetable:{key[1]}"]) # (user_id, timetable_id) -> ConflictChecker
+
+
+class _Class:
+    """约束函数用到的 agent 属性；action / candidate 为 (room 下标或 -1, time 下标, 惩罚)"""
+    def __init__(self, info, optimization):
+        self.id = info["id"]
+        self.room_required = info["room_required"]
+        self.room_options = info["room_options"]
+        self.time_options = info["time_options"]
+        self.room_index = {option["id"]: i for i, option in enumerate(self.room_options)}
+        self.time_index = {option["id"]: j for j, option in enumerate(self.time_options)}
+        self.optimization = optimization
+        self.action = None
+        self.candidate = None
+
+    def make_action(self, room_id, timeslot_id):
+        """把 (room_id, timeslot_id) 转成动作，不是该课程的可选项时抛 ValueError"""
+        if timeslot_id not in self.time_index:
+            raise ValueError(f"时间段 {timeslot_id} 不是课程 {self.id} 的可选时间")
+        j = self.time_index[timeslot_id]
+        penalty = self.time_options[j]["penalty"] * self.optimization["time"]
+        if not self.room_required:
+            if room_id is not None:
+                raise ValueError(f"课程 {self.id} 不需要教室")
+            return (-1, j, penalty)
+        if str(room_id) not in self.room_index:
+            raise ValueError(f"教室 {room_id} 不是课程 {self.id} 的可选教室")
+        i = self.room_index[str(room_id)]
+        return (i, j, penalty + self.room_options[i]["penalty"] * self.optimization["room"])
+
+
+class ConflictChecker:
+    def __init__(self, instance, placements):
+        """placements: lesson_id -> (room_id or None, timeslot_id)，即课表当前结果"""
+        self.instance = instance
+        self.optimization = instance.optimization
+        self.classes = []
+        self.cid2ind = {}
+        for i, (cid, info) in enumerate(instance.classes.items()):
+            self.classes.append(_Class(info, self.optimization))
+            self.cid2ind[cid] = i
+        self.hard = HardConstraints()
+        self.soft = SoftConstraints()
+        for validator in (self.hard, self.soft):
+            validator.setTravel(instance.travel)
+            validator.sefnrDays(instance.nrDays)
+            validator.sefnrWeeks(instance.nrWeeks)
+            validator.setCid2ind(self.cid2ind)
+            validator.setClasses(self.classes)
+        # 每门课相关的约束
+        self.hard_by_class = defaultdict(list)
+        self.soft_by_class = defaultdict(list)
+        for key, index in (("hard_constraints", self.hard_by_class), ("soft_constraints", self.soft_by_class)):
+            for cons in instance.distributions[key]:
+                for cid in cons["classes"]:
+                    index[cid].append(cons)
+        # 每间教室的占用 [(cid, time bits, action)]，与环境中 rooms[...]['ocupied'] 相同
+        self.occupants = defaultdict(list)
+        for lesson_id, (room_id, timeslot_id) in placements.items():
+            cls = self.classes[self.cid2ind[str(lesson_id)]] if str(lesson_id) in self.cid2ind else None
+            if cls is None:
+                continue
+            try:
+                cls.action = cls.make_action(room_id, timeslot_id)
+            except ValueError:
+                continue # 结果与当前资源不一致（选项已被删除），按未排处理
+            if cls.action[0] != -1:
+                bits = cls.time_options[cls.action[1]]["optional_time_bits"]
+                self.occupants[str(room_id)].append((cls.id, bits, cls.action))
+        self.lock = threading.Lock()
+
+    def _penalty(self, cid, action):
+        """课程按 action 放置时与其相关的惩罚：时间 / 教室惩罚 + 软约束惩罚（已乘权重）"""
+        cls = self.classes[self.cid2ind[cid]]
+        cls.candidate = action
+        soft = []
+        distribution = 0
+        for cons in self.soft_by_class[cid]:
+            rate = self.soft._violation_rate(cons, cid)
+            if rate:
+                soft.append({"type": cons["type"], "classes": [int(c) for c in cons["classes"]], "penalty": rate * cons["penalty"]})
+                distribution += rate * cons["penalty"]
+        return action[2] + distribution * self.optimization["distribution"], soft
+
+    def check(self, lesson_id, room_id, timeslot_id):
+        started = time.perf_counter()
+        cid = str(lesson_id)
+        if cid not in self.cid2ind:
+            raise ValueError(f"课程 {lesson_id} 不存在")
+        cls = self.classes[self.cid2ind[cid]]
+        candidate = cls.make_action(room_id, timeslot_id)
+        with self.lock:
+            try:
+                cls.candidate = candidate
+                room_conflicts = []
+                room_unavailable = False
+                if candidate[0] != -1:
+                    room = str(room_id)
+                    room_conflicts = [
+                        int(other) for other, bits, action in self.occupants[room]
+                        if other != cid and self.hard.RoomConflicts(cid, [(other, bits, action)])
+                    ]
+                    room_unavailable = self.hard.RoomUnavailable(cid, self.instance.rooms[room]["unavailables_bits"])
+                hard = [
+                    {"type": cons["type"], "classes": [int(c) for c in cons["classes"]]}
+                    for cons in self.hard_by_class[cid] if self.hard._violation_rate(cons, cid)
+                ]
+                after, soft = self._penalty(cid, candidate)
+                before = self._penalty(cid, cls.action)[0] if cls.action is not None else 0
+            finally:
+                cls.candidate = None
+        return {
+            "feasible": not (room_conflicts or room_unavailable or hard),
+            "room_conflicts": room_conflicts,
+            "room_unavailable": room_unavailable,
+            "hard_violations": hard,
+            "soft_violations": soft,
+            "penalty": {"before": before, "after": after},
+            "penalty_delta": after - before,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+
+
+def build_checker(user, timetable_id, instance):
+    placements = {
+        lesson_id: (room_id, timeslot_id) for lesson_id, room_id, timeslot_id in
+        Assignment.objects.filter(timetable_id=timetable_id).values_list('lesson_id', 'room_id', 'timeSlot_id')
+    }
+    return ConflictChecker(instance, placements)
+
+
+def get_checker(user, timetable_id):
+    instance = get_instance(user)
+    key = (user.pk, timetable_id)
+    checker = _cache.get(key, lambda: build_checker(user, timetable_id, instance))
+    if checker.instance is not instance:
+        # 资源有写入，求解实例已重建
+        _cache.invalidate(lambda k: k == key)
+        checker = _cache.get(key, lambda: build_checker(user, timetable_id, instance))
+    return checker
+
+
+def invalidate_conflicts(timetable_id=None):
+    if timetable_id is None:
+        _cache.invalidate()
+    else:
+        _cache.invalidate(lambda key: key[1] == timetable_id, f"timetable:{timetable_id}")
@@ -0,0 +1,129 @@
+"""
+从 School 模型直接构造求解实例，结构与 MARL/src/dataReader.py 的 PSTTReader 一致
+（rooms / classes / distributions / students / travel / optimization 等），
+环境可以直接使用，省去导出 XML 再解析的过程。
+教室、课程（class）、学生都以数据库主键的字符串作为 id，求解结果可直接写回数据库。
+
+每个用户的实例缓存在进程内，School 数据有写入时失效（见 signals.py），其他进程的写入按共享版本发现（见 cache.py）。
+"""
+import pathlib
+from collections import defaultdict
+from .models import *
+from .cache import GenerationCache
+
+DEFAULT_OPTIMIZATION = {"time": 1, "room": 1, "distribution": 1, "student": 1}
+DEFAULT_SLOTS_PER_DAY = 288
+
+_cache = GenerationCache("instance", lambda user_id: [f"user:{user_id}"])
+
+
+class SchoolInstance:
+    """与 PSTTReader 同名属性的只读实例"""
+    def __init__(self, name):
+        self.problem_name = name
+        self.path = pathlib.Path(f"{name}.xml")
+        self.nrDays = 0
+        self.nrWeeks = 0
+        self.slotsPerDay = DEFAULT_SLOTS_PER_DAY
+        self.optimization = dict(DEFAULT_OPTIMIZATION)
+        self.rooms = {}
+        self.rid_to_idx = {}
+        self.travel = {}
+        self.courses = {}
+        self.classes = {}
+        self.cid_to_idx = {}
+        self.students = {}
+        self.sid_to_idx = {}
+        self.distributions = {"hard_constraints": [], "soft_constraints": []}
+
+
+def build_instance(user):
+    """约十条集合查询读出用户的全部资源，不做逐行查询"""
+    instance = SchoolInstance(f"{user.username}-school")
+
+    # ---------- 教室 ----------
+    room_rows = list(Room.objects.filter(user=user).order_by('id').values_list('id', 'capacity'))
+    for i, (rid, capacity) in enumerate(room_rows):
+        instance.rid_to_idx[rid] = i
+        instance.rooms[str(rid)] = {
+            "id": rid,
+            "capacity": capacity or 0,
+            "unavailables_bits": [],
+            "ocupied": [],
+        }
+    for rid, weeks, days, start, length in TimeSlot_Room.objects.filter(room__user=user).values_list(
+            'room_id', 'weeks', 'days', 'start', 'length'):
+        instance.rooms[str(rid)]["unavailables_bits"].append((weeks, days, start, length))
+        instance.nrWeeks = max(instance.nrWeeks, len(weeks))
+        instance.nrDays = max(instance.nrDays, len(days))
+    for src, dst, value in Travel.objects.filter(fromRoom__user=user).values_list('fromRoom_id', 'room', 'value'):
+        instance.travel.setdefault(str(src), {})[str(dst)] = value
+        instance.travel.setdefault(str(dst), {})[str(src)] = value
+
+    # ---------- 课程 ----------
+    lessons = Lesson.objects.filter(staff__user=user)
+    room_options = defaultdict(list)
+    for lid, rid, penalty in Lesson_opt_Room.objects.filter(lesson__in=lessons).values_list('lesson_id', 'room_id', 'penalty'):
+        room_options[lid].append({"id": str(rid), "penalty": penalty})
+    time_options = defaultdict(list)
+    for tid, lid, weeks, days, start, length, penalty in TimeSlot_Lesson.objects.filter(lesson__in=lessons).values_list(
+            'id', 'lesson_id', 'weeks', 'days', 'start', 'length', 'penalty'):
+        # id 为 TimeSlot_Lesson 主键，结果写回时直接使用（见 results.py）
+        time_options[lid].append({"id": tid, "optional_time_bits": (weeks, days, start, length), "penalty": penalty or 0})
+        instance.nrWeeks = max(instance.nrWeeks, len(weeks))
+        instance.nrDays = max(instance.nrDays, len(days))
+    for i, (lid, staff_id, limit, parent_id, room_required) in enumerate(lessons.order_by('id').values_list(
+            'id', 'staff_id', 'limit', 'parent_id', 'room_required')):
+        cid = str(lid)
+        options = sorted(time_options[lid], key=lambda x: x["penalty"])
+        instance.classes[cid] = {
+            "id": cid,
+            "limit": limit,
+            "parent": str(parent_id) if parent_id is not None else None,
+            # 手工创建的课程没有设置时按是否有候选教室判断
+            "room_required": bool(room_options[lid]) if room_required is None else room_required,
+            "room_options": room_options[lid],
+            "time_options": options,
+        }
+        instance.cid_to_idx[cid] = i
+        instance.courses[lid] = {"id": lid, "staff": staff_id, "configs": {}}
+
+    # ---------- 约束 ----------
+    links = defaultdict(list)
+    for did, lid in Distribution_constraints_Lesson.objects.filter(lesson__in=lessons).order_by('id').values_list(
+            'distribution_id', 'lesson_id'):
+        links[did].append(str(lid))
+    for did, dtype, required, penalty in Distribution.objects.filter(id__in=links.keys()).order_by('id').values_list(
+            'id', 'type', 'required', 'penalty'):
+        key = "hard_constraints" if required else "soft_constraints"
+        instance.distributions[key].append({
+            "type": dtype,
+            "required": required,
+            "penalty": penalty,
+            "classes": links[did],
+        })
+
+    # ---------- 学生 ----------
+    enrolled = defaultdict(list)
+    for sid, lid in Student_opt_Lesson.objects.filter(student__user=user).values_list('student_id', 'lesson_id'):
+        enrolled[sid].append(lid)
+    for i, sid in enumerate(Student.objects.filter(user=user).order_by('id').values_list('id', flat=True)):
+        instance.sid_to_idx[sid] = i
+        instance.students[sid] = {"id": sid, "courses": enrolled[sid]}
+
+    instance.nrDays = instance.nrDays or 7
+    instance.nrWeeks = instance.nrWeeks or 1
+    return instance
+
+
+def get_instance(user):
+    """返回缓存的实例，未命中时构建；实例只读，调用方不要修改"""
+    return _cache.get(user.pk, lambda: build_instance(user))
+
+
+def invalidate_instance(user_id=None):
+    """user_id 为 None 时清空全部缓存"""
+    if user_id is None:
+        _cache.invalidate()
+    else:
+        _cache.invalidate(lambda key: key == user_id, f"user:{user_id}")
@@ -0,0 +1,216 @@
+"""
+ITC2019 问题文件导入：iterparse 流式读取，处理完的元素立即从树上移除，
+各实体攒够一批后 bulk_create，父表先插入取得主键，再批量插入时间段与关联表。
+ITC2019 的 id 保存在 name 字段中（教室、课程班、学生），便于与求解结果对应。
+"""
+import time
+import xml.etree.ElementTree as ET
+from django.db import transaction
+from django.db.models import Max
+from .models import *
+from .bulk import BULK_BATCH_SIZE
+from .instance import invalidate_instance
+from .occupancy import invalidate_occupancy
+
+
+class ITC2019Importer:
+    # courses 段内的层级；学生下的 <course> 不属于这里
+    HIERARCHY = {("course", "courses"), ("config", "course"), ("subpart", "config")}
+
+    def __init__(self, user, batch_size=BULK_BATCH_SIZE):
+        self.user = user
+        self.batch_size = batch_size
+        self.counts = {}
+        self.staff = None
+        self.room_ids = {}    # ITC room id -> Room.id
+        self.class_ids = {}   # ITC class id -> Lesson.id
+        self.course_classes = {}  # ITC course id -> [ITC class id]
+        self.travels = []     # (ITC from room, ITC to room, value)，教室全部插入后再写
+        self.parents = []     # (ITC class id, ITC parent class id)，课程全部插入后再写
+        self.pending = {"rooms": [], "classes": [], "students": [], "distributions": []}
+
+    def _count(self, model, n):
+        self.counts[model.__name__] = self.counts.get(model.__name__, 0) + n
+
+    def _bulk(self, model, objs):
+        if objs:
+            objs = model.objects.bulk_create(objs, batch_size=self.batch_size)
+            self._count(model, len(objs))
+        return objs
+
+    # ---------- 按批写入 ----------
+    def _flush_rooms(self):
+        items, self.pending["rooms"] = self.pending["rooms"], []
+        rooms = self._bulk(Room, [Room(user=self.user, name=rid, capacity=capacity) for rid, capacity, _ in items])
+        slots = []
+        for room, (rid, _, unavailables) in zip(rooms, items):
+            self.room_ids[rid] = room.id
+            slots.extend(TimeSlot_Room(room=room, **slot) for slot in unavailables)
+        self._bulk(TimeSlot_Room, slots)
+
+    def _flush_classes(self):
+        items, self.pending["classes"] = self.pending["classes"], []
+        lessons = self._bulk(Lesson, [
+            Lesson(staff=self.staff, name=cid, description=path, **attrs)
+            for cid, path, attrs, _, _ in items
+        ])
+        slots, links = [], []
+        for lesson, (cid, _, _, times, rooms) in zip(lessons, items):
+            self.class_ids[cid] = lesson.id
+            slots.extend(TimeSlot_Lesson(lesson=lesson, **slot) for slot in times)
+            links.extend(Lesson_opt_Room(lesson=lesson, room_id=self.room_ids[rid], penalty=penalty) for rid, penalty in rooms)
+        self._bulk(TimeSlot_Lesson, slots)
+        self._bulk(Lesson_opt_Room, links)
+
+    def _flush_parents(self):
+        # 父课程班可能在后面的批次中，全部插入后统一更新
+        Lesson.objects.bulk_update([
+            Lesson(id=self.class_ids[cid], parent_id=self.class_ids[parent]) for cid, parent in self.parents
+        ], ['parent'], batch_size=self.batch_size)
+        self.parents = []
+
+    def _flush_students(self):
+        items, self.pending["students"] = self.pending["students"], []
+        students = self._bulk(Student, [Student(user=self.user, name=sid) for sid, _ in items])
+        self._bulk(Student_opt_Lesson, [
+            Student_opt_Lesson(student=student, lesson_id=self.class_ids[cid])
+            for student, (_, courses) in zip(students, items)
+            for course in courses for cid in self.course_classes.get(course, [])
+        ])
+
+    def _flush_distributions(self):
+        items, self.pending["distributions"] = self.pending["distributions"], []
+        distributions = self._bulk(Distribution, [
+            Distribution(type=dtype, required=required, penalty=penalty) for dtype, required, penalty, _ in items
+        ])
+        self._bulk(Distribution_constraints_Lesson, [
+            Distribution_constraints_Lesson(distribution=distribution, lesson_id=self.class_ids[cid])
+            for distribution, (_, _, _, classes) in zip(distributions, items) for cid in classes
+        ])
+
+    def _flush_travels(self):
+        self._bulk(Travel, [
+            Travel(fromRoom_id=self.room_ids[src], room=self.room_ids[dst], value=value)
+            for src, dst, value in self.travels
+        ])
+        self.travels = []
+
+    def _push(self, kind, item, flush):
+        self.pending[kind].append(item)
+        if len(self.pending[kind]) >= self.batch_size:
+            flush()
+
+    # ---------- 元素处理 ----------
+    @staticmethod
+    def _slot(node):
+        return {
+            "days": node.attrib["days"],
+            "weeks": node.attrib["weeks"],
+            "start": int(node.attrib["start"]),
+            "length": int(node.attrib["length"]),
+        }
+
+    def _on_problem(self, node):
+        # ITC2019 没有教师，所有课程挂在以实例名命名的占位教师下
+        index = (Staff.objects.filter(user=self.user).aggregate(m=Max('index'))['m'] or 0) + 1
+        self.staff = Staff.objects.create(
+            user=self.user, index=index, name=node.attrib.get("name", "ITC2019"), title="ITC2019",
+            description=f"nrDays={node.attrib.get('nrDays')} slotsPerDay={node.attrib.get('slotsPerDay')} nrWeeks={node.attrib.get('nrWeeks')}"
+        )
+        self._count(Staff, 1)
+
+    def _on_room(self, node):
+        rid = node.attrib["id"]
+        for travel in node.findall("travel"):
+            self.travels.append((rid, travel.attrib["room"], int(travel.attrib["value"])))
+        unavailables = [self._slot(u) for u in node.findall("unavailable")]
+        self._push("rooms", (rid, int(node.attrib.get("capacity", 0)), unavailables), self._flush_rooms)
+
+    def _on_class(self, node, path):
+        cid = node.attrib["id"]
+        self.course_classes.setdefault(path[0], []).append(cid)
+        times = [dict(self._slot(t), penalty=int(t.attrib.get("penalty", 0))) for t in node.findall("time")]
+        rooms = [(r.attrib["id"], int(r.attrib.get("penalty", 0))) for r in node.findall("room")]
+        attrs = {
+            "limit": int(node.attrib["limit"]) if "limit" in node.attrib else None,
+            "room_required": node.attrib.get("room", "true").lower() != "false",
+        }
+        if "parent" in node.attrib:
+            self.parents.append((cid, node.attrib["parent"]))
+        self._push("classes", (cid, "/".join(path), attrs, times, rooms), self._flush_classes)
+
+    def _on_distribution(self, node):
+        penalty = node.attrib.get("penalty")
+        self._push("distributions", (
+            node.attrib["type"],
+            node.attrib.get("required", "false").lower() == "true",
+            int(penalty) if penalty is not None else None,
+            [c.attrib["id"] for c in node.findall("class")],
+        ), self._flush_distributions)
+
+    def _on_student(self, node):
+        self._push("students", (node.attrib["id"], [c.attrib["id"] for c in node.findall("course")]), self._flush_students)
+
+    def _end_section(self, tag):
+        # 每个顶层段落结束时写完剩余批次，后续段落依赖其主键映射
+        if tag == "rooms":
+            self._flush_rooms()
+            self._flush_travels()
+        elif tag == "courses":
+            self._flush_classes()
+            self._flush_parents()
+        elif tag == "distributions":
+            self._flush_distributions()
+        elif tag == "students":
+            self._flush_students()
+
+    def run(self, source):
+        started = time.perf_counter()
+        stack = []
+        path = [] # 当前 course / config / subpart id
+        with transaction.atomic():
+            for event, node in ET.iterparse(source, events=("start", "end")):
+                tag = node.tag
+                if event == "start":
+                    parent = stack[-1].tag if stack else None
+                    stack.append(node)
+                    if tag == "problem":
+                        self._on_problem(node)
+                    elif (tag, parent) in self.HIERARCHY:
+                        path.append(node.attrib["id"])
+                    continue
+                stack.pop()
+                parent = stack[-1].tag if stack else None
+                if tag == "room" and parent == "rooms":
+                    self._on_room(node)
+                elif tag == "class" and parent == "subpart":
+                    self._on_class(node, path)
+                elif tag == "distribution":
+                    self._on_distribution(node)
+                elif tag == "student" and parent == "students":
+                    self._on_student(node)
+                elif (tag, parent) in self.HIERARCHY:
+                    path.pop()
+                elif tag in ("rooms", "courses", "distributions", "students"):
+                    self._end_section(tag)
+                else:
+                    continue
+                # 已处理的元素从父节点移除，内存占用与文件大小无关
+                if stack:
+                    stack[-1].remove(node)
+        invalidate_instance(self.user.pk)
+        invalidate_occupancy(self.user.pk)
+        seconds = time.perf_counter() - started
+        rows = sum(self.counts.values())
+        return {
+            "staff": self.staff.index if self.staff else None,
+            "rows": rows,
+            "counts": self.counts,
+            "seconds": round(seconds, 3),
+            "rows_per_second": round(rows / seconds) if seconds > 0 else rows,
+        }
+
+
+def import_itc2019(source, user, batch_size=BULK_BATCH_SIZE):
+    """source 为文件路径或文件对象"""
+    return ITC2019Importer(user, batch_size).run(source)
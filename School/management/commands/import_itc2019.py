@@ -0,0 +1,25 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from School.itc_import import import_itc2019
+from School.bulk import BULK_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "导入 ITC2019 问题文件到 School 模型（流式解析 + 批量写入）"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="ITC2019 问题 XML 文件")
+        parser.add_argument("--username", required=True, help="导入到该用户名下")
+        parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["username"])
+        except User.DoesNotExist:
+            raise CommandError(f"用户不存在: {options['username']}")
+        stats = import_itc2019(options["path"], user, options["batch_size"])
+        for model, n in stats["counts"].items():
+            self.stdout.write(f"{model}: {n}")
+        self.stdout.write(self.style.SUCCESS(
+            f"imported {stats['rows']} rows in {stats['seconds']}s ({stats['rows_per_second']} rows/s)"
+        ))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from School.models import Timetable, Staff
+from School.results import save_solution, from_solution_file
+from School.bulk import BULK_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "把 ITC2019 solution XML 写入课表的 Assignment 表（整体替换或只写差异）"
+
+    def add_arguments(self, parser):
+        parser.add_argument("timetable", type=int, help="课表 index")
+        parser.add_argument("path", help="solution XML 文件")
+        parser.add_argument("--staff", type=int, required=True, help="import_itc2019 创建的占位教师 index")
+        parser.add_argument("--diff", action="store_true", help="只写入与上一版结果不同的行")
+        parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            timetable = Timetable.objects.get(index=options["timetable"])
+            staff = Staff.objects.get(user=timetable.owner, index=options["staff"])
+        except (Timetable.DoesNotExist, Staff.DoesNotExist) as e:
+            raise CommandError(str(e))
+        try:
+            assignments = from_solution_file(options["path"], staff)
+        except (ValueError, KeyError) as e:
+            raise CommandError(f"solution 与导入的实例不匹配: {e}")
+        stats = save_solution(timetable, assignments, options["diff"], options["batch_size"])
+        for key, value in stats.items():
+            self.stdout.write(f"{key}: {value}")
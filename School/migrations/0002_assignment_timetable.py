@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('School', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='assignment',
+            name='timetable',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='Assignments', to='School.timetable'),
+        ),
+        migrations.AlterField(
+            model_name='assignment',
+            name='room',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='Assignments', to='School.room'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:10
+
+from django.db import migrations, models
+
+
+def fill_masks(apps, schema_editor):
+    # 历史模型没有 sync_masks，这里按同样规则回填已有行
+    def mask(bits):
+        return sum(1 << i for i, c in enumerate(bits or '') if c == '1')
+    for name in ('TimeSlot_Lesson', 'TimeSlot_Room'):
+        model = apps.get_model('School', name)
+        batch = []
+        for slot in model.objects.only('id', 'days', 'weeks').iterator(chunk_size=2000):
+            slot.days_mask = mask(slot.days)
+            slot.weeks_mask = mask(slot.weeks)
+            batch.append(slot)
+            if len(batch) >= 2000:
+                model.objects.bulk_update(batch, ['days_mask', 'weeks_mask'])
+                batch = []
+        model.objects.bulk_update(batch, ['days_mask', 'weeks_mask'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('School', '0002_assignment_timetable'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timeslot_lesson',
+            name='days_mask',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='timeslot_lesson',
+            name='weeks_mask',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='timeslot_room',
+            name='days_mask',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='timeslot_room',
+            name='weeks_mask',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_masks, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='timeslot_lesson',
+            index=models.Index(fields=['lesson', 'start', 'length'], name='timeslot_lesson_span'),
+        ),
+        migrations.AddIndex(
+            model_name='timeslot_lesson',
+            index=models.Index(fields=['start', 'length'], name='timeslot_lesson_start'),
+        ),
+        migrations.AddIndex(
+            model_name='timeslot_room',
+            index=models.Index(fields=['room', 'start', 'length'], name='timeslot_room_span'),
+        ),
+        migrations.AddIndex(
+            model_name='timeslot_room',
+            index=models.Index(fields=['start', 'length'], name='timeslot_room_start'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def move_notes(apps, schema_editor):
+    # 之前导入的 ITC2019 课程把 limit / parent / room 记在 note 中（房间惩罚没有保存，无法恢复）
+    Lesson = apps.get_model('School', 'Lesson')
+    batch = []
+    for lesson in Lesson.objects.filter(staff__title='ITC2019', note__isnull=False).iterator(chunk_size=2000):
+        attrs = dict(item.split('=', 1) for item in lesson.note.split() if '=' in item)
+        if not attrs.keys() & {'limit', 'parent', 'room'}:
+            continue
+        if 'limit' in attrs:
+            lesson.limit = int(attrs['limit'])
+        if 'parent' in attrs:
+            lesson.parent = Lesson.objects.filter(staff_id=lesson.staff_id, name=attrs['parent']).first()
+        if attrs.get('room', '').lower() == 'false':
+            lesson.room_required = False
+        lesson.note = None
+        batch.append(lesson)
+        if len(batch) >= 2000:
+            Lesson.objects.bulk_update(batch, ['limit', 'parent', 'room_required', 'note'])
+            batch = []
+    Lesson.objects.bulk_update(batch, ['limit', 'parent', 'room_required', 'note'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('School', '0004_cache_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lesson',
+            name='limit',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='parent',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='children', to='School.lesson'),
+        ),
+        migrations.AddField(
+            model_name='lesson',
+            name='room_required',
+            field=models.BooleanField(null=True),
+        ),
+        migrations.AddField(
+            model_name='lesson_opt_room',
+            name='penalty',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(move_notes, migrations.RunPython.noop),
+    ]
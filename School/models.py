@@ -1,5 +1,60 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.db.models import F, Value
+
+def bits_to_mask(bits):
+    """'0110000' -> 0b0000110：第 i 个字符对应第 i 位，与 ITC2019 的 days / weeks 一致"""
+    return sum(1 << i for i, c in enumerate(bits or '') if c == '1')
+
+class TimeSlotQuerySet(models.QuerySet):
+    """
+    days / weeks 的整数位掩码由 days / weeks 派生：save() 与这里的批量方法负责同步，
+    重叠查询用位与 + (start, length) 区间比较在 SQL 中完成（SQLite / PostgreSQL 均支持 &）。
+    """
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.sync_masks()
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        fields = list(fields)
+        if {'days', 'weeks'} & set(fields):
+            for obj in objs:
+                obj.sync_masks()
+            fields += [name for name in ('days_mask', 'weeks_mask') if name not in fields]
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    def update(self, **kwargs):
+        for name in ('days', 'weeks'):
+            if isinstance(kwargs.get(name), str):
+                kwargs[f'{name}_mask'] = bits_to_mask(kwargs[name])
+        return super().update(**kwargs)
+
+    def overlapping(self, weeks, days, start, length):
+        """与给定时间段在同一周、同一天且时间区间相交的行"""
+        return self.alias(
+            weeks_hit=F('weeks_mask').bitand(bits_to_mask(weeks)),
+            days_hit=F('days_mask').bitand(bits_to_mask(days)),
+        ).filter(
+            weeks_hit__gt=0,
+            days_hit__gt=0,
+            start__lt=start + length,
+            start__gt=Value(start) - F('length'),
+        )
+
+class TimeSlotMasks:
+    def sync_masks(self):
+        self.days_mask = bits_to_mask(self.days)
+        self.weeks_mask = bits_to_mask(self.weeks)
+
+    def save(self, *args, **kwargs):
+        self.sync_masks()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'days', 'weeks'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'days_mask', 'weeks_mask'}
+        super().save(*args, **kwargs)
 
 class Timetable(models.Model):
     created = models.DateTimeField(auto_now_add=True)
@@ -74,15 +129,27 @@ class Lesson(models.Model):
     description = models.TextField(null=True)
     note = models.TextField(null=True)
     staff = models.ForeignKey(Staff, on_delete=models.CASCADE, related_name='Lessons')
+    # ITC2019 的 class 属性：人数上限、父课程班、是否需要教室（为空时按是否有候选教室判断）
+    limit = models.IntegerField(null=True)
+    parent = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, related_name='children')
+    room_required = models.BooleanField(null=True)
 
-class TimeSlot_Lesson(models.Model):
+class TimeSlot_Lesson(TimeSlotMasks, models.Model):
     created = models.DateTimeField(auto_now_add=True)
     days = models.TextField()
     weeks = models.TextField()
+    days_mask = models.BigIntegerField(default=0)
+    weeks_mask = models.BigIntegerField(default=0)
     start = models.IntegerField()
     length = models.IntegerField()
     penalty = models.IntegerField(null=True)
     lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name='TimeSlots')
+    objects = TimeSlotQuerySet.as_manager()
+    class Meta:
+        indexes = [
+            models.Index(fields=['lesson', 'start', 'length'], name='timeslot_lesson_span'),
+            models.Index(fields=['start', 'length'], name='timeslot_lesson_start'),
+        ]
 
 class Room(models.Model):
     created = models.DateTimeField(auto_now_add=True)
@@ -94,14 +161,22 @@ class Room(models.Model):
     class Meta:
         ordering = ['name']
 
-class TimeSlot_Room(models.Model):
+class TimeSlot_Room(TimeSlotMasks, models.Model):
     created = models.DateTimeField(auto_now_add=True)
     days = models.TextField()
     weeks = models.TextField()
+    days_mask = models.BigIntegerField(default=0)
+    weeks_mask = models.BigIntegerField(default=0)
     start = models.IntegerField()
     length = models.IntegerField()
     penalty = models.IntegerField(null=True)
     room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='Timeslots')
+    objects = TimeSlotQuerySet.as_manager()
+    class Meta:
+        indexes = [
+            models.Index(fields=['room', 'start', 'length'], name='timeslot_room_span'),
+            models.Index(fields=['start', 'length'], name='timeslot_room_start'),
+        ]
 
 class Travel(models.Model):
     created = models.DateTimeField(auto_now_add=True)
@@ -113,6 +188,7 @@ class Lesson_opt_Room(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name='Rooms_opt')
     room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='Lessons_opt')
+    penalty = models.IntegerField(default=0)
 
 class Student(models.Model):
     created = models.DateTimeField(auto_now_add=True)
@@ -141,11 +217,17 @@ class Distribution_constraints_Lesson(models.Model):
 
 class Assignment(models.Model):
     created = models.DateTimeField(auto_now_add=True)
+    timetable = models.ForeignKey(Timetable, on_delete=models.CASCADE, null=True, related_name='Assignments')
     lesson = models.ForeignKey(Lesson, on_delete=models.CASCADE, related_name='Assignments')
-    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='Assignments')
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, null=True, related_name='Assignments')
     timeSlot = models.ForeignKey(TimeSlot_Lesson, on_delete=models.CASCADE, related_name='Assignments')
 
 class Assignment_with_Student(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     assignment = models.ForeignKey(Assignment, on_delete=models.CASCADE, related_name='Assignments_students')
     student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='Assignments_students')
+
+class CacheVersion(models.Model):
+    """进程内缓存（见 cache.py）的共享版本：写入提交后更新 token，其他进程读取时发现不一致即重建"""
+    scope = models.CharField(primary_key=True, max_length=64)
+    token = models.CharField(max_length=32)
@@ -0,0 +1,129 @@
+"""
+空闲教室查询的内存占用索引。
+教室按容量升序编号（rank），每个时间单位 (week, day, slot) 对应一个以教室为位的整数位图，
+第 rank 位为 1 表示该教室在这个单位被占用。占用来自教室不可用时间（TimeSlot_Room）和课表的 Assignment。
+查询只对请求覆盖的时间单位做按位或，与教室数量基本无关；容量下限对应 rank 的一个前缀，直接用掩码去掉。
+
+索引按 (用户, 课表) 缓存在进程内：新建的 Assignment 直接并入索引，其余写入使缓存失效（见 signals.py）。
+"""
+import bisect
+from .models import *
+from .cache import GenerationCache
+from .instance import DEFAULT_SLOTS_PER_DAY
+
+_cache = GenerationCache("occupancy", lambda key: [f"user:{key[0]}", f"timetable:{key[1]}"]) # (user_id, timetable_id) -> OccupancyIndex
+_SET_BIT = [bytes(v | (1 << k) for v in range(256)) for k in range(8)]
+
+
+class OccupancyIndex:
+    def __init__(self, rooms, nrWeeks, nrDays, slotsPerDay=DEFAULT_SLOTS_PER_DAY):
+        """rooms: [(room_id, name, capacity)]"""
+        self.rooms = sorted(rooms, key=lambda room: (room[2] or 0, room[0]))
+        self.capacities = [room[2] or 0 for room in self.rooms]
+        self.rank = {room[0]: i for i, room in enumerate(self.rooms)}
+        self.all = (1 << len(self.rooms)) - 1
+        self.nrWeeks = nrWeeks
+        self.nrDays = nrDays
+        self.slotsPerDay = slotsPerDay
+        self.units = [0] * (nrWeeks * nrDays * slotsPerDay)
+
+    def fits(self, weeks, days, start, length):
+        return len(weeks) <= self.nrWeeks and len(days) <= self.nrDays and start + length <= self.slotsPerDay
+
+    def _ranges(self, weeks, days, start, length):
+        """每个选中的 (week, day) 上连续的时间单位区间 [first, last)；超出索引范围的部分不会有占用，直接截掉"""
+        end = min(start + length, self.slotsPerDay)
+        for w, week in enumerate(weeks[:self.nrWeeks]):
+            if week != '1':
+                continue
+            for d, day in enumerate(days[:self.nrDays]):
+                if day == '1':
+                    base = (w * self.nrDays + d) * self.slotsPerDay
+                    yield base + max(start, 0), base + end
+
+    def _units(self, weeks, days, start, length):
+        for first, last in self._ranges(weeks, days, start, length):
+            yield from range(first, last)
+
+    def occupy(self, room_id, weeks, days, start, length):
+        bit = 1 << self.rank[room_id]
+        units = self.units
+        for t in self._units(weeks, days, start, length):
+            units[t] |= bit
+
+    def free_rooms(self, weeks, days, start, length, capacity=0):
+        """返回 [(room_id, name, capacity)]，按容量升序"""
+        busy = 0
+        units = self.units
+        for t in self._units(weeks, days, start, length):
+            busy |= units[t]
+        first = bisect.bisect_left(self.capacities, capacity)
+        free = self.all & ~busy & ~((1 << first) - 1)
+        return [self.rooms[i] for i, c in enumerate(bin(free)[:1:-1]) if c == '1']
+
+
+def build_index(user, timetable_id=None):
+    """三条查询：教室、教室不可用时间、课表中已排的课"""
+    rooms = list(Room.objects.filter(user=user).values_list('id', 'name', 'capacity'))
+    slots = list(TimeSlot_Room.objects.filter(room__user=user).values_list('room_id', 'weeks', 'days', 'start', 'length'))
+    if timetable_id is not None:
+        slots += Assignment.objects.filter(timetable_id=timetable_id, room__user=user).values_list(
+            'room_id', 'timeSlot__weeks', 'timeSlot__days', 'timeSlot__start', 'timeSlot__length')
+    nrWeeks = max((len(weeks) for _, weeks, _, _, _ in slots), default=1)
+    nrDays = max((len(days) for _, _, days, _, _ in slots), default=7)
+    slotsPerDay = max([DEFAULT_SLOTS_PER_DAY] + [start + length for _, _, _, start, length in slots])
+    index = OccupancyIndex(rooms, nrWeeks, nrDays, slotsPerDay)
+    # 构建时所有时间单位共用一块 bytearray（每单位 size 字节），同一天的连续单位是步长为 size 的切片，
+    # 用 translate 查表一次置位整段，最后逐单位转成整数
+    size = (len(rooms) + 7) // 8
+    buffer = bytearray(len(index.units) * size)
+    for room_id, weeks, days, start, length in slots:
+        r = index.rank[room_id]
+        table = _SET_BIT[r & 7]
+        for first, last in index._ranges(weeks, days, start, length):
+            part = slice(first * size + (r >> 3), last * size, size)
+            buffer[part] = buffer[part].translate(table)
+    for t in range(len(index.units)):
+        chunk = buffer[t * size:(t + 1) * size]
+        if any(chunk):
+            index.units[t] = int.from_bytes(chunk, 'little')
+    return index
+
+
+def get_index(user, timetable_id=None):
+    return _cache.get((user.pk, timetable_id), lambda: build_index(user, timetable_id))
+
+
+def add_assignment(assignment):
+    """新建的 Assignment 直接并入已缓存的索引；超出索引范围时改为失效"""
+    if assignment.room_id is None or assignment.timetable_id is None:
+        return
+    slot = assignment.timeSlot
+    args = (slot.weeks, slot.days, slot.start, slot.length)
+    updated = []
+    with _cache.lock:
+        for key in list(_cache.generation):
+            if key[1] != assignment.timetable_id:
+                continue
+            index = _cache.entries.get(key)
+            if index is None:
+                _cache.drop(key) # 正在构建的索引可能没有读到这条记录
+            elif assignment.room_id not in index.rank:
+                updated.append(key) # 其他用户的教室，不受影响
+            elif index.fits(*args):
+                index.occupy(assignment.room_id, *args)
+                updated.append(key)
+            else:
+                _cache.drop(key)
+    # 其他进程的索引没有这条记录，按课表失效
+    _cache.updated(updated, f"timetable:{assignment.timetable_id}")
+
+
+def invalidate_occupancy(user_id=None, timetable_id=None):
+    """按用户 / 课表失效，两者都为 None 时清空全部"""
+    if user_id is None and timetable_id is None:
+        _cache.invalidate()
+        return
+    # 其他进程按用户失效时范围更大，但结果正确
+    scope = f"user:{user_id}" if user_id is not None else f"timetable:{timetable_id}"
+    _cache.invalidate(lambda key: (user_id is None or key[0] == user_id) and (timetable_id is None or key[1] == timetable_id), scope)
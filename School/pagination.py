@@ -0,0 +1,9 @@
+from rest_framework.pagination import CursorPagination
+
+
+class ResourceCursorPagination(CursorPagination):
+    """资源列表游标分页：按自增 id 排序，翻页开销与偏移量无关"""
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = 'id'
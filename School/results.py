@@ -0,0 +1,181 @@
+"""
+求解结果写回 Assignment / Assignment_with_Student。
+save_solution 在一个事务内替换课表的整套结果：默认全量（先删后 bulk_create），
+diff=True 时只写与上一版结果不同的行（改动的课程 bulk_update，学生关联按差集增删）。
+输入统一为 lesson_id -> (timeslot_id, room_id or None, student_ids or None)，
+from_results / from_solution_file 分别把 env.results() 和 solution XML 转成这种格式。
+"""
+import time
+from django.db import connection, transaction
+from django.utils import timezone
+from .models import *
+from .bulk import BULK_BATCH_SIZE
+from .occupancy import invalidate_occupancy
+from .conflicts import invalidate_conflicts
+
+
+def _chunks(ids, size):
+    ids = list(ids)
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+
+def _enrolled(lesson_ids):
+    """student_ids 为 None 的课程用选课关系补齐"""
+    enrolled = {}
+    for lid, sid in Student_opt_Lesson.objects.filter(lesson_id__in=lesson_ids).values_list('lesson_id', 'student_id'):
+        enrolled.setdefault(lid, []).append(sid)
+    return enrolled
+
+
+def _student_rows(assignments, assignment_ids):
+    missing = [lid for lid, (_, _, students) in assignments.items() if students is None]
+    enrolled = _enrolled(missing) if missing else {}
+    pairs = set()
+    for lid, (_, _, students) in assignments.items():
+        for sid in (enrolled.get(lid, []) if students is None else students):
+            pairs.add((assignment_ids[lid], int(sid)))
+    return pairs
+
+
+def _insert_students(pairs):
+    """
+    学生关联是结果中最大的表（约十万行），绕过模型实例化，用一次 executemany 写入；
+    created 只按字段规则转换一次。
+    """
+    if not pairs:
+        return
+    meta = Assignment_with_Student._meta
+    created = meta.get_field('created').get_db_prep_save(timezone.now(), connection)
+    columns = [meta.get_field(name).column for name in ('created', 'assignment', 'student')]
+    sql = "INSERT INTO {} ({}) VALUES (%s, %s, %s)".format(
+        connection.ops.quote_name(meta.db_table), ", ".join(connection.ops.quote_name(c) for c in columns)
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [(created, aid, sid) for aid, sid in pairs])
+
+
+def _delete(queryset):
+    """
+    单条 DELETE，不逐行收集级联对象、不发 post_delete：缓存在 save_solution 结束时统一失效一次。
+    调用方先删学生关联，Assignment 没有其他引用它的表。
+    """
+    return queryset._raw_delete(queryset.db)
+
+
+def _replace(timetable, assignments, batch_size):
+    # 先删学生关联，再删课程结果
+    _delete(Assignment_with_Student.objects.filter(assignment__timetable=timetable))
+    _delete(Assignment.objects.filter(timetable=timetable))
+    created = Assignment.objects.bulk_create([
+        Assignment(timetable=timetable, lesson_id=lid, timeSlot_id=slot, room_id=room)
+        for lid, (slot, room, _) in assignments.items()
+    ], batch_size=batch_size)
+    assignment_ids = {a.lesson_id: a.id for a in created}
+    pairs = _student_rows(assignments, assignment_ids)
+    _insert_students(pairs)
+    return {"created": len(created), "updated": 0, "deleted": 0,
+            "students_created": len(pairs), "students_deleted": 0}
+
+
+def _apply_diff(timetable, assignments, batch_size):
+    previous = {
+        lid: (aid, slot, room) for aid, lid, slot, room in
+        Assignment.objects.filter(timetable=timetable).values_list('id', 'lesson_id', 'timeSlot_id', 'room_id')
+    }
+    removed = [aid for lid, (aid, _, _) in previous.items() if lid not in assignments]
+    changed = [
+        Assignment(id=previous[lid][0], timeSlot_id=slot, room_id=room)
+        for lid, (slot, room, _) in assignments.items()
+        if lid in previous and previous[lid][1:] != (slot, room)
+    ]
+    added = [
+        Assignment(timetable=timetable, lesson_id=lid, timeSlot_id=slot, room_id=room)
+        for lid, (slot, room, _) in assignments.items() if lid not in previous
+    ]
+
+    old_pairs = {
+        (aid, sid): pk for pk, aid, sid in
+        Assignment_with_Student.objects.filter(assignment__timetable=timetable).values_list('id', 'assignment_id', 'student_id')
+    }
+    for chunk in _chunks(removed, batch_size):
+        _delete(Assignment_with_Student.objects.filter(assignment_id__in=chunk))
+        _delete(Assignment.objects.filter(id__in=chunk))
+    if changed:
+        Assignment.objects.bulk_update(changed, ['timeSlot', 'room'], batch_size=batch_size)
+    Assignment.objects.bulk_create(added, batch_size=batch_size)
+
+    assignment_ids = {lid: previous[lid][0] for lid in assignments if lid in previous}
+    assignment_ids.update({a.lesson_id: a.id for a in added})
+    pairs = _student_rows(assignments, assignment_ids)
+    removed_set = set(removed)
+    stale = [pk for pair, pk in old_pairs.items() if pair not in pairs and pair[0] not in removed_set]
+    for chunk in _chunks(stale, batch_size):
+        _delete(Assignment_with_Student.objects.filter(id__in=chunk))
+    fresh = pairs - old_pairs.keys()
+    _insert_students(fresh)
+    return {"created": len(added), "updated": len(changed), "deleted": len(removed),
+            "students_created": len(fresh), "students_deleted": len(stale)}
+
+
+def save_solution(timetable, assignments, diff=False, batch_size=BULK_BATCH_SIZE):
+    """
+    用一套新结果替换课表原有结果，返回写入统计。
+    assignments: lesson_id -> (timeslot_id, room_id or None, student_ids or None)，
+    student_ids 为 None 时按选课关系写入全部选课学生。
+    """
+    started = time.perf_counter()
+    with transaction.atomic():
+        stats = (_apply_diff if diff else _replace)(timetable, assignments, batch_size)
+    invalidate_occupancy(timetable_id=timetable.pk)
+    invalidate_conflicts(timetable.pk)
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    return stats
+
+
+def from_results(results):
+    """
+    env.results() -> save_solution 的输入；要求实例来自 instance.build_instance，
+    即 class id 为 Lesson 主键、time option 带 TimeSlot_Lesson 主键。未排课的课程跳过。
+    """
+    assignments = {}
+    for cid, (time_option, room_required, room_id, student_ids) in results.items():
+        if time_option is None:
+            continue
+        room = int(room_id) if room_required and room_id is not None else None
+        students = [int(sid) for sid in student_ids] if student_ids is not None else None
+        assignments[int(cid)] = (time_option["id"], room, students)
+    return assignments
+
+
+def from_solution_file(path, staff):
+    """
+    读取 ITC2019 solution XML -> save_solution 的输入。
+    staff 为 itc_import 创建的占位教师，ITC id 按 name 字段映射到该实例导入的课程 / 教室 / 学生。
+    """
+    from MARL.src.evaluator import load_solution # 依赖 numpy，只在读取 solution 文件时导入
+
+    lessons = Lesson.objects.filter(staff=staff)
+    lesson_ids = dict(lessons.values_list('name', 'id'))
+    room_ids = dict(Lesson_opt_Room.objects.filter(lesson__in=lessons).values_list('room__name', 'room_id'))
+    student_ids = dict(Student_opt_Lesson.objects.filter(lesson__in=lessons).values_list('student__name', 'student_id'))
+    slots = {
+        (lid, weeks, days, start): tid for tid, lid, weeks, days, start in
+        TimeSlot_Lesson.objects.filter(lesson__in=lessons).values_list('id', 'lesson_id', 'weeks', 'days', 'start')
+    }
+
+    assignments = {}
+    for cid, (time_bits, room, students) in load_solution(path).items():
+        if time_bits is None or cid not in lesson_ids:
+            continue
+        lid = lesson_ids[cid]
+        weeks, days, start, _ = time_bits
+        slot = slots.get((lid, weeks, days, start))
+        if slot is None:
+            raise ValueError(f"class {cid}: time option not found")
+        assignments[lid] = (
+            slot,
+            room_ids[room] if room is not None else None,
+            [student_ids[sid] for sid in students if sid in student_ids] or None,
+        )
+    return assignments
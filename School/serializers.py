@@ -1,7 +1,15 @@
 import json
+from django.db.models import Exists, OuterRef
 from rest_framework import serializers
 from .models import *
 
+def annotate_timetables(queryset, user):
+    """列表/详情共用：用 Exists 子查询一次算出收藏标记，owner 随主查询 JOIN 取出"""
+    queryset = queryset.select_related('owner')
+    if user and user.is_authenticated:
+        return queryset.annotate(is_star=Exists(Stars.objects.filter(user=user, Timetable=OuterRef('pk'))))
+    return queryset
+
 # --- 辅助 JSON 解析逻辑 ---
 class JsonTextField(serializers.Field):
     def to_representation(self, value):
@@ -58,6 +66,9 @@ class TimetableDetailSerializer(serializers.ModelSerializer):
         return WeekTableSerializer(default).data if default else None
 
     def get_isStar(self, obj):
+        # 优先使用 annotate_timetables 的注解结果，避免逐条查询
+        if hasattr(obj, 'is_star'):
+            return obj.is_star
         user = self.context.get('request').user
         if user and user.is_authenticated:
             return Stars.objects.filter(user=user, Timetable=obj).exists()
@@ -73,6 +84,9 @@ class TimetableCardSerializer(serializers.ModelSerializer):
         fields = ['index', 'isStar', 'isOwner', 'usage', 'name', 'description']
 
     def get_isStar(self, obj):
+        # 优先使用 annotate_timetables 的注解结果，避免逐条查询
+        if hasattr(obj, 'is_star'):
+            return obj.is_star
         user = self.context.get('request').user
         if user and user.is_authenticated:
             return Stars.objects.filter(user=user, Timetable=obj).exists()
@@ -80,14 +94,30 @@ class TimetableCardSerializer(serializers.ModelSerializer):
 
     def get_isOwner(self, obj):
         user = self.context.get('request').user
-        return obj.owner == user
+        return obj.owner_id == user.pk
 
     def get_usage(self, obj):
         return 0
 
 # --- 基础资源序列化 ---
 
-class StaffSerializer(serializers.ModelSerializer):
+def requested_fields(request):
+    """解析 ?fields=a,b，未指定时返回 None（全部字段）"""
+    fields = request.query_params.get('fields') if request is not None else None
+    if not fields:
+        return None
+    return {f.strip() for f in fields.split(',') if f.strip()}
+
+class SparseFieldsMixin:
+    """按 ?fields= 裁剪顶层字段，前端只取需要渲染的列"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = requested_fields(self.context.get('request'))
+        if fields:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+
+class StaffSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Staff
         fields = '__all__'
@@ -97,7 +127,7 @@ class TimeSlotSerializer(serializers.ModelSerializer):
         model = TimeSlot_Lesson
         fields = ['days', 'weeks', 'start', 'length', 'penalty']
 
-class RoomSerializer(serializers.ModelSerializer):
+class RoomSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     unavailable = TimeSlotSerializer(source='Timeslots', many=True, read_only=True)
     # 修正：Room 模型没定义 index，映射 id 到 index 以对接前端
     index = serializers.IntegerField(source='id', read_only=True)
@@ -107,14 +137,14 @@ class RoomSerializer(serializers.ModelSerializer):
         fields = ['index', 'name', 'description', 'capacity', 'note', 'unavailable']
 
 # 新增：补充缺失的 StudentSerializer
-class StudentSerializer(serializers.ModelSerializer):
+class StudentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     index = serializers.IntegerField(source='id', read_only=True)
 
     class Meta:
         model = Student
         fields = ['index', 'name', 'description', 'note']
 
-class LessonSerializer(serializers.ModelSerializer):
+class LessonSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     staff = StaffSerializer(read_only=True)
     timeslots = TimeSlotSerializer(source='TimeSlots', many=True, read_only=True)
     # 修正：Lesson 模型没定义 index，映射 id 到 index
@@ -122,7 +152,7 @@ class LessonSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Lesson
-        fields = ['index', 'name', 'description', 'note', 'staff', 'timeslots']
+        fields = ['index', 'name', 'description', 'note', 'limit', 'room_required', 'staff', 'timeslots']
 
 class DistributionSerializer(serializers.ModelSerializer):
     # read_only=False, queryset 确保可以接收 lesson ID 列表进行写入
@@ -144,10 +174,64 @@ class DistributionSerializer(serializers.ModelSerializer):
         lessons_data = validated_data.pop('Lessons', [])
         # 创建 Distribution 实例
         distribution = Distribution.objects.create(**validated_data)
-        # 创建中间表关联
-        for lesson in lessons_data:
-            Distribution_constraints_Lesson.objects.create(
-                distribution=distribution,
-                lesson=lesson
-            )
-        return distribution
\ No newline at end of file
+        # 创建中间表关联（一次插入）
+        Distribution_constraints_Lesson.objects.bulk_create([
+            Distribution_constraints_Lesson(distribution=distribution, lesson=lesson)
+            for lesson in lessons_data
+        ])
+        return distribution
+
+# --- 批量导入序列化：只做逐条字段校验，关联 ID 由 bulk.py 一次性查询校验 ---
+
+class TravelItemSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Travel
+        fields = ['room', 'value']
+
+class RoomBulkSerializer(serializers.ModelSerializer):
+    unavailable = TimeSlotSerializer(many=True, required=False)
+    travels = TravelItemSerializer(many=True, required=False)
+
+    class Meta:
+        model = Room
+        fields = ['name', 'description', 'capacity', 'note', 'unavailable', 'travels']
+
+class LessonBulkSerializer(serializers.ModelSerializer):
+    staff_id = serializers.IntegerField() # Staff.index，与 LessonCreateView 一致
+    timeslots = TimeSlotSerializer(many=True, required=False)
+    rooms = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+    class Meta:
+        model = Lesson
+        fields = ['name', 'description', 'note', 'limit', 'room_required', 'staff_id', 'timeslots', 'rooms']
+
+class StudentBulkSerializer(serializers.ModelSerializer):
+    lessons = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+    class Meta:
+        model = Student
+        fields = ['name', 'description', 'note', 'lessons']
+
+class DistributionBulkSerializer(serializers.ModelSerializer):
+    lessons = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+    class Meta:
+        model = Distribution
+        fields = ['type', 'required', 'penalty', 'description', 'note', 'lessons']
+
+
+class FreeRoomQuerySerializer(serializers.Serializer):
+    """空闲教室查询参数，days / weeks 与 TimeSlot 相同的 0/1 串"""
+    days = serializers.RegexField(r'^[01]+$')
+    weeks = serializers.RegexField(r'^[01]+$')
+    start = serializers.IntegerField(min_value=0)
+    length = serializers.IntegerField(min_value=1)
+    capacity = serializers.IntegerField(min_value=0, default=0)
+    timetable = serializers.IntegerField(required=False, help_text="计入该课表已排课程的占用")
+
+class ConflictCheckSerializer(serializers.Serializer):
+    """试放一门课：课表当前结果上把 lesson 放到 room / timeslot"""
+    timetable = serializers.IntegerField()
+    lesson = serializers.IntegerField()
+    room = serializers.IntegerField(required=False, allow_null=True, default=None)
+    timeslot = serializers.IntegerField(help_text="TimeSlot_Lesson 主键")
@@ -0,0 +1,76 @@
+import contextvars
+from django.db.models.signals import post_save, post_delete
+from .models import *
+from .instance import invalidate_instance
+from .occupancy import add_assignment, invalidate_occupancy
+from .conflicts import invalidate_conflicts
+
+# 资源所属用户的查找路径；bulk_create 不触发信号，由 bulk.py / itc_import.py 显式失效
+OWNER_LOOKUPS = {
+    Room: 'user_id',
+    Staff: 'user_id',
+    Student: 'user_id',
+    Lesson: 'staff__user_id',
+    TimeSlot_Room: 'room__user_id',
+    Travel: 'fromRoom__user_id',
+    TimeSlot_Lesson: 'lesson__staff__user_id',
+    Lesson_opt_Room: 'lesson__staff__user_id',
+    Student_opt_Lesson: 'student__user_id',
+    Distribution_constraints_Lesson: 'lesson__staff__user_id',
+}
+
+
+# 当前请求的用户 id，由视图设置（见 views.TimetableBaseView）；信号处理中不再为查找所属用户额外查询
+writer = contextvars.ContextVar("school_writer", default=None)
+
+
+def _owner_id(instance):
+    """沿已加载的关联取所属用户，取不到时用当前请求的用户；都没有时返回 None，表示清空全部缓存"""
+    obj = instance
+    *path, field = OWNER_LOOKUPS[type(instance)].split('__')
+    for name in path:
+        relation = obj._meta.get_field(name)
+        if not relation.is_cached(obj):
+            return writer.get()
+        obj = getattr(obj, name)
+    return getattr(obj, field)
+
+
+# 影响空闲教室索引的资源
+OCCUPANCY_MODELS = {Room, TimeSlot_Room}
+
+
+def invalidate_on_write(sender, instance, **kwargs):
+    user_id = _owner_id(instance)
+    invalidate_instance(user_id)
+    if sender in OCCUPANCY_MODELS:
+        invalidate_occupancy(user_id)
+
+
+def invalidate_all(sender, instance, **kwargs):
+    # Distribution 没有直接的用户字段
+    invalidate_instance()
+
+
+def assignment_saved(sender, instance, created=False, **kwargs):
+    # 新排的课只会增加占用，直接并入索引；修改无法知道原来的时间段，只能失效
+    if created:
+        add_assignment(instance)
+    else:
+        invalidate_occupancy(timetable_id=instance.timetable_id)
+    invalidate_conflicts(instance.timetable_id)
+
+
+def assignment_deleted(sender, instance, **kwargs):
+    invalidate_occupancy(timetable_id=instance.timetable_id)
+    invalidate_conflicts(instance.timetable_id)
+
+
+def connect():
+    for model in OWNER_LOOKUPS:
+        post_save.connect(invalidate_on_write, sender=model, dispatch_uid=f"instance-{model.__name__}-save")
+        post_delete.connect(invalidate_on_write, sender=model, dispatch_uid=f"instance-{model.__name__}-delete")
+    post_save.connect(invalidate_all, sender=Distribution, dispatch_uid="instance-Distribution-save")
+    post_delete.connect(invalidate_all, sender=Distribution, dispatch_uid="instance-Distribution-delete")
+    post_save.connect(assignment_saved, sender=Assignment, dispatch_uid="occupancy-Assignment-save")
+    post_delete.connect(assignment_deleted, sender=Assignment, dispatch_uid="occupancy-Assignment-delete")
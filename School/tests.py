@@ -1,3 +1,452 @@
-from django.test import TestCase
+import io
+from unittest import mock
+from django.test import TestCase, TransactionTestCase
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework.test import APIClient
+from .models import *
+from .instance import get_instance, invalidate_instance
+from .results import save_solution
+from .itc_import import import_itc2019
+from .occupancy import get_index, invalidate_occupancy
+from .cache import _publish
+from .signals import writer
 
 # Create your tests here.
+class TimetableListQueryCountTest(TestCase):
+    """课表卡片列表的查询数不随课表数量增长"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='pass')
+        self.other = User.objects.create_user(username='other', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_timetables(self, n):
+        for i in range(n):
+            mine = Timetable.objects.create(name=f'mine-{i}', type='week', owner=self.user)
+            theirs = Timetable.objects.create(name=f'theirs-{i}', type='week', owner=self.other)
+            Stars.objects.create(user=self.user, Timetable=theirs)
+            if i % 2 == 0:
+                Stars.objects.create(user=self.user, Timetable=mine)
+
+    def assert_constant_queries(self, url, expected):
+        for n in (1, 5):
+            self.create_timetables(n)
+            with self.assertNumQueries(expected):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(len(response.data['data']['list']) > 0)
+
+    def test_my_templates(self):
+        self.assert_constant_queries('/api/school/get-my-templates', 1)
+
+    def test_stars(self):
+        self.assert_constant_queries('/api/school/get-stars', 1)
+
+    def test_recommended(self):
+        self.assert_constant_queries('/api/school/get-recommended-templates', 1)
+
+    def test_flags(self):
+        self.create_timetables(2)
+        response = self.client.get('/api/school/get-stars')
+        cards = response.data['data']['list']
+        self.assertTrue(all(card['isStar'] for card in cards))
+        self.assertEqual(sum(card['isOwner'] for card in cards), 1)
+
+
+class ResourceListPaginationTest(TestCase):
+    """资源列表游标分页、稀疏字段与预取"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        staff = Staff.objects.create(index=1, user=self.user, name='t', title='prof')
+        for i in range(5):
+            lesson = Lesson.objects.create(name=f'lesson-{i}', staff=staff)
+            TimeSlot_Lesson.objects.create(lesson=lesson, days='1000000', weeks='1', start=0, length=10)
+
+    def test_lessons_paginated(self):
+        # 课程 JOIN 教师 + 预取时间段，游标分页不做 COUNT
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/school/get-lessons', {'page_size': 3})
+        data = response.data['data']
+        self.assertEqual(len(data['list']), 3)
+        self.assertIsNotNone(data['next'])
+        response = self.client.get(data['next'])
+        self.assertEqual(len(response.data['data']['list']), 2)
+
+    def test_sparse_fields(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/school/get-lessons', {'fields': 'index,name'})
+        self.assertEqual(set(response.data['data']['list'][0]), {'index', 'name'})
+
+
+class BulkCreateTest(TestCase):
+    """批量导入：查询数与条目数无关，引用错误时整体回滚"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        Staff.objects.create(index=7, user=self.user, name='t', title='prof')
+
+    def test_bulk_lessons(self):
+        rooms = self.client.post('/api/school/bulk-create-rooms', [
+            {'name': f'r{i}', 'capacity': 30, 'unavailable': [{'days': '1000000', 'weeks': '1', 'start': 0, 'length': 12}]}
+            for i in range(3)
+        ], format='json').data['data']['ids']
+        lessons = [
+            {'name': f'l{i}', 'staff_id': 7, 'rooms': rooms,
+             'timeslots': [{'days': '0100000', 'weeks': '1', 'start': 24, 'length': 12, 'penalty': 0}]}
+            for i in range(50)
+        ]
+        # 查询教师 + 查询教室 + 课程/时间段/教室关联三次插入（外加事务保存点）
+        with self.assertNumQueries(7):
+            response = self.client.post('/api/school/bulk-create-lessons', lessons, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Lesson.objects.count(), 50)
+        self.assertEqual(TimeSlot_Lesson.objects.count(), 50)
+
+    def test_bulk_distributions(self):
+        lessons = self.client.post('/api/school/bulk-create-lessons', [
+            {'name': f'l{i}', 'staff_id': 7} for i in range(2)
+        ], format='json').data['data']['ids']
+        response = self.client.post('/api/school/bulk-create-distributions', [
+            {'type': 'SameTime', 'required': True, 'lessons': lessons},
+            {'type': 'DifferentDays', 'penalty': 3, 'lessons': lessons[:1]},
+        ], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Distribution.objects.count(), 2)
+        self.assertEqual(Distribution_constraints_Lesson.objects.count(), 3)
+
+    def test_bulk_rollback_on_missing_reference(self):
+        response = self.client.post('/api/school/bulk-create-lessons', [
+            {'name': 'ok', 'staff_id': 7}, {'name': 'bad', 'staff_id': 99}
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Lesson.objects.count(), 0)
+
+
+class SchoolInstanceTest(TestCase):
+    """直接从数据库构造求解实例，写入后缓存失效"""
+
+    def setUp(self):
+        invalidate_instance()
+        self.user = User.objects.create_user(username='owner', password='pass')
+        self.staff = Staff.objects.create(index=1, user=self.user, name='t', title='prof')
+        self.room = Room.objects.create(user=self.user, name='r', capacity=30)
+        self.lesson = Lesson.objects.create(staff=self.staff, name='l')
+        TimeSlot_Lesson.objects.create(lesson=self.lesson, days='0100000', weeks='11', start=24, length=12, penalty=2)
+        Lesson_opt_Room.objects.create(lesson=self.lesson, room=self.room)
+
+    def test_build_and_invalidate(self):
+        # 没有约束时 Distribution 查询被跳过；另有一次共享版本查询
+        with self.assertNumQueries(10):
+            instance = get_instance(self.user)
+        cls = instance.classes[str(self.lesson.id)]
+        self.assertEqual(cls['room_options'], [{'id': str(self.room.id), 'penalty': 0}])
+        self.assertEqual(cls['time_options'][0]['optional_time_bits'], ('11', '0100000', 24, 12))
+        self.assertEqual((instance.nrDays, instance.nrWeeks), (7, 2))
+        with self.assertNumQueries(1):
+            self.assertIs(get_instance(self.user), instance)
+        Lesson.objects.create(staff=self.staff, name='l2')
+        self.assertEqual(len(get_instance(self.user).classes), 2)
+
+
+class SharedCacheTest(TestCase):
+    """其他进程的写入经共享版本发现；信号处理不为所属用户额外查询"""
+
+    def setUp(self):
+        invalidate_instance()
+        invalidate_occupancy()
+        self.user = User.objects.create_user(username='owner', password='pass')
+        self.other = User.objects.create_user(username='other', password='pass')
+        self.staff = Staff.objects.create(index=1, user=self.user, name='t', title='prof')
+        self.room = Room.objects.create(user=self.user, name='r', capacity=30)
+        self.lesson = Lesson.objects.create(staff=self.staff, name='l')
+        self.slot = TimeSlot_Lesson.objects.create(lesson=self.lesson, days='0100000', weeks='1', start=24, length=12)
+        self.timetable = Timetable.objects.create(name='t', type='week', owner=self.user)
+
+    def test_write_in_another_process(self):
+        instance = get_instance(self.user)
+        other = get_instance(self.other)
+        # 另一个进程提交写入后更新的版本
+        _publish([f"instance:user:{self.user.pk}"])
+        self.assertIsNot(get_instance(self.user), instance)
+        self.assertIs(get_instance(self.other), other)
+        _publish(["instance"])
+        self.assertIsNot(get_instance(self.other), other)
+
+    def test_owner_from_request_without_query(self):
+        instance = get_instance(self.user)
+        other = get_instance(self.other)
+        lesson = Lesson.objects.get(pk=self.lesson.pk)
+        token = writer.set(self.user.pk)
+        try:
+            with self.assertNumQueries(1):
+                lesson.save()
+        finally:
+            writer.reset(token)
+        self.assertIsNot(get_instance(self.user), instance)
+        self.assertIs(get_instance(self.other), other)
+
+
+class SharedCacheCommitTest(TransactionTestCase):
+    """共享版本在提交后更新：同一事务只更新一次，本进程就地更新的索引继续使用"""
+
+    def setUp(self):
+        SharedCacheTest.setUp(self)
+
+    def test_version_published_once_on_commit(self):
+        instance = get_instance(self.user)
+        with mock.patch('School.cache._publish', wraps=_publish) as publish:
+            self.staff.delete() # 级联删除课程和时间段，每行都触发信号
+        publish.assert_called_once()
+        self.assertTrue(CacheVersion.objects.filter(scope=f"instance:user:{self.user.pk}").exists())
+        self.assertEqual(get_instance(self.user).classes, {})
+        self.assertIsNot(get_instance(self.user), instance)
+
+    def test_new_assignment_keeps_local_index(self):
+        index = get_index(self.user, self.timetable.pk)
+        Assignment.objects.create(timetable=self.timetable, lesson=self.lesson, room=self.room, timeSlot=self.slot)
+        # 本进程的索引已就地更新，其他进程按课表失效
+        self.assertIs(get_index(self.user, self.timetable.pk), index)
+        self.assertTrue(CacheVersion.objects.filter(scope=f"occupancy:timetable:{self.timetable.pk}").exists())
+        _publish([f"occupancy:timetable:{self.timetable.pk}"])
+        self.assertIsNot(get_index(self.user, self.timetable.pk), index)
+
+
+class SaveSolutionTest(TestCase):
+    """结果整体替换与差异写入得到相同的结果表"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='owner', password='pass')
+        self.timetable = Timetable.objects.create(name='t', type='week', owner=self.user)
+        staff = Staff.objects.create(index=1, user=self.user, name='t', title='prof')
+        self.rooms = [Room.objects.create(user=self.user, name=f'r{i}') for i in range(2)]
+        self.students = [Student.objects.create(user=self.user, name=f's{i}').id for i in range(4)]
+        self.slots = {}
+        for i in range(3):
+            lesson = Lesson.objects.create(staff=staff, name=f'l{i}')
+            self.slots[lesson.id] = [
+                TimeSlot_Lesson.objects.create(lesson=lesson, days='1000000', weeks='1', start=s, length=12).id
+                for s in (0, 24)
+            ]
+
+    def rows(self):
+        return set(Assignment_with_Student.objects.values_list(
+            'assignment__lesson_id', 'assignment__timeSlot_id', 'assignment__room_id', 'student_id'))
+
+    def test_full_and_diff(self):
+        first = {lid: (slots[0], self.rooms[0].id, self.students[:2]) for lid, slots in self.slots.items()}
+        save_solution(self.timetable, first)
+        self.assertEqual(Assignment_with_Student.objects.count(), 6)
+
+        lids = list(self.slots)
+        second = dict(first)
+        second[lids[0]] = (self.slots[lids[0]][1], self.rooms[1].id, self.students[1:3])
+        del second[lids[2]]
+        stats = save_solution(self.timetable, second, diff=True)
+        self.assertEqual((stats['updated'], stats['deleted'], stats['students_created'], stats['students_deleted']), (1, 1, 1, 1))
+        diffed = self.rows()
+
+        save_solution(self.timetable, second)
+        self.assertEqual(self.rows(), diffed)
+        self.assertEqual(Assignment.objects.filter(timetable=self.timetable).count(), 2)
+
+    def test_no_per_row_signals(self):
+        first = {lid: (slots[0], self.rooms[0].id, self.students[:2]) for lid, slots in self.slots.items()}
+        save_solution(self.timetable, first)
+        # 删除不逐行发 post_delete，缓存只在结束时失效一次
+        with mock.patch('School.signals.invalidate_conflicts') as per_row, \
+                mock.patch('School.results.invalidate_conflicts') as once:
+            save_solution(self.timetable, first)
+            save_solution(self.timetable, {}, diff=True)
+        per_row.assert_not_called()
+        self.assertEqual(once.call_count, 2)
+        self.assertEqual(Assignment.objects.count(), 0)
+        self.assertEqual(Assignment_with_Student.objects.count(), 0)
+
+
+class TimeSlotMaskTest(TestCase):
+    """位掩码随 days / weeks 同步，重叠查询在 SQL 中完成"""
+
+    def setUp(self):
+        user = User.objects.create_user(username='owner', password='pass')
+        self.room = Room.objects.create(user=user, name='r')
+
+    def test_masks_and_overlap(self):
+        TimeSlot_Room.objects.bulk_create([TimeSlot_Room(room=self.room, days='0010000', weeks='001', start=12, length=20)])
+        slot = TimeSlot_Room.objects.get()
+        self.assertEqual((slot.days_mask, slot.weeks_mask), (0b100, 0b100))
+
+        overlapping = TimeSlot_Room.objects.overlapping
+        self.assertEqual(overlapping('011', '0010000', 31, 3).count(), 1)
+        self.assertEqual(overlapping('011', '0010000', 32, 3).count(), 0) # 区间首尾相接不算重叠
+        self.assertEqual(overlapping('110', '0010000', 12, 3).count(), 0)
+        self.assertEqual(overlapping('001', '0100000', 12, 3).count(), 0)
+
+        TimeSlot_Room.objects.filter(id=slot.id).update(days='0100000')
+        self.assertEqual(overlapping('001', '0100000', 12, 3).count(), 1)
+
+
+class FreeRoomTest(TestCase):
+    """空闲教室索引：不可用时间、课表已排课程和容量下限，写入后结果随之更新"""
+
+    def setUp(self):
+        invalidate_occupancy()
+        self.user = User.objects.create_user(username='owner', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.timetable = Timetable.objects.create(name='t', type='week', owner=self.user)
+        self.small = Room.objects.create(user=self.user, name='small', capacity=20)
+        self.large = Room.objects.create(user=self.user, name='large', capacity=80)
+        self.other = Room.objects.create(user=self.user, name='other', capacity=60)
+        staff = Staff.objects.create(index=1, user=self.user, name='t', title='prof')
+        lesson = Lesson.objects.create(staff=staff, name='l')
+        self.slot = TimeSlot_Lesson.objects.create(lesson=lesson, days='0100000', weeks='11', start=24, length=12)
+        self.lesson = lesson
+
+    def free(self, **params):
+        query = {'days': '0100000', 'weeks': '01', 'start': 30, 'length': 12, 'timetable': self.timetable.index}
+        query.update(params)
+        response = self.client.get('/api/school/get-free-rooms', query)
+        self.assertEqual(response.status_code, 200)
+        return [room['name'] for room in response.data['data']['list']]
+
+    def test_free_rooms(self):
+        TimeSlot_Room.objects.create(room=self.other, days='0100000', weeks='11', start=0, length=36)
+        self.assertEqual(self.free(), ['small', 'large'])
+        self.assertEqual(self.free(capacity=50), ['large'])
+
+        # 新建的 Assignment 直接并入已缓存的索引
+        Assignment.objects.create(timetable=self.timetable, lesson=self.lesson, room=self.large, timeSlot=self.slot)
+        self.assertEqual(self.free(), ['small'])
+        self.assertEqual(self.free(start=36), ['small', 'other', 'large'])
+
+        self.other.Timeslots.all().delete()
+        self.assertEqual(self.free(), ['small', 'other'])
+        # 不传课表时只看教室不可用时间
+        self.assertEqual(self.free(timetable=''), ['small', 'other', 'large'])
+
+
+class ConflictCheckTest(TestCase):
+    """试放课程：教室冲突、硬约束与惩罚变化"""
+
+    def setUp(self):
+        invalidate_instance()
+        self.user = User.objects.create_user(username='owner', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.timetable = Timetable.objects.create(name='t', type='week', owner=self.user)
+        staff = Staff.objects.create(index=1, user=self.user, name='t', title='prof')
+        self.room = Room.objects.create(user=self.user, name='r', capacity=30)
+        self.a, self.b = [Lesson.objects.create(staff=staff, name=name) for name in ('a', 'b')]
+        self.slots = {}
+        for lesson in (self.a, self.b):
+            Lesson_opt_Room.objects.create(lesson=lesson, room=self.room)
+            self.slots[lesson.id] = [
+                TimeSlot_Lesson.objects.create(lesson=lesson, days='1000000', weeks='1', start=start, length=12, penalty=penalty).id
+                for start, penalty in ((0, 0), (24, 3))
+            ]
+        distribution = Distribution.objects.create(type='DifferentTime', required=True)
+        for lesson in (self.a, self.b):
+            Distribution_constraints_Lesson.objects.create(distribution=distribution, lesson=lesson)
+        save_solution(self.timetable, {
+            self.a.id: (self.slots[self.a.id][0], self.room.id, []),
+            self.b.id: (self.slots[self.b.id][1], self.room.id, []),
+        })
+
+    def check(self, lesson, slot):
+        response = self.client.post('/api/school/check-conflicts', {
+            'timetable': self.timetable.index, 'lesson': lesson.id, 'room': self.room.id, 'timeslot': self.slots[lesson.id][slot],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.data['data']
+
+    def test_check(self):
+        result = self.check(self.b, 0)
+        self.assertFalse(result['feasible'])
+        self.assertEqual(result['room_conflicts'], [self.a.id])
+        self.assertEqual([v['type'] for v in result['hard_violations']], ['DifferentTime'])
+        self.assertEqual(result['penalty_delta'], -3)
+
+        result = self.check(self.b, 1)
+        self.assertTrue(result['feasible'])
+        self.assertEqual(result['penalty_delta'], 0)
+
+    def test_not_an_option(self):
+        response = self.client.post('/api/school/check-conflicts', {
+            'timetable': self.timetable.index, 'lesson': self.a.id, 'room': self.room.id, 'timeslot': self.slots[self.b.id][0],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+ITC_SAMPLE = b"""<?xml version="1.0"?>
+<problem name="tiny" nrDays="7" slotsPerDay="288" nrWeeks="2">
+  <optimization time="1" room="1" distribution="1" student="1"/>
+  <rooms>
+    <room id="1" capacity="30"><travel room="2" value="3"/></room>
+    <room id="2" capacity="60"><unavailable days="1000000" weeks="11" start="0" length="12"/></room>
+  </rooms>
+  <courses>
+    <course id="1"><config id="1">
+      <subpart id="1">
+        <class id="1" limit="40">
+          <room id="1" penalty="2"/><room id="2" penalty="0"/>
+          <time days="1000000" weeks="11" start="24" length="12" penalty="1"/>
+        </class>
+      </subpart>
+      <subpart id="2">
+        <class id="2" limit="20" parent="1" room="false">
+          <time days="0100000" weeks="11" start="24" length="12"/>
+        </class>
+      </subpart>
+    </config></course>
+  </courses>
+  <distributions>
+    <distribution type="SameDays" penalty="5"><class id="1"/><class id="2"/></distribution>
+  </distributions>
+  <students>
+    <student id="1"><course id="1"/></student>
+  </students>
+</problem>"""
+
+
+class ITC2019ImportTest(TestCase):
+    """导入保留房间惩罚、limit、parent 与 room=false，构造出的实例与 PSTTReader 一致"""
+
+    def setUp(self):
+        invalidate_instance()
+        self.user = User.objects.create_user(username='owner', password='pass')
+
+    def test_parser(self):
+        stats = import_itc2019(io.BytesIO(ITC_SAMPLE), self.user, batch_size=1)
+        self.assertEqual(stats['counts']['Lesson'], 2)
+        first, second = Lesson.objects.filter(staff__user=self.user).order_by('id')
+        self.assertEqual((first.limit, first.parent_id, first.room_required), (40, None, True))
+        self.assertEqual((second.limit, second.parent_id, second.room_required), (20, first.id, False))
+        self.assertIsNone(second.note)
+        self.assertEqual(sorted(first.Rooms_opt.values_list('room__name', 'penalty')), [('1', 2), ('2', 0)])
+
+        instance = get_instance(self.user)
+        cls = instance.classes[str(first.id)]
+        self.assertEqual(sorted(option['penalty'] for option in cls['room_options']), [0, 2])
+        self.assertEqual(cls['limit'], 40)
+        child = instance.classes[str(second.id)]
+        self.assertEqual((child['parent'], child['room_required'], child['room_options']), (str(first.id), False, []))
+
+    def test_view(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        upload = SimpleUploadedFile('tiny.xml', ITC_SAMPLE, content_type='text/xml')
+        response = client.post('/api/school/import-itc2019', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['data']['counts']['Lesson_opt_Room'], 2)
+        self.assertEqual(Lesson.objects.filter(staff__user=self.user, room_required=False).count(), 1)
+
+        upload = SimpleUploadedFile('bad.xml', b'<problem><rooms><room/></rooms></problem>', content_type='text/xml')
+        response = client.post('/api/school/import-itc2019', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 400)
@@ -9,8 +9,9 @@ urlpatterns = [
     path('get-template/<int:pk>', TimetableDetailView.as_view()), # 对应前端 getTable
     path('get-rooms', RoomListView.as_view()),
     path('get-staffs', StaffListView.as_view()),
-    path('get-students', StaffListView.as_view()), # 类似实现
+    path('get-students', StudentListView.as_view()),
     path('get-lessons', LessonListView.as_view()),
+    path('get-free-rooms', FreeRoomListView.as_view()),
     # POST 接口
     path('create-timetable', TimetableCreateView.as_view()),
     path('create-staff', StaffCreateView.as_view()),
@@ -18,4 +19,11 @@ urlpatterns = [
     path('create-student', StudentCreateView.as_view()),
     path('create-lesson', LessonCreateView.as_view()),
     path('create-distribution', DistributionCreateView.as_view()),
+    # 批量导入（请求体为数组）
+    path('bulk-create-rooms', RoomBulkCreateView.as_view()),
+    path('bulk-create-lessons', LessonBulkCreateView.as_view()),
+    path('bulk-create-students', StudentBulkCreateView.as_view()),
+    path('bulk-create-distributions', DistributionBulkCreateView.as_view()),
+    path('import-itc2019', ITC2019ImportView.as_view()),
+    path('check-conflicts', ConflictCheckView.as_view()),
 ]
\ No newline at end of file
@@ -2,13 +2,21 @@ from email.policy import default
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import status, permissions
+from rest_framework import status, permissions, serializers
+from rest_framework.parsers import MultiPartParser
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from django.db import transaction
 import json
+import xml.etree.ElementTree as ET
 from .models import *
 from .serializers import *
+from .pagination import ResourceCursorPagination
+from .bulk import *
+from .itc_import import import_itc2019
+from .occupancy import get_index
+from .conflicts import get_checker
+from .signals import writer
 
 
 # --- 统一定义 Swagger 响应模板，减少重复代码 ---
@@ -31,10 +39,32 @@ class TimetableBaseView(APIView):
 
     # permission_classes = [permissions.IsAuthenticated]
 
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # 本次请求的写入都属于当前用户，缓存失效不必再查所属用户（见 signals.py）
+        self.writer_token = writer.set(request.user.pk)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, 'writer_token', None)
+        if token is not None:
+            writer.reset(token)
+        return super().finalize_response(request, response, *args, **kwargs)
+
     # 辅助方法：统一成功响应格式
     def success_response(self, data=None, msg="success", status_code=status.HTTP_200_OK):
         return Response({"code": 0, "data": data, "msg": msg}, status=status_code)
 
+    # 辅助方法：游标分页的列表响应，data 与模板列表一致为 {list, next, previous}
+    def paginated_response(self, request, queryset, serializer_class):
+        paginator = ResourceCursorPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = serializer_class(page, many=True, context={'request': request})
+        return self.success_response(data={
+            'list': serializer.data,
+            'next': paginator.get_next_link(),
+            'previous': paginator.get_previous_link(),
+        })
+
     # 辅助方法：统一失败响应格式
     def error_response(self, error="error", code=1, status_code=status.HTTP_400_BAD_REQUEST):
         return Response({"code": code, "msg": str(error), "data": None}, status=status_code)
@@ -51,7 +81,7 @@ class MyTemplatesListView(TimetableBaseView):
         }
     )
     def get(self, request):
-        queryset = Timetable.objects.filter(owner=request.user)
+        queryset = annotate_timetables(Timetable.objects.filter(owner=request.user), request.user)
         serializer = TimetableCardSerializer(queryset, many=True, context={'request': request})
         # 前端 school.ts 期望 getTemplates 返回 ListResult，其 data 包含 list 字段
         return self.success_response(data={'list': serializer.data})
@@ -69,7 +99,7 @@ class StarsListView(TimetableBaseView):
     )
     def get(self, request):
         star_ids = Stars.objects.filter(user=request.user).values_list('Timetable_id', flat=True)
-        queryset = Timetable.objects.filter(index__in=star_ids)
+        queryset = annotate_timetables(Timetable.objects.filter(index__in=star_ids), request.user)
         serializer = TimetableCardSerializer(queryset, many=True, context={'request': request})
         return self.success_response(data={'list': serializer.data})
 
@@ -85,7 +115,7 @@ class RecommendListView(TimetableBaseView):
         }
     )
     def get(self, request):
-        queryset = Timetable.objects.exclude(owner=request.user)[:10]
+        queryset = annotate_timetables(Timetable.objects.exclude(owner=request.user), request.user)[:10]
         serializer = TimetableCardSerializer(queryset, many=True, context={'request': request})
         return self.success_response(data={'list': serializer.data})
 
@@ -111,7 +141,7 @@ class TimetableDetailView(TimetableBaseView):
     )
     def get(self, request, pk):
         try:
-            timetable = Timetable.objects.prefetch_related('Tables', 'TableConfig', 'DefaultTable').get(pk=pk)
+            timetable = annotate_timetables(Timetable.objects.prefetch_related('Tables', 'TableConfig', 'DefaultTable'), request.user).get(pk=pk)
             serializer = TimetableDetailSerializer(timetable, context={'request': request})
             return self.success_response(data=serializer.data)
         except Timetable.DoesNotExist:
@@ -119,10 +149,18 @@ class TimetableDetailView(TimetableBaseView):
 
 
 # 5. 基础资源列表 (Staff, Room, Lesson, Student)
+# 游标分页 + ?fields= 稀疏字段，嵌套关系只在被请求时预取
+resource_list_parameters = [
+    openapi.Parameter(name="cursor", in_=openapi.IN_QUERY, description="翻页游标（取自 next/previous）", type=openapi.TYPE_STRING),
+    openapi.Parameter(name="page_size", in_=openapi.IN_QUERY, description="每页条数，默认 100，最大 1000", type=openapi.TYPE_INTEGER),
+    openapi.Parameter(name="fields", in_=openapi.IN_QUERY, description="只返回的字段，逗号分隔，如 index,name", type=openapi.TYPE_STRING),
+]
+
 class StaffListView(TimetableBaseView):
     @swagger_auto_schema(
         operation_summary="教师列表",
         operation_description="获取当前用户下的教师资源",
+        manual_parameters=resource_list_parameters,
         responses={
             200: StaffSerializer,
             404: 'not found',
@@ -130,14 +168,14 @@ class StaffListView(TimetableBaseView):
     )
     def get(self, request):
         staffs = Staff.objects.filter(user=request.user)
-        serializer = StaffSerializer(staffs, many=True)
-        return self.success_response(data=serializer.data)
+        return self.paginated_response(request, staffs, StaffSerializer)
 
 
 class RoomListView(TimetableBaseView):
     @swagger_auto_schema(
         operation_summary="教室列表",
         operation_description="获取当前用户下的教室资源",
+        manual_parameters=resource_list_parameters,
         responses={
             200: RoomSerializer,
             404: 'not found',
@@ -145,14 +183,17 @@ class RoomListView(TimetableBaseView):
     )
     def get(self, request):
         rooms = Room.objects.filter(user=request.user)
-        serializer = RoomSerializer(rooms, many=True)
-        return self.success_response(data=serializer.data)
+        fields = requested_fields(request)
+        if fields is None or 'unavailable' in fields:
+            rooms = rooms.prefetch_related('Timeslots')
+        return self.paginated_response(request, rooms, RoomSerializer)
 
 
 class LessonListView(TimetableBaseView):
     @swagger_auto_schema(
         operation_summary="课程列表",
         operation_description="获取当前用户下的课程资源",
+        manual_parameters=resource_list_parameters,
         responses={
             200: LessonSerializer,
             404: 'not found',
@@ -160,14 +201,19 @@ class LessonListView(TimetableBaseView):
     )
     def get(self, request):
         lessons = Lesson.objects.filter(staff__user=request.user)
-        serializer = LessonSerializer(lessons, many=True)
-        return self.success_response(data=serializer.data)
+        fields = requested_fields(request)
+        if fields is None or 'staff' in fields:
+            lessons = lessons.select_related('staff')
+        if fields is None or 'timeslots' in fields:
+            lessons = lessons.prefetch_related('TimeSlots')
+        return self.paginated_response(request, lessons, LessonSerializer)
 
 
 class StudentListView(TimetableBaseView):
     @swagger_auto_schema(
         operation_summary="学生列表",
         operation_description="获取当前用户下的学生资源",
+        manual_parameters=resource_list_parameters,
         responses={
             200: StudentSerializer,
             404: 'not found',
@@ -175,8 +221,62 @@ class StudentListView(TimetableBaseView):
     )
     def get(self, request):
         students = Student.objects.filter(user=request.user)
-        serializer = StudentSerializer(students, many=True)
-        return self.success_response(data=serializer.data)
+        return self.paginated_response(request, students, StudentSerializer)
+
+
+class FreeRoomListView(TimetableBaseView):
+    @swagger_auto_schema(
+        operation_summary="空闲教室查询",
+        operation_description="返回容量不小于 capacity、在给定周 / 天的时间段内空闲的教室，按容量升序；"
+                              "传入 timetable 时同时排除该课表已排课程占用的教室",
+        query_serializer=FreeRoomQuerySerializer,
+        responses={
+            200: success_response_schema(openapi.Schema(type=openapi.TYPE_OBJECT)),
+            400: '参数错误',
+            404: '课表不存在',
+        }
+    )
+    def get(self, request):
+        query = FreeRoomQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return self.error_response(query.errors)
+        params = query.validated_data
+        timetable_id = params.get('timetable')
+        if timetable_id is not None and not Timetable.objects.filter(index=timetable_id, owner=request.user).exists():
+            return self.error_response("未找到该课表", status_code=status.HTTP_404_NOT_FOUND)
+        rooms = get_index(request.user, timetable_id).free_rooms(
+            params['weeks'], params['days'], params['start'], params['length'], params['capacity']
+        )
+        return self.success_response(data={
+            'list': [{'index': rid, 'name': name, 'capacity': capacity} for rid, name, capacity in rooms],
+            'count': len(rooms),
+        })
+
+
+class ConflictCheckView(TimetableBaseView):
+    @swagger_auto_schema(
+        operation_summary="调课冲突检查",
+        operation_description="在课表当前结果上试放一门课，返回教室冲突、教室不可用、违反的硬约束、"
+                              "相关软约束以及惩罚变化；不修改课表",
+        request_body=ConflictCheckSerializer,
+        responses={
+            200: success_response_schema(openapi.Schema(type=openapi.TYPE_OBJECT)),
+            400: '参数错误或不是该课程的可选项',
+            404: '课表不存在',
+        }
+    )
+    def post(self, request):
+        serializer = ConflictCheckSerializer(data=request.data)
+        if not serializer.is_valid():
+            return self.error_response(serializer.errors)
+        params = serializer.validated_data
+        if not Timetable.objects.filter(index=params['timetable'], owner=request.user).exists():
+            return self.error_response("未找到该课表", status_code=status.HTTP_404_NOT_FOUND)
+        try:
+            result = get_checker(request.user, params['timetable']).check(params['lesson'], params['room'], params['timeslot'])
+        except ValueError as e:
+            return self.error_response(e)
+        return self.success_response(data=result)
 
 
 # --- 创建与保存接口 (POST) ---
@@ -415,3 +515,105 @@ class DistributionCreateView(TimetableBaseView):
 
         except Exception as e:
             return self.error_response(error=str(e))
+
+
+# --- 批量导入接口 (POST，请求体为数组) ---
+
+class BulkCreateBaseView(TimetableBaseView):
+    """一次校验整个数组，全部通过后在一个事务内批量插入；任一条出错则整体不写入"""
+    serializer_class = None
+    create_func = None
+
+    def post(self, request):
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return self.error_response("请求体必须是非空数组")
+        serializer = self.serializer_class(data=items, many=True)
+        if not serializer.is_valid():
+            return self.error_response(serializer.errors)
+        try:
+            ids = self.create_func(request.user, serializer.validated_data)
+        except serializers.ValidationError as e:
+            return self.error_response(e.detail)
+        return self.success_response(
+            data={'created': len(ids), 'ids': ids},
+            status_code=status.HTTP_201_CREATED
+        )
+
+
+def bulk_schema(summary):
+    return swagger_auto_schema(
+        operation_summary=summary,
+        request_body=openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_OBJECT)),
+        responses={
+            201: success_response_schema(openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    "created": openapi.Schema(type=openapi.TYPE_INTEGER),
+                    "ids": openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_INTEGER)),
+                }
+            )),
+            400: '校验失败，按数组下标返回错误',
+        }
+    )
+
+
+class RoomBulkCreateView(BulkCreateBaseView):
+    serializer_class = RoomBulkSerializer
+    create_func = staticmethod(bulk_create_rooms)
+
+    @bulk_schema("批量创建教室（含不可用时间段、通行时间）")
+    def post(self, request):
+        return super().post(request)
+
+
+class LessonBulkCreateView(BulkCreateBaseView):
+    serializer_class = LessonBulkSerializer
+    create_func = staticmethod(bulk_create_lessons)
+
+    @bulk_schema("批量创建课程（含时间段、可选教室）")
+    def post(self, request):
+        return super().post(request)
+
+
+class StudentBulkCreateView(BulkCreateBaseView):
+    serializer_class = StudentBulkSerializer
+    create_func = staticmethod(bulk_create_students)
+
+    @bulk_schema("批量创建学生（含选课）")
+    def post(self, request):
+        return super().post(request)
+
+
+class DistributionBulkCreateView(BulkCreateBaseView):
+    serializer_class = DistributionBulkSerializer
+    create_func = staticmethod(bulk_create_distributions)
+
+    @bulk_schema("批量创建约束（含关联课程）")
+    def post(self, request):
+        return super().post(request)
+
+
+class ITC2019ImportView(TimetableBaseView):
+    parser_classes = [MultiPartParser]
+
+    @swagger_auto_schema(
+        operation_summary="导入 ITC2019 问题文件",
+        operation_description="上传 ITC2019 XML（字段 file），流式解析并批量写入教室、课程、学生与约束",
+        manual_parameters=[
+            openapi.Parameter(name="file", in_=openapi.IN_FORM, description="ITC2019 问题 XML", type=openapi.TYPE_FILE, required=True)
+        ],
+        responses={
+            201: success_response_schema(openapi.Schema(type=openapi.TYPE_OBJECT)),
+            400: '文件缺失或格式错误',
+        }
+    )
+    def post(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return self.error_response("缺少文件字段 file")
+        try:
+            stats = import_itc2019(upload, request.user)
+        except (ET.ParseError, KeyError, ValueError) as e:
+            return self.error_response(f"ITC2019 文件格式错误: {e}")
+        return self.success_response(data=stats, status_code=status.HTTP_201_CREATED, msg="导入成功")